@@ -1,4 +1,9 @@
 -- Drop in dependency order
+DROP TABLE IF EXISTS party_snapshot;
+DROP TABLE IF EXISTS activity_bitmap;
+DROP TABLE IF EXISTS friend_recommendation;
+DROP TABLE IF EXISTS daily_activity;
+DROP TABLE IF EXISTS backfill_checkpoint;
 DROP TABLE IF EXISTS submission;
 DROP TABLE IF EXISTS connection;
 DROP TABLE IF EXISTS userpass;
@@ -33,7 +38,10 @@ CREATE TABLE person (
   num_coins      INT NOT NULL DEFAULT 0,
   personal_goal  INT,                -- current group membership (nullable)
   latest_submission DATE,
-  last_refreshed DATETIME NULL
+  last_refreshed DATETIME NULL,
+  -- high-water mark: newest LeetCode AC submission already ingested
+  last_ingested_ts BIGINT NULL,      -- unix seconds
+  last_ingested_id VARCHAR(32) NULL
 ) ENGINE=InnoDB;
 
 -- Code Parties! 
@@ -127,6 +135,7 @@ CREATE TABLE submission (
   submission_date DATE NOT NULL,
 
   UNIQUE KEY uniq_user_problem (pid, lc_problem),
+  KEY pid_date (pid, submission_date),   -- per-user date-range scans (party windows)
 
   FOREIGN KEY (pid) REFERENCES person(pid)
     ON DELETE CASCADE
@@ -143,3 +152,70 @@ CREATE TABLE userpass (
         ON DELETE CASCADE
         ON UPDATE CASCADE
 ) ENGINE=InnoDB;
+
+-- Progress of the full-history importer (backfill.py), one row per person
+CREATE TABLE backfill_checkpoint (
+  pid          INT PRIMARY KEY,
+  next_offset  INT NOT NULL DEFAULT 0,   -- how far back in the AC history we've ingested
+  done         BOOLEAN NOT NULL DEFAULT FALSE,
+  updated_at   DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+  FOREIGN KEY (pid) REFERENCES person(pid)
+    ON DELETE CASCADE
+    ON UPDATE CASCADE
+) ENGINE=InnoDB;
+
+-- Per-person, per-day solve counts and coins, maintained on ingest
+-- (leetcode_client.ingest_submissions). Weekly/monthly leaderboards sum
+-- the buckets since the window start instead of scanning submission.
+CREATE TABLE daily_activity (
+  pid     INT NOT NULL,
+  day     DATE NOT NULL,
+  solved  INT NOT NULL DEFAULT 0,
+  coins   INT NOT NULL DEFAULT 0,
+  PRIMARY KEY (pid, day),
+  KEY day_pid (day, pid),
+  FOREIGN KEY (pid) REFERENCES person(pid)
+    ON DELETE CASCADE
+    ON UPDATE CASCADE
+) ENGINE=InnoDB;
+
+-- Top "people you may know" per person (friend_recs.py); find_friends reads
+-- it by (pid, score) instead of scanning person.
+CREATE TABLE friend_recommendation (
+  pid             INT NOT NULL,
+  candidate       INT NOT NULL,
+  score           INT NOT NULL,
+  mutuals         INT NOT NULL DEFAULT 0,   -- people pid follows who follow candidate
+  shared_parties  INT NOT NULL DEFAULT 0,
+  PRIMARY KEY (pid, candidate),
+  KEY pid_score (pid, score),
+  FOREIGN KEY (pid) REFERENCES person(pid)
+    ON DELETE CASCADE
+    ON UPDATE CASCADE,
+  FOREIGN KEY (candidate) REFERENCES person(pid)
+    ON DELETE CASCADE
+    ON UPDATE CASCADE
+) ENGINE=InnoDB;
+
+-- One bit per day the person solved anything, one row per person per year
+-- (activity_bitmap.py). Streaks and the profile heatmap read these bits.
+CREATE TABLE activity_bitmap (
+  pid   INT NOT NULL,
+  year  SMALLINT NOT NULL,
+  bits  VARBINARY(46) NOT NULL,   -- bit i = day i+1 of the year, little-endian
+  PRIMARY KEY (pid, year),
+  FOREIGN KEY (pid) REFERENCES person(pid)
+    ON DELETE CASCADE
+    ON UPDATE CASCADE
+) ENGINE=InnoDB;
+
+-- Final results of an ended party (party_finalize.py): party info, ranked
+-- members and chart data as zlib-compressed JSON. Written once, never updated.
+CREATE TABLE party_snapshot (
+  cpid          INT PRIMARY KEY,
+  payload       MEDIUMBLOB NOT NULL,
+  finalized_at  DATETIME DEFAULT CURRENT_TIMESTAMP,
+  FOREIGN KEY (cpid) REFERENCES code_party(cpid)
+    ON DELETE CASCADE
+    ON UPDATE CASCADE
+) ENGINE=InnoDB;
@@ -0,0 +1,120 @@
+# Written by Jessica Dai, Sophie Lin, Nessa Tong, Ashley Yang (Olin)
+# activity_bitmap.py
+# One bit per day a person solved anything: a 366-bit (46-byte) bitmap per
+# person per year, stored in activity_bitmap. Bit i of a year is day i + 1
+# of that year (Jan 1 is bit 0), bytes are little-endian.
+#
+# In Python a bitmap is just an int, so streaks and day counts are shifts,
+# ANDs and popcounts instead of walking every submission date.
+import datetime
+
+BITMAP_BYTES = 46   # ceil(366 / 8)
+
+
+def day_index(d):
+    """Bit position of date d within its year."""
+    return d.timetuple().tm_yday - 1
+
+
+def from_bytes(raw):
+    return int.from_bytes(raw or b'', 'little')
+
+
+def to_bytes(bits):
+    return bits.to_bytes(BITMAP_BYTES, 'little')
+
+
+def with_days(bits, days):
+    """bits with every date in days (all in the same year) set."""
+    for d in days:
+        bits |= 1 << day_index(d)
+    return bits
+
+
+def days_by_year(days):
+    """Group dates into {year: set of dates}."""
+    years = {}
+    for d in days:
+        years.setdefault(d.year, set()).add(d)
+    return years
+
+
+def _timeline(bitmaps):
+    """
+    Join {year: int} into one int covering consecutive days from Jan 1 of
+    the first year. Returns (bits, first_day), or (0, None) if empty.
+    """
+    if not bitmaps:
+        return 0, None
+    first = datetime.date(min(bitmaps), 1, 1)
+    bits = 0
+    for year, year_bits in bitmaps.items():
+        bits |= year_bits << (datetime.date(year, 1, 1) - first).days
+    return bits, first
+
+
+def longest_streak(bitmaps):
+    """Longest run of consecutive active days."""
+    bits, _ = _timeline(bitmaps)
+    # each step shortens every run of ones by one
+    n = 0
+    while bits:
+        bits &= bits >> 1
+        n += 1
+    return n
+
+
+def current_streak(bitmaps, today=None):
+    """Consecutive active days ending today (0 if nothing was solved today)."""
+    bits, first = _timeline(bitmaps)
+    today = today or datetime.date.today()
+    if first is None or today < first:
+        return 0
+    t = (today - first).days
+    if not bits >> t & 1:
+        return 0
+    # the highest inactive day at or below today ends the streak
+    inactive = ~bits & ((1 << (t + 1)) - 1)
+    return t + 1 - inactive.bit_length()
+
+
+def latest_day(bitmaps):
+    """Most recent active date, or None."""
+    bits, first = _timeline(bitmaps)
+    if not bits:
+        return None
+    return first + datetime.timedelta(days=bits.bit_length() - 1)
+
+
+def active_days(bitmaps, start, end):
+    """Number of active days in [start, end] (inclusive)."""
+    bits, first = _timeline(bitmaps)
+    if first is None or end < start:
+        return 0
+    lo = max((start - first).days, 0)
+    hi = (end - first).days
+    if hi < 0:
+        return 0
+    mask = (1 << (hi + 1)) - (1 << lo)
+    return (bits & mask).bit_count()
+
+
+def calendar(bits, year):
+    """
+    Heatmap layout for one year: a list of week columns (Monday first), each
+    a list of 7 cells that are None (outside the year) or (date, active).
+    """
+    first = datetime.date(year, 1, 1)
+    last = datetime.date(year, 12, 31)
+    day = first - datetime.timedelta(days=first.weekday())
+    weeks = []
+    while day <= last:
+        week = []
+        for _ in range(7):
+            if first <= day <= last:
+                week.append((day, bool(bits >> day_index(day) & 1)))
+            else:
+                week.append(None)
+            day += datetime.timedelta(days=1)
+        weeks.append(week)
+    return weeks
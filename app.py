@@ -1,28 +1,74 @@
 # Written by Jessica Dai, Sophie Lin, Nessa Tong, Ashley Yang (Olin)
 from flask import (Flask, render_template, make_response, url_for, request,
-                   redirect, flash, session, send_from_directory, jsonify)
-from werkzeug.utils import secure_filename
+                   redirect, flash, session, send_from_directory, jsonify, g,
+                   Response, stream_with_context)
 app = Flask(__name__)
 
+import gzip
+import importlib
+import json
 import secrets
-import cs304dbi as dbi
+import activity_bitmap
+import db_backend
 import db_queries
+import db_routing
+import fragment_cache
+import friend_recs
 import bcrypt_utils as bc
+import profile_pics
+import request_profiler
+import party_events
+import party_finalize
+import shared_cache
 import os
 import time
-from leetcode_client import refresh_user_submissions
-from party_charts import build_chart_data
-from party_utils import compute_party_dates, nth
-import datetime
-from party_charts import build_chart_data
+from leetcode_client import (refresh_user_submissions, refresh_party_submissions,
+                             user_refresh_absorbed, party_refresh_absorbed,
+                             leetcode_available, breaker_state,
+                             LeetCodeUnavailable,
+                             refresh_counters)
 from party_utils import compute_party_dates, nth
 import datetime
 
-# we need a secret_key to use flash() and sessions
-app.secret_key = secrets.token_hex()
+# Session signing key. Every worker process (and every restart) must use the
+# same one, so it comes from LEETPARTY_SECRET_KEY or a key file generated once.
+SECRET_KEY_FILE = os.environ.get('LEETPARTY_SECRET_KEY_FILE',
+                                 os.path.join(app.instance_path, 'secret_key'))
+
+# Slow-to-import modules that routes load on first use. Preloading them in
+# the server's master process means forked workers share those pages
+# instead of each importing its own copy.
+PRELOAD_MODULES = ['pandas', 'party_charts', 'PIL.Image', 'PIL.ImageOps', 'requests']
+
+
+def load_secret_key():
+    """Return LEETPARTY_SECRET_KEY, else the key in SECRET_KEY_FILE (creating it if needed)."""
+    key = os.environ.get('LEETPARTY_SECRET_KEY')
+    if key:
+        return key
+    try:
+        with open(SECRET_KEY_FILE) as f:
+            return f.read().strip()
+    except FileNotFoundError:
+        pass
+    os.makedirs(os.path.dirname(SECRET_KEY_FILE), exist_ok=True)
+    tmp = f'{SECRET_KEY_FILE}.{os.getpid()}'
+    with open(tmp, 'w') as f:
+        os.chmod(tmp, 0o600)
+        f.write(secrets.token_hex())
+    try:
+        # link() fails if another worker created the file first; theirs wins
+        os.link(tmp, SECRET_KEY_FILE)
+    except FileExistsError:
+        pass
+    finally:
+        os.remove(tmp)
+    with open(SECRET_KEY_FILE) as f:
+        return f.read().strip()
+
 
-# configure DBI
-print(dbi.conf('leetcode_db'))
+# we need a secret_key to use flash() and sessions
+app.secret_key = load_secret_key()
 
 # This gets us better error messages for certain common request errors
 app.config['TRAP_BAD_REQUEST_ERRORS'] = True
@@ -32,30 +78,136 @@ UPLOAD_FOLDER = '/students/leetcode/uploads/'
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER # team uploads directory
 app.config['MAX_CONTENT_LENGTH'] = 1*1024*1024 # 1 MB max file upload
 ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'webp'}
+PFP_CACHE_SECONDS = 365*24*60*60 # profile pic files are immutable
+PARTY_CHARTS_TTL = 5*60 # shared across workers; dropped early when members refresh
+FINAL_CHARTS_TTL = 24*60*60 # charts of ended parties never change
+GZIP_MIN_BYTES = 1024 # smaller JSON responses aren't worth compressing
+LEADERBOARD_TTL = 60 # also dropped whenever a refresh adds submissions
+LEADERBOARD_CACHE_K = 50 # cache the top K once, serve any smaller limit from it
+LEADERBOARD_WINDOWS = ('all', 'month', 'week')
+# usernames allowed on the /admin/ pages
+ADMIN_USERNAMES = set(filter(None, os.environ.get('LEETPARTY_ADMINS', '').split(',')))
+
+# opt-in cProfile sampling of requests (see request_profiler.py)
+request_profiler.init_app(app)
+# {% call cache_fragment(...) %} in templates (see fragment_cache.py)
+app.add_template_global(fragment_cache.cache_fragment, 'cache_fragment')
+# pages show a "stale stats" banner while the LeetCode circuit breaker is open
+app.add_template_global(leetcode_available)
+STALE_MESSAGE = "LeetCode isn't responding right now; showing the last saved stats."
+RECENT_REFRESH_MESSAGE = "Stats were refreshed recently, showing the latest stats"
+
+# after this session writes, its reads stay on the primary for a while so
+# the replica's lag never hides the user's own changes
+READ_YOUR_WRITES_SECONDS = 10
+
+def connect():
+    """
+    Open a DB connection for this request that sends tagged reads to the
+    replica (see db_routing.py).
+    """
+    sticky = session.get('primary_until', 0) > time.time()
+    conn = db_routing.connect(sticky=sticky)
+    g.setdefault('db_conns', []).append(conn)
+    return conn
+
+@app.after_request
+def remember_writes(response):
+    """Pin this session's reads to the primary if the request wrote."""
+    if any(conn.wrote for conn in g.get('db_conns', [])):
+        session['primary_until'] = time.time() + READ_YOUR_WRITES_SECONDS
+    return response
 
 @app.route('/')
 def index():
     '''Main page of the website'''
     if "pid" in session:
-        conn=dbi.connect()
+        conn=connect()
         pid = session['pid']
         user = db_queries.get_profile(conn, pid)
-        leaderboard = db_queries.get_leaderboard(conn, limit=10)
-        problems_today = db_queries.get_problems_solved_today(conn, pid)
+        window = request.args.get('window', 'all')
+        if window not in LEADERBOARD_WINDOWS:
+            window = 'all'
+        # the leaderboard fragment is rendered (and queried) only when its cached copy is stale
+        leaderboard = fragment_cache.lazy(lambda: top_leaderboard(conn, window, limit=10))
+        leaderboard_version = ((window, str(window_start(window)))
+                               + fragment_cache.versions('leaderboard', 'people'))
         problems_today = db_queries.get_problems_solved_today(conn, pid)
-        conn.close()
 
-        return render_template(
+        page = render_template(
             'main.html',
             page_title='Main Page',
             username=user['username'],
             leaderboard=leaderboard,
+            leaderboard_version=leaderboard_version,
+            leaderboard_ttl=LEADERBOARD_TTL,
+            window=window,
             problems_today=problems_today
         )
+        conn.close()
+        return page
     
     return render_template("login.html", page_title='Login Page')
     
 
+# -------------------- LEADERBOARDS ------------------
+def window_start(window, today=None):
+    """First day counted by a leaderboard window ('week' starts Monday), None for 'all'."""
+    today = today or datetime.date.today()
+    if window == 'week':
+        return today - datetime.timedelta(days=today.weekday())
+    if window == 'month':
+        return today.replace(day=1)
+    return None
+
+def leaderboard_key(window, since):
+    return f"leaderboard:{db_backend.CACHE_NAMESPACE}:{window}:{since}"
+
+def top_leaderboard(conn, window, limit=10):
+    """
+    Top `limit` people for a window. The top LEADERBOARD_CACHE_K are cached
+    across workers; 'week'/'month' are summed from daily_activity buckets,
+    'all' is person.num_coins.
+    """
+    since = window_start(window)
+    key = leaderboard_key(window, since)
+    leaders = shared_cache.get(key)
+    if leaders is None:
+        if since is None:
+            rows = db_queries.get_leaderboard(conn, limit=LEADERBOARD_CACHE_K)
+        else:
+            rows = db_queries.get_activity_leaderboard(conn, since, limit=LEADERBOARD_CACHE_K)
+        leaders = [dict(row, num_coins=int(row['num_coins'] or 0)) for row in rows]
+        shared_cache.set(key, leaders, LEADERBOARD_TTL)
+    return leaders[:limit]
+
+def leaderboard_keys():
+    """Cache keys of every leaderboard window as of today."""
+    return [leaderboard_key(w, window_start(w)) for w in LEADERBOARD_WINDOWS]
+
+@app.route('/api/leaderboard')
+def leaderboard_api():
+    """Top coin earners: ?window=all|month|week&limit=N (N <= LEADERBOARD_CACHE_K)."""
+    if 'pid' not in session:
+        return jsonify({"error": "not logged in"}), 401
+    window = request.args.get('window', 'all')
+    if window not in LEADERBOARD_WINDOWS:
+        return jsonify({"error": f"window must be one of {', '.join(LEADERBOARD_WINDOWS)}"}), 400
+    limit = min(max(request.args.get('limit', 10, type=int), 1), LEADERBOARD_CACHE_K)
+
+    conn = connect()
+    leaders = top_leaderboard(conn, window, limit)
+    conn.close()
+    since = window_start(window)
+    return jsonify({
+        "window": window,
+        "since": since.isoformat() if since else None,
+        "leaders": [{"pid": r["pid"], "username": r["username"],
+                     "lc_username": r["lc_username"], "coins": r["num_coins"],
+                     "solved": r.get("solved")} for r in leaders],
+    })
+
+
 @app.route('/about/')
 def about():
     '''our about page'''
@@ -76,7 +228,7 @@ def profile(pid):
             loggedin = None
                                    
         # query profile info
-        conn=dbi.connect()
+        conn=connect()
         profile = db_queries.get_profile(conn, pid) 
         # get friends list
         followers = db_queries.get_followers(conn, pid)
@@ -85,17 +237,34 @@ def profile(pid):
         #check if the session_pid is following this profile user
         isfollowing = db_queries.is_following(conn, session.get('pid'), pid)
 
+        # activity heatmap for one year, straight from the bitmap
+        bitmaps = db_queries.get_activity_bitmaps(conn, pid)
         conn.close()
+        this_year = datetime.date.today().year
+        years = sorted(set(bitmaps) | {this_year})
+        year = request.args.get('year', this_year, type=int)
+        # only years with a bitmap (or this one); anything else, e.g. ?year=0,
+        # isn't a calendar we can draw
+        if year not in years:
+            year = this_year
+        year_bits = activity_bitmap.from_bytes(bitmaps.get(year))
+        heatmap = {
+            'year': year,
+            'years': years,
+            'weeks': activity_bitmap.calendar(year_bits, year),
+            'active_days': year_bits.bit_count(),
+        }
         
         # show profile
         return render_template('profile.html', page_title='Profile Page', 
                                profile=profile, followers=followers, follows=follows, 
                                loggedin= loggedin, 
                                session_pid = session.get('pid'),
-                               is_following = isfollowing)
+                               is_following = isfollowing,
+                               heatmap = heatmap)
     # else POST
     
-    conn=dbi.connect()
+    conn=connect()
     profile = db_queries.get_profile(conn, pid) 
     followers = db_queries.get_followers(conn, pid)
     follows = db_queries.get_follows(conn, pid)
@@ -111,6 +280,7 @@ def profile(pid):
         flash('Unfollowing %s' % (friend_name['username']))
         try:
             db_queries.unfollow(conn, pid, pid2)
+            update_friend_recs(conn, pid, pid2)
             return redirect(url_for('profile', pid=pid))
         except Exception:
             conn.rollback()
@@ -131,6 +301,7 @@ def profile(pid):
 
         try:
             db_queries.unfollow(conn, session.get('pid'), pid)
+            update_friend_recs(conn, session.get('pid'), pid)
             return redirect(url_for('profile', pid=pid))
         except Exception:
             conn.rollback()
@@ -148,6 +319,7 @@ def profile(pid):
 
         try:
             db_queries.follow(conn, session.get('pid'), pid)
+            update_friend_recs(conn, session.get('pid'), pid)
             return redirect(url_for('profile', pid=pid))
         except Exception:
             conn.rollback()
@@ -166,7 +338,7 @@ def edit_profile(pid):
             return redirect(url_for('profile', pid = pid))
 
         # query profile info
-        conn=dbi.connect()
+        conn=connect()
         profile = db_queries.get_profile(conn, pid) 
         # get friends list
         followers = db_queries.get_followers(conn, pid)
@@ -190,9 +362,10 @@ def edit_profile(pid):
             username = request.form.get('username')
             lc_username = request.form.get('lc_username')
             personal_goal = request.form.get('personal_goal')
-            conn = dbi.connect()
+            conn = connect()
             try:
                 db_queries.edit_profile(conn, pid, name, username, lc_username, personal_goal)
+                fragment_cache.bump('people')
             except Exception:
                 conn.rollback()
             finally:
@@ -211,17 +384,28 @@ def refresh_my_stats():
     if 'pid' not in session:
         return redirect(url_for('login'))
 
-    conn = dbi.connect()
+    conn = connect()
     try:
         #get lc username for this SIGNED IN person
         profile = db_queries.get_profile(conn, session['pid'])
         lc_username = profile['lc_username']
+        force = force_refresh()
+        if user_refresh_absorbed(profile, force):
+            flash(RECENT_REFRESH_MESSAGE)
+            return redirect(request.args.get("next") or url_for('index'))
         #refresh their submissions
-        num_submissions = refresh_user_submissions(conn, session['pid'], lc_username)
+        num_submissions = refresh_user_submissions(conn, session['pid'], lc_username,
+                                                   force=force)
         conn.commit()
         print(f"{num_submissions} submissions added to database for username {lc_username}")
+        announce_party_updates(conn, {session['pid']: num_submissions})
+    except LeetCodeUnavailable:
+        conn.rollback()
+        flash(STALE_MESSAGE, 'error')
     except Exception as e:
         conn.rollback()
+        print(f"Could not refresh {session.get('username')}: {e}")
+        flash("Could not refresh your stats, please try again later", 'error')
     finally:
         conn.close()
 
@@ -252,11 +436,20 @@ def refresh_profile(pid: int, lc_username: str):
 
     Returns: number of NEW rows inserted into submission.
     """
-    conn = dbi.connect()
+    conn = connect()
     try:
+        profile = db_queries.get_profile(conn, pid)
+        if profile and user_refresh_absorbed(profile):
+            flash(RECENT_REFRESH_MESSAGE)
+            return redirect(url_for('profile', pid=pid))
         num_submissions = refresh_user_submissions(conn, pid, lc_username)
         print(f"{num_submissions} submissions added to database for username {lc_username}")
         conn.commit()
+        announce_party_updates(conn, {int(pid): num_submissions})
+        return redirect(url_for('profile', pid=pid))
+    except LeetCodeUnavailable:
+        conn.rollback()
+        flash(STALE_MESSAGE, 'error')
         return redirect(url_for('profile', pid=pid))
     except Exception:
         conn.rollback()
@@ -266,11 +459,10 @@ def refresh_profile(pid: int, lc_username: str):
 @app.route('/upload-profile-pic/<pid>', methods=['POST'])
 def upload_profile_pic(pid):
     """
-    Handle uploaded profile pic.
+    Handle uploaded profile pic: validate it and store resized WebP thumbnails.
     """
     # TODO: handle user session login for extra backup?
     try:
-        # TODO: handle file size
         file = request.files['pic']
 
         if file.filename == '': # in case the user submits w/o selecting a file 
@@ -278,24 +470,21 @@ def upload_profile_pic(pid):
             return redirect(url_for('edit_profile', pid = pid))
 
         if file and allowed_file(file.filename): # if uploaded and file type approved
-            print('forming filename')
-            # form secure filename
-            user_filename = file.filename
-            ext = user_filename.split('.')[-1]
-            timestamp = time.time()
-            filename = secure_filename('{}_{}.{}'.format(pid,timestamp,ext))
-
-            # get filename path
-            pathname = os.path.join(app.config['UPLOAD_FOLDER'],filename)
-
-            # save image to filesystem by formed path
-            file.save(pathname)
-            os.chmod(pathname, 0o444) # readable by owner, group and others
+            # decode, resize and save thumbnails named by content hash
+            try:
+                key = profile_pics.process_upload(file.read(), app.config['UPLOAD_FOLDER'])
+            except profile_pics.ProfilePicError as err:
+                flash(str(err))
+                return redirect(url_for('edit_profile', pid = pid))
 
             # upload filename to database
-            conn = dbi.connect()
-            db_queries.upload_profile_pic(conn, pid, filename)
+            conn = connect()
+            db_queries.upload_profile_pic(conn, pid, key)
             conn.close()
+            fragment_cache.bump('people')
+
+            if str(pid) == str(session.get('pid')):
+                session['pfp'] = key
 
             return redirect(url_for('profile', pid = pid)) # return to profile 
         elif not allowed_file(file.filename):
@@ -309,21 +498,55 @@ def upload_profile_pic(pid):
 def show_profile_pic(pid):
     """
     Show profile pic given just the pid.
+    Pages should prefer pfp_url() with a filename they already have, which
+    skips this lookup and redirect.
     """
-    conn = dbi.connect()
+    conn = connect()
     filename = db_queries.get_profile_pic(conn, pid)
     conn.close()
-    if filename:
-        return redirect(url_for('uploaded_file', filename=filename['filename']))
-    else:
-        return redirect(url_for('static', filename='default_pfp.jpg'))
+    resp = redirect(pfp_url(filename['filename'] if filename else None, 'sm'))
+    resp.headers['Cache-Control'] = 'private, max-age=300'
+    return resp
 
 @app.route('/uploads/<filename>')
 def uploaded_file(filename):
     """
     Handle request for profile picture given the filename.
+    Uploaded files are never overwritten (new uploads get new names), so
+    browsers may cache them forever.
+    """
+    resp = send_from_directory(app.config['UPLOAD_FOLDER'], filename,
+                               max_age=PFP_CACHE_SECONDS)
+    resp.headers['Cache-Control'] = f'public, max-age={PFP_CACHE_SECONDS}, immutable'
+    return resp
+
+@app.template_global()
+def pfp_url(filename, size='md'):
     """
-    return send_from_directory(app.config['UPLOAD_FOLDER'], filename)
+    URL of a profile picture at the given thumbnail size ('sm', 'md', 'lg'),
+    falling back to the default picture.
+    """
+    if not filename:
+        return url_for('static', filename='default_pfp.jpg')
+    if profile_pics.is_thumb_key(filename):
+        filename = profile_pics.thumb_filename(filename, size)
+    # older uploads only have the original file
+    return url_for('uploaded_file', filename=filename)
+
+@app.template_global()
+def session_pfp():
+    """
+    The signed-in user's picture filename for the navbar. Sessions started
+    before it was kept in the session don't have it, so look it up once.
+    """
+    if 'pfp' not in session and 'pid' in session:
+        conn = connect()
+        try:
+            row = db_queries.get_profile_pic(conn, session['pid'])
+        finally:
+            conn.close()
+        session['pfp'] = row['filename'] if row else None
+    return session.get('pfp')
 
 def allowed_file(filename):
     """
@@ -349,7 +572,7 @@ def signup():
         flash("All fields are required.")
         return render_template('signup.html', page_title='Signup Page')
 
-    conn = dbi.connect()
+    conn = connect()
     try:
         #before we create person make sure their fields are valid, specifically username and lc_username
         if db_queries.username_exists(conn, username):
@@ -367,7 +590,12 @@ def signup():
             conn.rollback()
             return render_template('signup.html', page_title='Signup Page')
 
-        hashed = bc.signup_hash(password) # Hash password
+        try:
+            hashed = bc.signup_hash(password) # Hash password
+        except bc.BcryptBusyError as err:
+            conn.rollback()
+            flash(str(err))
+            return render_template('signup.html', page_title='Signup Page')
         # Put in database
         try:
             db_queries.create_userpass(conn, pid, hashed)
@@ -395,7 +623,7 @@ def login():
     # else: POST
     username = request.form.get('username')
     password = request.form.get('password')
-    conn = dbi.connect()
+    conn = connect()
     try:
         user = db_queries.get_login_info(conn, username)
 
@@ -405,8 +633,20 @@ def login():
 
         stored_hash = user['hashed']
 
-        if not bc.verify_password(password, stored_hash):
-            flash("Invalid username or password")
+        try:
+            if not bc.verify_password(password, stored_hash):
+                flash("Invalid username or password")
+                return render_template('login.html', page_title='Login Page')
+
+            # upgrade hashes made with an old work factor while we have the password
+            if bc.needs_rehash(stored_hash):
+                try:
+                    db_queries.update_userpass(conn, user['pid'], bc.signup_hash(password))
+                    conn.commit()
+                except Exception:
+                    conn.rollback()
+        except bc.BcryptBusyError as err:
+            flash(str(err))
             return render_template('login.html', page_title='Login Page')
     finally:
         conn.close()
@@ -414,6 +654,7 @@ def login():
     # login success
     session['pid'] = user['pid']
     session['username'] = user['username']
+    session['pfp'] = user['filename']
     flash("Logged in!")
     return redirect(url_for('index'))
 
@@ -431,7 +672,7 @@ def create_party():
         flash("You must be logged in to create a party")
         return redirect(url_for("login"))
 
-    conn = dbi.connect()
+    conn = connect()
     # Fetch connections/potential people to invite
     try:
         connections = db_queries.get_party_invite_options(conn, session['pid'])
@@ -477,14 +718,27 @@ def view_party(cpid):
     if 'pid' not in session:
         return redirect(url_for('login'))
 
-    conn = dbi.connect()
+    conn = connect()
     try:
-        party = db_queries.get_party_info(conn, cpid)
-        members = db_queries.get_party_members(conn, cpid)
+        # ended parties are served from their final snapshot
+        snapshot = final_party_snapshot(conn, cpid)
+        if snapshot:
+            party, members = snapshot['party'], snapshot['members']
+            for m in members:
+                m['word_rank'] = nth(m['rank'])
+        # the member list only changes when someone joins, leaves or edits
+        # their profile, so it (and its rendered HTML) is cached per version
+        versions = fragment_cache.versions(f'party:{cpid}', 'people', f"follows:{session['pid']}")
+        if not snapshot:
+            party = db_queries.get_party_info(conn, cpid)
+            members = fragment_cache.cached(('party_members', cpid) + versions[:2],
+                                            lambda: db_queries.get_party_members(conn, cpid))
         
         #check if u are viewing a party u are in or not
         user_in_party = any(m['pid'] == session['pid'] for m in members)
-        connections = db_queries.get_party_invite_options(conn, session['pid'], cpid) if user_in_party else []
+        connections = fragment_cache.lazy(
+            lambda: (db_queries.get_party_invite_options(conn, session['pid'], cpid)
+                     if user_in_party and not snapshot else []))
         
         return render_template(
             "view_party.html",
@@ -492,7 +746,12 @@ def view_party(cpid):
             party=party,
             members=members,
             connections=connections,
-            user_in_party=user_in_party
+            # members see remove buttons and "(You)", so their copy is their own
+            members_version=(cpid, snapshot is not None,
+                             session['pid'] if user_in_party else None) + versions[:2],
+            connections_version=(cpid, session['pid']) + versions,
+            user_in_party=user_in_party,
+            final=snapshot is not None
         )
     finally:
         conn.close()
@@ -502,17 +761,112 @@ def party_charts(cpid):
     if 'pid' not in session:
         return jsonify({"error": "not logged in"}), 401
 
-    conn = dbi.connect()
-    submissions = db_queries.get_party_submissions(conn, cpid)
+    data = shared_cache.get(party_charts_key(cpid))
+    if data is None:
+        conn = connect()
+        snapshot = final_party_snapshot(conn, cpid)
+        data = snapshot['charts'] if snapshot else party_chart_data(conn, cpid)
+        conn.close()
+        shared_cache.set(party_charts_key(cpid), data,
+                         FINAL_CHARTS_TTL if snapshot else PARTY_CHARTS_TTL)
+
+    if request.args.get('format') == 'compact':
+        from party_charts import compact_chart_data
+        data = compact_chart_data(data)
+    return gzip_json(data)
+
+def gzip_json(data):
+    """JSON response, gzip-compressed when the client accepts it and it's worth it."""
+    body = json.dumps(data, separators=(',', ':'), default=str).encode('utf8')
+    response = app.response_class(body, mimetype='application/json')
+    response.vary.add('Accept-Encoding')
+    if len(body) >= GZIP_MIN_BYTES and 'gzip' in request.accept_encodings:
+        response.set_data(gzip.compress(body, compresslevel=6))
+        response.headers['Content-Encoding'] = 'gzip'
+    return response
+
+def final_party_snapshot(conn, cpid):
+    """
+    Final snapshot of an ended party (see party_finalize.py), finalizing it
+    now if it is due and the daily job hasn't yet. None while the party is
+    still running or waiting for a last refresh, or if finalizing fails (the
+    live data is shown meanwhile).
+    """
+    snapshot = party_finalize.get_snapshot(conn, cpid)
+    if snapshot is not None:
+        return snapshot
+    party = db_queries.get_party_info(conn, cpid)
+    if party is None or not party_finalize.ready_to_finalize(party):
+        return None
+    try:
+        snapshot = party_finalize.finalize_party(conn, cpid)
+        conn.commit()
+    except Exception as err:
+        conn.rollback()
+        print(f"Could not finalize party {cpid}: {err}")
+        return None
+    # charts cached while the party was running are superseded
+    shared_cache.delete(party_charts_key(cpid))
+    return snapshot
+
+def party_charts_key(cpid):
+    return f"party_charts:{db_backend.CACHE_NAMESPACE}:{cpid}"
+
+def party_chart_data(conn, cpid):
+    """Chart payload for the party dashboard (see party_charts.build_chart_data)."""
+    from party_charts import build_chart_data  # pulls in pandas
+
+    submissions = db_queries.get_party_submissions(conn, cpid, shape='columns')
     party_info = db_queries.get_party_info(conn, cpid)
-    conn.close()
 
     data = build_chart_data(submissions, party_info['party_goal'])
 
     if party_info and "progress" in data:
         data["progress"]["goal"] = int(party_info["party_goal"])  # or party.party_goal depending on row type
 
-    return jsonify(data)
+    return data
+
+@app.route("/api/party/<int:cpid>/events")
+def party_event_stream(cpid):
+    """
+    Server-Sent Events stream of live updates for a party page: new counts,
+    rank changes and the newest chart point whenever a member's refresh
+    brings in new submissions.
+    """
+    if 'pid' not in session:
+        return jsonify({"error": "not logged in"}), 401
+
+    return Response(
+        stream_with_context(party_events.sse_stream(cpid)),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'},
+    )
+
+def announce_party_updates(conn, new_counts):
+    """
+    After a refresh commits, drop the cached leaderboards and the cached
+    charts of every party of anyone who got new submissions, and push one
+    update to the viewers of each of their in-progress parties. Parties
+    nobody is watching are skipped, and a failure here never fails the refresh.
+    """
+    pids = [pid for pid, n in new_counts.items() if n]
+    if pids:
+        shared_cache.delete(*leaderboard_keys())
+        fragment_cache.bump('leaderboard')
+    try:
+        shared_cache.delete(*[party_charts_key(cpid)
+                              for cpid in db_queries.get_parties_for_members(conn, pids)])
+        for cpid in db_queries.get_parties_for_members(conn, pids, active_only=True):
+            if not party_events.broker.has_subscribers(cpid):
+                continue
+            data = party_chart_data(conn, cpid)
+            shared_cache.set(party_charts_key(cpid), data, PARTY_CHARTS_TTL)
+            message, ranks = party_events.build_party_update(
+                data, party_events.broker.last_ranks(cpid))
+            party_events.broker.remember_ranks(cpid, ranks)
+            party_events.broker.publish(cpid, message)
+    except Exception as err:
+        print(f"Could not announce party updates: {err}")
 
 # TO DO: Change to POST action in view_party
 @app.route("/party/<int:cpid>/remove_member", methods=["POST"])
@@ -522,10 +876,16 @@ def remove_member(cpid):
         return redirect(url_for('login'))
 
     remove_pid = request.form.get("pid")
-    conn = dbi.connect()
+    conn = connect()
+    if db_queries.get_party_snapshot(conn, cpid):
+        conn.close()
+        flash("This party is over and its results are final.")
+        return redirect(url_for("view_party", cpid=cpid))
     try:
         db_queries.remove_user_from_party(conn, remove_pid, cpid)
         conn.commit()
+        shared_cache.delete(party_charts_key(cpid))
+        fragment_cache.bump(f'party:{cpid}')
         flash("Member removed!")
     except Exception as e:
         conn.rollback()
@@ -543,10 +903,16 @@ def add_member(cpid):
     # FYI or session['pid'] fallback is for in case user wants to join this party
     # see view_party user_not_in_party button
     new_pid = request.form.get("pid") or session['pid']
-    conn = dbi.connect()
+    conn = connect()
+    if db_queries.get_party_snapshot(conn, cpid):
+        conn.close()
+        flash("This party is over and its results are final.")
+        return redirect(url_for("view_party", cpid=cpid))
     try:
         db_queries.assign_user_to_party(conn, new_pid, cpid)
         conn.commit()
+        shared_cache.delete(party_charts_key(cpid))
+        fragment_cache.bump(f'party:{cpid}')
         flash("Member added!")
     except Exception as e:
         conn.rollback()
@@ -563,7 +929,7 @@ def my_parties():
         flash("You must be logged in to view your parties.")
         return redirect(url_for('login'))
 
-    conn = dbi.connect()
+    conn = connect()
     all_parties = db_queries.get_parties_for_user(conn, session['pid'])
     mutual_parties = db_queries.get_upcoming_mutual_parties(conn, session['pid'])
     conn.close()
@@ -580,37 +946,18 @@ def my_parties():
     # Completed parties: most recently ended
     completed.sort(key=lambda p: p['party_end'], reverse=True)
 
-    now = datetime.datetime.now()
-
-    # get num days relative to current date for each party
-    current = compute_party_dates(current)
-    upcoming = compute_party_dates(upcoming)
-    completed = compute_party_dates(completed)
-
-    #add ucer's rank for each party
-    for p in all_parties:
-        print(p['name'], p.get('rank'), p.get('word_rank'))
-        if p.get('rank') is not None:
-            p['word_rank'] = nth(p['rank'])
-        else:
-            p['word_rank'] = None
-
-    now = datetime.datetime.now()
-
     # get num days relative to current date for each party
     current = compute_party_dates(current)
     upcoming = compute_party_dates(upcoming)
     completed = compute_party_dates(completed)
 
-    #add ucer's rank for each party
+    #add user's rank for each party
     for p in all_parties:
-        print(p['name'], p.get('rank'), p.get('word_rank'))
         if p.get('rank') is not None:
             p['word_rank'] = nth(p['rank'])
         else:
             p['word_rank'] = None
 
-
     return render_template(
         "my_parties.html",
         page_title='My Parties Page',
@@ -624,21 +971,34 @@ def my_parties():
 def refresh_party(cpid):
     """Refreshes the party stats, specifically refetching leetcode 
     information for each party member"""
-    conn = dbi.connect()
+    # don't make the user wait on members LeetCode will fail for anyway
+    if not leetcode_available():
+        flash(STALE_MESSAGE, 'error')
+        return redirect(url_for('view_party', cpid=cpid))
+
+    conn = connect()
+    force = force_refresh()
+
+    # someone refreshed this party moments ago; what's stored is current enough
+    party = db_queries.get_party_info(conn, cpid)
+    if party and party_refresh_absorbed(party, force):
+        conn.close()
+        flash("Party was refreshed recently, showing the latest stats")
+        return redirect(url_for('view_party', cpid=cpid))
 
     members = db_queries.get_party_members(conn, cpid)
-    failed_refreshes = []
 
-    for m in members:
-        try:
-            refresh_user_submissions(conn, m['pid'], m['lc_username'])
-            conn.commit()
-        except Exception:
-            failed_refreshes.append(m['username'])
-            conn.rollback()
+    # fetch everyone, then write the whole party's submissions in one transaction
+    try:
+        new_counts, failed_refreshes = refresh_party_submissions(conn, members, force=force)
+        conn.commit()
+        announce_party_updates(conn, new_counts)
+    except Exception:
+        conn.rollback()
+        new_counts, failed_refreshes = {}, [m['username'] for m in members]
     
     if failed_refreshes:
-        flash("Failed to refresh: " + ", ".join(failed_refreshes))
+        flash("Failed to refresh: " + ", ".join(failed_refreshes), 'error')
     # Only refresh party if EVERYONE'S stats updated
     else:
         try:
@@ -647,12 +1007,75 @@ def refresh_party(cpid):
             flash("Party refreshed")
         except Exception:
             conn.rollback()
-            flash(f"Error refreshing party")
+            flash(f"Error refreshing party", 'error')
 
     conn.close()
     return redirect(url_for('view_party', cpid=cpid))
 
+#------------ Monitoring ----------------
+@app.route('/api/metrics')
+def metrics():
+    """
+    Counters for how much refresh work this process did and skipped,
+    fragment cache hits, and the LeetCode circuit breaker's state.
+    """
+    return jsonify({"refresh": refresh_counters(), "fragments": fragment_cache.stats(),
+                    "leetcode": breaker_state()})
+
+#------------ Admin ----------------
+def is_admin():
+    return session.get('username') in ADMIN_USERNAMES
+
+def force_refresh():
+    """Admins can pass force=1 to refresh inside the minimum refresh interval."""
+    return request.values.get('force') == '1' and is_admin()
+
+@app.route('/admin/profiles')
+def admin_profiles():
+    """Recent request profiles, newest first."""
+    if not is_admin():
+        return jsonify({"error": "admins only"}), 403
+    return jsonify({"enabled": request_profiler.enabled(),
+                    "profiles": request_profiler.list_profiles()})
+
+@app.route('/admin/profiles/<name>')
+def admin_profile(name):
+    """
+    Download one profile as a pstats file (load it with pstats, snakeviz or
+    flameprof), or with ?format=text get its top functions as plain text.
+    """
+    if not is_admin():
+        return jsonify({"error": "admins only"}), 403
+    if request.args.get('format') == 'text':
+        text = request_profiler.top_functions(name)
+        if text is None:
+            return jsonify({"error": "no such profile"}), 404
+        return Response(text, mimetype='text/plain')
+    if request_profiler.profile_path(name) is None:
+        return jsonify({"error": "no such profile"}), 404
+    return send_from_directory(request_profiler.PROFILE_DIR, name + '.prof',
+                               as_attachment=True)
+
 #------------ Find Friends ----------------
+def update_friend_recs(conn, pid, followee=None, own_only=False):
+    """
+    Recompute the friend recommendations that pid's follow/unfollow of
+    followee changed (or just pid's own with own_only) and commit. Never
+    fails the request.
+    """
+    try:
+        if own_only:
+            friend_recs.refresh_user(conn, pid)
+        else:
+            # whom either side can invite to parties changed too: the invite
+            # list has both the people you follow and your followers
+            fragment_cache.bump(*(f'follows:{p}' for p in (pid, followee) if p is not None))
+            friend_recs.refresh_after_follow_change(conn, pid)
+        conn.commit()
+    except Exception as err:
+        conn.rollback()
+        print(f"Could not refresh friend recommendations: {err}")
+
 @app.route('/find_friends/', methods=['GET', 'POST'])
 def find_friends():
     """Loads page to find people (who are the user is not currently connected to) to friend"""
@@ -660,12 +1083,16 @@ def find_friends():
     if 'pid' not in session:
         return redirect(url_for('login'))
     pid = session['pid']
-    conn = dbi.connect()
+    conn = connect()
     
     try:
         username = db_queries.get_profile(conn, pid)
         if request.method == 'GET':
             friends = db_queries.find_friends(conn, pid)
+            if not friends:
+                # nothing stored yet (e.g. signed up since the last rebuild)
+                update_friend_recs(conn, pid, own_only=True)
+                friends = db_queries.find_friends(conn, pid)
             return render_template('find_friends.html', 
                                 page_title='Find Friends Page', 
                                 pid= pid, 
@@ -694,6 +1121,7 @@ def find_friends():
                     conn.commit()
                 except Exception:
                     conn.rollback()
+                update_friend_recs(conn, pid, pid2)
 
                 #refresh friends list
                 friends = db_queries.find_friends(conn, pid)
@@ -719,6 +1147,23 @@ def find_friends():
 
                
 
+def create_app(preload=None):
+    """
+    Return the configured app for a WSGI server, e.g.
+        gunicorn -w 4 -k gthread --threads 32 --preload 'app:create_app()'
+    (threaded workers: each live party stream holds a thread).
+    With preload (default: LEETPARTY_PRELOAD=1) the lazily imported heavy
+    modules are loaded now, before the server forks its workers.
+    """
+    if preload is None:
+        preload = os.environ.get('LEETPARTY_PRELOAD', '0') != '0'
+    if preload:
+        for name in PRELOAD_MODULES:
+            importlib.import_module(name)
+    print(f'database: {db_backend.conf()}')
+    return app
+
+
 if __name__ == '__main__':
     import sys, os
     if len(sys.argv) > 1:
@@ -727,6 +1172,6 @@ if __name__ == '__main__':
         assert(port>1024)
     else:
         port = os.getuid()
+    app = create_app()
     app.debug = True
-    app.run('0.0.0.0',port)    
-
+    app.run('0.0.0.0',port)
@@ -0,0 +1,159 @@
+# Written by Jessica Dai, Sophie Lin, Nessa Tong, Ashley Yang (Olin)
+# backfill.py
+# Import users' full accepted-submission history, page by page.
+#
+# Each page is inserted and its checkpoint saved in the same transaction, so
+# an interrupted run picks up where it stopped. Users run in parallel threads;
+# every LeetCode call still goes through the client's shared rate budget.
+# If the server rejects paging (leetcode.com's recentAcSubmissionList has no
+# offset argument), only the recent submissions it serves are imported, and
+# the summary lists those users.
+#
+#   python backfill.py --all
+#   python backfill.py alice_lc bob_lc --workers 8 --page-size 100
+#   python backfill.py --all --restart          # ignore saved checkpoints
+#   python backfill.py --all --rebuild-activity # only rebuild activity buckets/bitmaps from stored submissions
+#
+# Against the local stub:
+#   python leetcode_stub.py &
+#   LEETCODE_GRAPHQL_URL=http://localhost:5055/graphql python backfill.py --all
+import argparse
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import db_backend
+import db_queries
+from leetcode_client import (
+    ingest_submissions,
+    iter_ac_submission_pages,
+    rebuild_activity,
+    recompute_person_stats,
+)
+
+
+def _load_checkpoint(conn, pid):
+    """Return (next_offset, done) for pid, (0, False) if never started."""
+    curs = db_backend.dict_cursor(conn)
+    curs.execute('SELECT next_offset, done FROM backfill_checkpoint WHERE pid = %s', [pid])
+    row = curs.fetchone()
+    curs.close()
+    if row is None:
+        return 0, False
+    return row['next_offset'], bool(row['done'])
+
+
+def _save_checkpoint(conn, pid, next_offset, done):
+    """Upsert pid's checkpoint (no commit here)."""
+    curs = db_backend.dict_cursor(conn)
+    curs.execute('''
+        INSERT INTO backfill_checkpoint (pid, next_offset, done)
+        VALUES (%s, %s, %s)
+        ON DUPLICATE KEY UPDATE next_offset = VALUES(next_offset), done = VALUES(done)
+    ''', [pid, next_offset, done])
+    curs.close()
+
+
+def backfill_user(person, page_size=50, restart=False):
+    """
+    Backfill one person (dict with pid, lc_username) on its own connection.
+
+    Returns (new submission rows inserted, whether the whole history was
+    read). The server may not page past the recent submissions; then only
+    those are imported.
+    """
+    pid = person['pid']
+    conn = db_backend.connect()
+    no_paging = []
+    try:
+        offset, done = (0, False) if restart else _load_checkpoint(conn, pid)
+        if done:
+            return 0, True
+
+        new_rows = 0
+        for next_offset, page in iter_ac_submission_pages(
+            person['lc_username'], start_offset=offset, page_size=page_size,
+            on_no_paging=lambda: no_paging.append(True),
+        ):
+            # older pages can hold an earlier solve of a problem we have
+            new_rows += ingest_submissions(
+                conn, {pid: page}, recompute=False, use_high_water_mark=False,
+                keep_earliest=True,
+            )[pid]
+            _save_checkpoint(conn, pid, next_offset, False)
+            conn.commit()
+            offset = next_offset
+
+        # rows moved to earlier dates left their old days' buckets and bits behind
+        rebuild_activity(conn, pid)
+        recompute_person_stats(conn, pid)
+        _save_checkpoint(conn, pid, offset, True)
+        conn.commit()
+        return new_rows, not no_paging
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Import full LeetCode AC history.')
+    parser.add_argument('lc_usernames', nargs='*', help='LeetCode usernames to backfill')
+    parser.add_argument('--all', action='store_true', help='backfill every person')
+    parser.add_argument('--page-size', type=int, default=50)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--restart', action='store_true',
+                        help='ignore saved checkpoints and start from the newest submission')
+    parser.add_argument('--rebuild-activity', action='store_true',
+                        help="don't call LeetCode; rebuild activity buckets and bitmaps from stored submissions")
+    args = parser.parse_args()
+
+    if not args.all and not args.lc_usernames:
+        parser.error('give LeetCode usernames or --all')
+
+    conn = db_backend.connect()
+    people = db_queries.get_people_by_lc_username(
+        conn, None if args.all else args.lc_usernames
+    )
+    if args.rebuild_activity:
+        for person in people:
+            rebuild_activity(conn, person['pid'])
+        conn.commit()
+        conn.close()
+        print(f"Rebuilt daily activity for {len(people)} users.")
+        return
+    conn.close()
+
+    total = 0
+    failed = []
+    recent_only = []
+    with ThreadPoolExecutor(max_workers=args.workers) as ex:
+        futures = {
+            ex.submit(backfill_user, p, args.page_size, args.restart): p
+            for p in people
+        }
+        for fut in as_completed(futures):
+            person = futures[fut]
+            try:
+                added, complete = fut.result()
+            except Exception as e:
+                failed.append(person['lc_username'])
+                print(f"{person['lc_username']}: failed ({e}); rerun to resume")
+                continue
+            total += added
+            if complete:
+                print(f"{person['lc_username']}: {added} new submissions")
+            else:
+                recent_only.append(person['lc_username'])
+                print(f"{person['lc_username']}: {added} new submissions "
+                      f"(recent only: LeetCode doesn't page this history)")
+
+    print(f"\nBackfilled {len(people) - len(failed)}/{len(people)} users, "
+          f"{total} new submission rows.")
+    if recent_only:
+        print("Recent submissions only (no paging):", ", ".join(recent_only))
+    if failed:
+        print("Failed:", ", ".join(failed))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,13 +1,72 @@
 # Written by Jessica Dai, Sophie Lin, Nessa Tong, Ashley Yang (Olin)
 # bcrypt_utils.py
+import atexit
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
 import bcrypt
 
+# Work factor for new hashes. Stored hashes with a different cost get
+# re-hashed on the next successful login (see needs_rehash).
+BCRYPT_ROUNDS = int(os.environ.get('LEETPARTY_BCRYPT_ROUNDS', 12))
+
+# bcrypt is CPU-bound, so it runs in a small process pool instead of on the
+# request thread. At most BCRYPT_MAX_PENDING jobs may be queued or running;
+# past that, callers wait up to BCRYPT_QUEUE_TIMEOUT seconds and then get
+# BcryptBusyError so a signup/login burst can't pile up unbounded work.
+BCRYPT_WORKERS = int(os.environ.get('LEETPARTY_BCRYPT_WORKERS', os.cpu_count() or 2))
+BCRYPT_MAX_PENDING = int(os.environ.get('LEETPARTY_BCRYPT_MAX_PENDING', BCRYPT_WORKERS * 4))
+BCRYPT_QUEUE_TIMEOUT = float(os.environ.get('LEETPARTY_BCRYPT_QUEUE_TIMEOUT', 5))
+
+_pool = None
+_pool_lock = threading.Lock()
+_slots = threading.BoundedSemaphore(BCRYPT_MAX_PENDING)
+
+
+class BcryptBusyError(Exception):
+    """Raised when the hashing pool is saturated and the request should back off."""
+    pass
+
+
+def _get_pool():
+    '''Create the process pool on first use (after any fork by the server).'''
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=BCRYPT_WORKERS)
+        return _pool
+
+
+@atexit.register
+def _shutdown_pool():
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+
+
+def _run_in_pool(fn, *args):
+    '''Run fn(*args) in the bcrypt pool, blocking for a slot if it is full.'''
+    if not _slots.acquire(timeout=BCRYPT_QUEUE_TIMEOUT):
+        raise BcryptBusyError('Password hashing is busy, please try again.')
+    try:
+        return _get_pool().submit(fn, *args).result()
+    finally:
+        _slots.release()
+
+
+def _hash(passwd_bytes, rounds):
+    return bcrypt.hashpw(passwd_bytes, bcrypt.gensalt(rounds=rounds))
+
+
+def _check(passwd_bytes, stored_bytes):
+    return bcrypt.checkpw(passwd_bytes, stored_bytes)
+
+
 # Taken almost directly from bcrypt-demos in class!
-def signup_hash(passwd, encoding='utf8'):
+def signup_hash(passwd, encoding='utf8', rounds=None):
     '''Return a bcrypt-hashed password as a string, ready for DB storage.'''
-    prior = bcrypt.gensalt()
     x = passwd.encode(encoding)
-    y = bcrypt.hashpw(x, prior)
+    y = _run_in_pool(_hash, x, rounds or BCRYPT_ROUNDS)
     return y.decode(encoding)
 
 def verify_password(passwd, stored_hash, encoding='utf8'):
@@ -15,5 +74,23 @@ def verify_password(passwd, stored_hash, encoding='utf8'):
     that the value stored in the databse is 'stored_hash'.'''
     stored_bytes = stored_hash.encode(encoding)
     passwd_bytes = passwd.encode(encoding)
-    y = bcrypt.hashpw(passwd_bytes, stored_bytes)
-    return stored_hash == y.decode(encoding)
\ No newline at end of file
+    try:
+        return _run_in_pool(_check, passwd_bytes, stored_bytes)
+    except ValueError:
+        # malformed hash in the database
+        return False
+
+def hash_rounds(stored_hash):
+    '''Return the cost factor encoded in a bcrypt hash like $2b$12$...,
+    or None if it can't be parsed.'''
+    parts = stored_hash.split('$')
+    if len(parts) < 4:
+        return None
+    try:
+        return int(parts[2])
+    except ValueError:
+        return None
+
+def needs_rehash(stored_hash):
+    '''True if the stored hash was made with a different cost than BCRYPT_ROUNDS.'''
+    return hash_rounds(stored_hash) != BCRYPT_ROUNDS
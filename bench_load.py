@@ -0,0 +1,254 @@
+# Written by Jessica Dai, Sophie Lin, Nessa Tong, Ashley Yang (Olin)
+# Load test: seeds a synthetic population into a fresh SQLite database, then
+# has several logged-in clients hit a weighted mix of the app's routes at
+# once through the Flask test client, and reports latency percentiles and
+# throughput per route.
+#
+#   python bench_load.py --clients 8 --requests 2000 --json before.json
+#   (change something)
+#   python bench_load.py --clients 8 --requests 2000 --compare before.json
+#
+# LeetCode is faked by leetcode_stub.py, run in a background thread, so runs
+# need no network. The refresh routes redirect even when a refresh fails, so
+# besides 5xx responses, "err" counts requests that flashed an error.
+# --big-parties adds parties that all include one user (the /my_parties
+# worst case) on top of --parties. The population, route mix, and request order come from
+# fixed seeds, so two runs on different commits do the same work.
+# --mix changes the weights, e.g. --mix index=1,party_charts=1.
+import argparse
+import contextlib
+import datetime
+import json
+import os
+import random
+import subprocess
+import tempfile
+import threading
+import time
+
+# route name -> weight; about how often people actually hit each page
+DEFAULT_MIX = {
+    'index': 25,
+    'profile': 20,
+    'view_party': 15,
+    'party_charts': 15,
+    'find_friends': 10,
+    'my_parties': 8,
+    'refresh_stats': 4,
+    'refresh_party': 3,
+}
+
+
+def route_request(route, rng, pids, cpids):
+    """(method, path) for one request to the named route."""
+    if route == 'index':
+        return 'GET', '/?window=' + rng.choice(['all', 'all', 'month', 'week'])
+    if route == 'profile':
+        return 'GET', f'/profile/{rng.choice(pids)}'
+    if route == 'view_party':
+        return 'GET', f'/party/{rng.choice(cpids)}'
+    if route == 'party_charts':
+        return 'GET', f'/api/party/{rng.choice(cpids)}/charts'
+    if route == 'find_friends':
+        return 'GET', '/find_friends/'
+    if route == 'my_parties':
+        return 'GET', '/my_parties'
+    if route == 'refresh_stats':
+        return 'POST', '/refresh-stats'
+    if route == 'refresh_party':
+        return 'GET', f'/party/{rng.choice(cpids)}/refresh'
+    raise ValueError(f'unknown route {route}')
+
+
+def percentile(sorted_values, p):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    k = max(0, min(len(sorted_values) - 1, round(p / 100 * len(sorted_values)) - 1))
+    return sorted_values[k]
+
+
+def start_stub():
+    """Serve leetcode_stub on a free local port in a daemon thread. Returns its URL."""
+    import leetcode_stub
+    return leetcode_stub.serve_in_thread()[1]
+
+
+def flashed_error(client):
+    """Pop the client's pending flash messages; True if any was an error."""
+    with client.session_transaction() as sess:
+        flashes = sess.pop('_flashes', [])
+    return any(category == 'error' for category, _ in flashes)
+
+
+def run_client(flask_app, user, routes, weights, num_requests, seed, pids, cpids, results):
+    """
+    One logged-in client sending num_requests requests; appends
+    (route, ms, status, failed) where failed means a 5xx or a flashed error.
+    """
+    rng = random.Random(seed)
+    client = flask_app.test_client()
+    with client.session_transaction() as sess:
+        sess['pid'] = user['pid']
+        sess['username'] = user['username']
+    for _ in range(num_requests):
+        route = rng.choices(routes, weights)[0]
+        method, path = route_request(route, rng, pids, cpids)
+        start = time.perf_counter()
+        try:
+            status = client.open(path, method=method).status_code
+        except Exception:
+            status = 599
+        ms = (time.perf_counter() - start) * 1000
+        # redirects leave their flashes in the session for the next page
+        failed = status >= 500 or (status in (302, 303) and flashed_error(client))
+        results.append((route, ms, status, failed))
+
+
+def summarize(results, elapsed):
+    """{route: {count, errors, rps, p50, p95, p99, mean}} plus an 'ALL' row."""
+    by_route = {}
+    for route, ms, _, failed in results:
+        by_route.setdefault(route, []).append((ms, failed))
+    by_route['ALL'] = [(ms, failed) for _, ms, _, failed in results]
+    summary = {}
+    for route, rows in by_route.items():
+        times = sorted(ms for ms, _ in rows)
+        summary[route] = {
+            'count': len(rows),
+            'errors': sum(1 for _, failed in rows if failed),
+            'rps': len(rows) / elapsed,
+            'mean': sum(times) / len(times),
+            'p50': percentile(times, 50),
+            'p95': percentile(times, 95),
+            'p99': percentile(times, 99),
+        }
+    return summary
+
+
+def print_summary(summary, baseline=None):
+    print(f"{'route':<14} {'count':>6} {'err':>4} {'req/s':>7} "
+          f"{'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    for route in sorted(summary, key=lambda r: (r == 'ALL', r)):
+        row = summary[route]
+        line = (f"{route:<14} {row['count']:>6} {row['errors']:>4} {row['rps']:>7.1f} "
+                f"{row['p50']:>8.1f} {row['p95']:>8.1f} {row['p99']:>8.1f}")
+        old = (baseline or {}).get(route)
+        if old:
+            change = lambda key: (row[key] - old[key]) / old[key] * 100 if old[key] else 0.0
+            line += f"   p50 {change('p50'):+6.1f}%  p95 {change('p95'):+6.1f}%  p99 {change('p99'):+6.1f}%"
+        print(line)
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def parse_mix(text):
+    mix = dict(DEFAULT_MIX)
+    if text:
+        mix = {}
+        for part in text.split(','):
+            name, _, weight = part.partition('=')
+            if name not in DEFAULT_MIX:
+                raise SystemExit(f'unknown route {name!r}; choose from {", ".join(DEFAULT_MIX)}')
+            mix[name] = float(weight or 1)
+    return mix
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--clients', type=int, default=8, help='concurrent clients')
+    parser.add_argument('--requests', type=int, default=2000, help='total measured requests')
+    parser.add_argument('--warmup', type=int, default=100, help='unmeasured requests first')
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--parties', type=int, default=40)
+    parser.add_argument('--big-parties', type=int, default=0,
+                        help="extra parties all including the first user")
+    parser.add_argument('--mix', help='route weights, e.g. index=3,party_charts=1')
+    parser.add_argument('--json', help='save results to this file')
+    parser.add_argument('--compare', help='show changes against results saved with --json')
+    parser.add_argument('--verbose', action='store_true', help="show the app's own output")
+    args = parser.parse_args()
+    mix = parse_mix(args.mix)
+
+    # a fresh database and cache for every run, and a local fake LeetCode; these
+    # must be set before the app modules are imported
+    workdir = tempfile.mkdtemp(prefix='leetparty-load-')
+    os.environ['LEETPARTY_DB_BACKEND'] = 'sqlite'
+    os.environ['LEETPARTY_SQLITE_PATH'] = os.path.join(workdir, 'load.db')
+    os.environ['LEETPARTY_CACHE_PATH'] = os.path.join(workdir, 'cache.db')
+    os.environ['LEETCODE_GRAPHQL_URL'] = start_stub()
+    os.environ.setdefault('LEETCODE_MAX_RPS', '1000')
+    os.environ.setdefault('LEETCODE_BURST', '1000')
+
+    import app
+    import db_backend
+    import db_queries
+    from bench_queries import seed
+
+    conn = db_backend.connect()
+    start = time.perf_counter()
+    pids, cpids = seed(conn, num_users=args.users, num_parties=args.parties, tag='load',
+                       big_parties=args.big_parties)
+    users = [{'pid': p['pid'], 'username': p['username']}
+             for p in db_queries.get_people_by_lc_username(conn)]
+    conn.close()
+    print(f'seeded {len(pids)} users, {len(cpids)} parties in {time.perf_counter() - start:.1f}s '
+          f'({workdir})')
+
+    app.app.logger.disabled = True
+    routes = list(mix)
+    weights = [mix[r] for r in routes]
+
+    def run(num_requests, seed_base):
+        results = []
+        threads = []
+        per_client = num_requests // args.clients
+        for i in range(args.clients):
+            user = users[i % len(users)]
+            threads.append(threading.Thread(
+                target=run_client,
+                args=(app.app, user, routes, weights, per_client, seed_base + i,
+                      pids, cpids, results)))
+        start = time.perf_counter()
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        return results, time.perf_counter() - start
+
+    # the routes print progress notes; keep them out of the report
+    quiet = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(None)
+    with quiet:
+        run(args.warmup, 1000)
+        results, elapsed = run(args.requests, 0)
+    summary = summarize(results, elapsed)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            saved = json.load(f)
+        baseline = saved['routes']
+        print(f"compared with {args.compare} (commit {saved.get('commit')}, {saved.get('date')})")
+    print(f'{len(results)} requests from {args.clients} clients in {elapsed:.1f}s')
+    print_summary(summary, baseline)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({
+                'commit': git_commit(),
+                'date': datetime.datetime.now().isoformat(' ', 'seconds'),
+                'args': vars(args),
+                'mix': mix,
+                'routes': summary,
+            }, f, indent=2)
+        print(f'saved {args.json}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,42 @@
+# Written by Jessica Dai, Sophie Lin, Nessa Tong, Ashley Yang (Olin)
+# Login throughput benchmark: how many password checks per second can we do
+# when many requests log in at once? Runs without the database.
+#
+#   python bench_login.py [num_logins] [num_threads]
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import bcrypt_utils as bc
+
+num_logins = int(sys.argv[1]) if len(sys.argv) > 1 else 64
+num_threads = int(sys.argv[2]) if len(sys.argv) > 2 else 16
+
+print(f"bcrypt rounds={bc.BCRYPT_ROUNDS} workers={bc.BCRYPT_WORKERS} "
+      f"max_pending={bc.BCRYPT_MAX_PENDING}")
+
+stored = bc.signup_hash("hunter2")
+
+def one_login(_):
+    start = time.perf_counter()
+    try:
+        ok = bc.verify_password("hunter2", stored)
+    except bc.BcryptBusyError:
+        ok = None
+    return ok, time.perf_counter() - start
+
+start = time.perf_counter()
+with ThreadPoolExecutor(max_workers=num_threads) as ex:
+    results = list(ex.map(one_login, range(num_logins)))
+elapsed = time.perf_counter() - start
+
+latencies = sorted(t for ok, t in results if ok is not None)
+busy = sum(1 for ok, _ in results if ok is None)
+wrong = sum(1 for ok, _ in results if ok is False)
+
+print(f"{num_logins} logins with {num_threads} threads in {elapsed:.2f}s "
+      f"-> {num_logins / elapsed:.1f} logins/s")
+if latencies:
+    print(f"p50={latencies[len(latencies) // 2] * 1000:.0f}ms "
+          f"p95={latencies[int(len(latencies) * 0.95) - 1] * 1000:.0f}ms")
+print(f"rejected (busy)={busy} failed checks={wrong}")
@@ -0,0 +1,139 @@
+# Written by Jessica Dai, Sophie Lin, Nessa Tong, Ashley Yang (Olin)
+# Query benchmark: times the app's main read paths against whichever
+# backend db_backend is configured for, so MySQL and SQLite runs compare.
+#
+#   python bench_queries.py --seed                      # MySQL (course server)
+#   LEETPARTY_DB_BACKEND=sqlite LEETPARTY_SQLITE_PATH=/tmp/bench.db \
+#       python bench_queries.py --seed
+#
+# --seed adds a synthetic population (usernames start with 'bench_') first.
+import argparse
+import datetime
+import random
+import time
+
+import db_backend
+import db_queries
+import friend_recs
+from leetcode_client import rebuild_activity, recompute_person_stats
+
+
+def seed(conn, num_users=200, num_parties=40, subs_per_user=150, num_problems=3000, tag=None,
+         big_parties=0):
+    """
+    Insert a synthetic population. Returns (pids, cpids). Usernames are
+    bench_<tag>_<i>; tag defaults to the current time so reseeding the same
+    database doesn't collide. big_parties more parties all include the
+    first user, the /my_parties worst case.
+    """
+    rng = random.Random(304)
+    curs = db_backend.dict_cursor(conn)
+    diffs = ['easy', 'medium', 'hard']
+    curs.executemany(
+        'INSERT IGNORE INTO problem (lc_problem, title_slug, title, difficulty) VALUES (%s, %s, %s, %s)',
+        [(n, f'problem-{n}', f'Problem {n}', diffs[n % 3]) for n in range(1, num_problems + 1)],
+    )
+
+    run = tag if tag is not None else int(time.time())
+    pids = []
+    for i in range(num_users):
+        pids.append(db_queries.create_person(conn, f'Bench {i}', f'bench_{run}_{i}', f'bench_{run}_{i}'))
+
+    today = datetime.date.today()
+    rows = []
+    for pid in pids:
+        for lc_problem in rng.sample(range(1, num_problems + 1), subs_per_user):
+            rows.append((pid, lc_problem, today - datetime.timedelta(days=rng.randint(0, 365))))
+    curs.executemany(
+        'INSERT IGNORE INTO submission (pid, lc_problem, submission_date) VALUES (%s, %s, %s)',
+        rows,
+    )
+
+    follows = {(p, q) for p in pids for q in rng.sample(pids, min(15, len(pids))) if p != q}
+    curs.executemany('INSERT IGNORE INTO connection (p1, p2) VALUES (%s, %s)', list(follows))
+
+    cpids = []
+    for i in range(num_parties):
+        start = today - datetime.timedelta(days=rng.randint(0, 120))
+        cpid = db_queries.create_code_party(conn, f'Bench Party {i}', 50, start,
+                                            start + datetime.timedelta(days=rng.randint(7, 90)))
+        db_queries.assign_invitees_to_party(
+            conn, cpid, rng.sample(pids, min(rng.randint(3, 25), len(pids))))
+        cpids.append(cpid)
+
+    # one power user who belongs to many parties (the /my_parties worst case)
+    for i in range(big_parties):
+        start = today - datetime.timedelta(days=rng.randint(0, 365))
+        cpid = db_queries.create_code_party(conn, f'Bench Big Party {i}', 50, start,
+                                            start + datetime.timedelta(days=30))
+        db_queries.assign_invitees_to_party(
+            conn, cpid, [pids[0]] + rng.sample(pids[1:], min(10, len(pids) - 1)))
+        cpids.append(cpid)
+
+    for pid in pids:
+        rebuild_activity(conn, pid)
+        recompute_person_stats(conn, pid)
+    friend_recs.rebuild_all(conn)
+    conn.commit()
+    curs.close()
+    return pids, cpids
+
+
+def timed(label, fn, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    per_call = (time.perf_counter() - start) / repeat
+    print(f'{label:<34} {per_call * 1000:8.3f} ms')
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--seed', action='store_true', help='insert synthetic data first')
+    parser.add_argument('--repeat', type=int, default=50)
+    args = parser.parse_args()
+
+    print(f'backend: {db_backend.conf()}')
+    conn = db_backend.connect()
+    if args.seed:
+        start = time.perf_counter()
+        pids, cpids = seed(conn, big_parties=120)
+        print(f'seeded {len(pids)} users, {len(cpids)} parties in {time.perf_counter() - start:.1f}s')
+    else:
+        pids = [p['pid'] for p in db_queries.get_people_by_lc_username(conn)]
+        curs = db_backend.dict_cursor(conn)
+        curs.execute('SELECT cpid FROM code_party')
+        cpids = [r['cpid'] for r in curs.fetchall()]
+    if not pids or not cpids:
+        print('no users/parties to query; rerun with --seed')
+        return
+
+    rng = random.Random(1)
+    pid = lambda: rng.choice(pids)
+    cpid = lambda: rng.choice(cpids)
+    n = args.repeat
+
+    timed('get_leaderboard', lambda: db_queries.get_leaderboard(conn, limit=10), n)
+    month_start = datetime.date.today().replace(day=1)
+    timed('get_activity_leaderboard (month)',
+          lambda: db_queries.get_activity_leaderboard(conn, month_start, limit=10), n)
+    timed('get_profile', lambda: db_queries.get_profile(conn, pid()), n)
+    timed('get_followers + get_follows', lambda: (db_queries.get_followers(conn, pid()),
+                                                  db_queries.get_follows(conn, pid())), n)
+    timed('find_friends', lambda: db_queries.find_friends(conn, pid()), n)
+    timed('search_friends', lambda: db_queries.search_friends(conn, pid(), 'bench_1'), n)
+    timed('get_parties_for_user', lambda: db_queries.get_parties_for_user(conn, pid()), n)
+    busiest = max(pids, key=lambda p: len(db_queries.get_parties_for_user(conn, p)))
+    num_parties = len(db_queries.get_parties_for_user(conn, busiest))
+    timed(f'get_parties_for_user ({num_parties} parties)',
+          lambda: db_queries.get_parties_for_user(conn, busiest), n)
+    timed('get_party_members', lambda: db_queries.get_party_members(conn, cpid()), n)
+    timed('get_party_submissions', lambda: db_queries.get_party_submissions(conn, cpid()), n)
+    timed('get_problems_solved_today', lambda: db_queries.get_problems_solved_today(conn, pid()), n)
+    timed('recompute_person_stats', lambda: recompute_person_stats(conn, pid()), n)
+    conn.rollback()
+    conn.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,108 @@
+# Written by Jessica Dai, Sophie Lin, Nessa Tong, Ashley Yang (Olin)
+# Row-shape benchmark: loads one big party's submissions (10k rows by
+# default) in each of db_backend's row shapes and reports how long the
+# fetch takes, how much memory the result holds, and the peak while
+# building the party charts from it.
+#
+#   python bench_rows.py                         # scratch SQLite database
+#   python bench_rows.py --members 100 --subs 300
+#
+# Memory comes from tracemalloc, so it counts Python objects only (not the
+# database driver's own buffers). Times are measured in separate runs with
+# tracemalloc off.
+import argparse
+import datetime
+import os
+import random
+import tempfile
+import time
+import tracemalloc
+
+
+def seed_party(conn, members, subs_per_member, num_problems=3000):
+    """One party a year long with members * subs_per_member submissions in it. Returns cpid."""
+    import db_backend
+    import db_queries
+
+    rng = random.Random(304)
+    curs = db_backend.dict_cursor(conn)
+    diffs = ['easy', 'medium', 'hard']
+    curs.executemany(
+        'INSERT IGNORE INTO problem (lc_problem, title_slug, title, difficulty) VALUES (%s, %s, %s, %s)',
+        [(n, f'problem-{n}', f'Problem {n}', diffs[n % 3]) for n in range(1, num_problems + 1)],
+    )
+    run = int(time.time())
+    pids = [db_queries.create_person(conn, f'Rows {i}', f'rows_{run}_{i}', f'rows_{run}_{i}')
+            for i in range(members)]
+    today = datetime.date.today()
+    start = today - datetime.timedelta(days=365)
+    cpid = db_queries.create_code_party(conn, 'Rows Party', subs_per_member * members, start,
+                                        today + datetime.timedelta(days=1))
+    db_queries.assign_invitees_to_party(conn, cpid, pids)
+    rows = [(pid, lc_problem, start + datetime.timedelta(days=rng.randint(0, 365)))
+            for pid in pids
+            for lc_problem in rng.sample(range(1, num_problems + 1), subs_per_member)]
+    curs.executemany(
+        'INSERT IGNORE INTO submission (pid, lc_problem, submission_date) VALUES (%s, %s, %s)',
+        rows,
+    )
+    conn.commit()
+    curs.close()
+    return cpid
+
+
+def measure(fn, repeat):
+    """(best ms over repeat runs, retained kB, peak kB) for fn()."""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, (time.perf_counter() - start) * 1000)
+    tracemalloc.start()
+    result = fn()
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    return best, retained / 1024, peak / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--members', type=int, default=50)
+    parser.add_argument('--subs', type=int, default=200, help='submissions per member')
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    if 'LEETPARTY_DB_BACKEND' not in os.environ:
+        workdir = tempfile.mkdtemp(prefix='leetparty-rows-')
+        os.environ['LEETPARTY_DB_BACKEND'] = 'sqlite'
+        os.environ['LEETPARTY_SQLITE_PATH'] = os.path.join(workdir, 'rows.db')
+        os.environ['LEETPARTY_CACHE_PATH'] = os.path.join(workdir, 'cache.db')
+
+    import db_backend
+    import db_queries
+    from party_charts import build_chart_data
+
+    conn = db_backend.connect()
+    cpid = seed_party(conn, args.members, args.subs)
+    count = len(db_queries.get_party_submissions(conn, cpid, shape='tuples'))
+    print(f'party {cpid}: {count} submissions from {args.members} members '
+          f'({db_backend.DB_BACKEND})')
+
+    print(f"{'shape':<8} {'fetch ms':>9} {'held kB':>9} {'peak kB':>9}"
+          f"   {'+charts ms':>10} {'peak kB':>9}")
+    for shape in db_backend.ROW_SHAPES:
+        fetch = lambda: db_queries.get_party_submissions(conn, cpid, shape=shape)
+        fetch_ms, held, peak = measure(fetch, args.repeat)
+        line = f'{shape:<8} {fetch_ms:>9.1f} {held:>9.0f} {peak:>9.0f}'
+        if shape in ('dicts', 'columns'):
+            # what the /api/party/<cpid>/charts and finalize paths do
+            charts = lambda: build_chart_data(fetch(), 50)
+            charts_ms, _, charts_peak = measure(charts, args.repeat)
+            line += f'   {charts_ms:>10.1f} {charts_peak:>9.0f}'
+        print(line)
+    conn.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,111 @@
+# Written by Jessica Dai, Sophie Lin, Nessa Tong, Ashley Yang (Olin)
+# Startup benchmark: how long `import app` takes and how much memory each
+# forked worker uses, with and without preloading the heavy modules.
+#
+#   LEETPARTY_DB_BACKEND=sqlite python bench_startup.py --workers 4
+#
+# Each mode runs in a fresh interpreter that imports the app, forks the
+# workers (like gunicorn --preload), and has every worker build one party
+# chart, the first request that needs pandas. Memory comes from
+# /proc/<pid>/smaps_rollup, so the numbers are Linux only. "private" is what
+# a worker does not share with the master; that is the per-worker cost.
+import argparse
+import datetime
+import json
+import os
+import subprocess
+import sys
+import time
+
+
+def memory_kb():
+    """{'rss', 'pss', 'private'} in kB for this process."""
+    fields = {}
+    with open('/proc/self/smaps_rollup') as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) >= 2 and parts[1].isdigit():
+                fields[parts[0].rstrip(':')] = int(parts[1])
+    return {
+        'rss': fields.get('Rss', 0),
+        'pss': fields.get('Pss', 0),
+        'private': fields.get('Private_Clean', 0) + fields.get('Private_Dirty', 0),
+    }
+
+
+def sample_submissions(n=2000, members=10):
+    today = datetime.date.today()
+    return [{'name': f'member {i % members}',
+             'submission_date': today - datetime.timedelta(days=i % 30),
+             'difficulty': ('easy', 'medium', 'hard')[i % 3]}
+            for i in range(n)]
+
+
+def run_child(preload, workers):
+    """Import the app, fork workers, print one JSON line per worker."""
+    start = time.perf_counter()
+    import app
+    app.create_app(preload=preload)
+    import_ms = (time.perf_counter() - start) * 1000
+    print(json.dumps({'role': 'master', 'import_ms': import_ms, **memory_kb()}), flush=True)
+
+    subs = sample_submissions()
+    children = []
+    for _ in range(workers):
+        read_fd, write_fd = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            os.close(read_fd)
+            start = time.perf_counter()
+            with app.app.app_context():
+                from party_charts import build_chart_data
+                build_chart_data(subs, 50)
+            first_chart_ms = (time.perf_counter() - start) * 1000
+            line = json.dumps({'role': 'worker', 'first_chart_ms': first_chart_ms, **memory_kb()})
+            os.write(write_fd, line.encode() + b'\n')
+            os._exit(0)
+        os.close(write_fd)
+        children.append((pid, read_fd))
+
+    for pid, read_fd in children:
+        with os.fdopen(read_fd) as f:
+            print(f.read().strip(), flush=True)
+        os.waitpid(pid, 0)
+
+
+def run_mode(preload, workers):
+    out = subprocess.run(
+        [sys.executable, __file__, '--child', '--workers', str(workers)]
+        + (['--preload'] if preload else []),
+        capture_output=True, text=True, check=True,
+    ).stdout
+    return [json.loads(line) for line in out.splitlines() if line.startswith('{')]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--preload', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(args.preload, args.workers)
+        return
+
+    for preload in (False, True):
+        rows = run_mode(preload, args.workers)
+        master = rows[0]
+        workers = rows[1:]
+        print(f"{'preload' if preload else 'lazy':<8} import app: {master['import_ms']:7.1f} ms"
+              f"   master rss {master['rss'] / 1024:6.1f} MB")
+        for i, w in enumerate(workers):
+            print(f"  worker {i}: first chart {w['first_chart_ms']:7.1f} ms"
+                  f"   rss {w['rss'] / 1024:6.1f} MB   pss {w['pss'] / 1024:6.1f} MB"
+                  f"   private {w['private'] / 1024:6.1f} MB")
+        total_private = sum(w['private'] for w in workers) / 1024
+        print(f"  total private across {len(workers)} workers: {total_private:.1f} MB")
+
+
+if __name__ == '__main__':
+    main()
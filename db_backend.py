@@ -0,0 +1,242 @@
+# Written by Jessica Dai, Sophie Lin, Nessa Tong, Ashley Yang (Olin)
+# db_backend.py
+# Picks the database the app talks to: the course MySQL server through
+# cs304dbi (default), or an embedded SQLite file.
+#
+# Query code calls db_backend.connect() / dict_cursor(conn) / cursor(conn)
+# and keeps writing MySQL-flavored SQL with %s placeholders. On SQLite the
+# few MySQL-only bits we use (INSERT IGNORE, ON DUPLICATE KEY UPDATE,
+# CURDATE(), NOW(), CURRENT_DATE) are rewritten per statement.
+#
+#   LEETPARTY_DB_BACKEND=sqlite LEETPARTY_SQLITE_PATH=leetparty.db python app.py
+import collections
+import datetime
+import functools
+import os
+import re
+import sqlite3
+
+DB_BACKEND = os.environ.get('LEETPARTY_DB_BACKEND', 'mysql')
+DATABASE = os.environ.get('LEETPARTY_DATABASE', 'leetcode_db')
+SQLITE_PATH = os.environ.get('LEETPARTY_SQLITE_PATH', 'leetparty.db')
+SQLITE_SCHEMA = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'sqlite_schema.sql')
+
+# Applied to every new SQLite connection. WAL lets readers run while a
+# refresh writes; synchronous=NORMAL is durable enough under WAL.
+SQLITE_PRAGMAS = [
+    'PRAGMA journal_mode = WAL',
+    'PRAGMA synchronous = NORMAL',
+    'PRAGMA foreign_keys = ON',
+    'PRAGMA busy_timeout = 5000',
+    'PRAGMA temp_store = MEMORY',
+    'PRAGMA cache_size = -32000',       # 32 MB page cache
+    'PRAGMA mmap_size = 268435456',     # 256 MB
+]
+
+if DB_BACKEND == 'mysql':
+    import cs304dbi as dbi
+    dbi.conf(DATABASE)
+
+# prefix for shared cache keys so two databases on one host never mix
+CACHE_NAMESPACE = f'sqlite:{os.path.abspath(SQLITE_PATH)}' if DB_BACKEND == 'sqlite' else f'mysql:{DATABASE}'
+
+
+def conf():
+    """Describe the configured database (for startup logs)."""
+    if DB_BACKEND == 'sqlite':
+        return f'sqlite:{SQLITE_PATH}'
+    return dbi.conf(DATABASE)
+
+
+def read_cnf(cnf_file):
+    """Read a MySQL DSN (e.g. for a replica) from a my.cnf-style file."""
+    dsn = dbi.read_cnf(cnf_file)
+    dsn['database'] = DATABASE
+    return dsn
+
+
+def connect(dsn=None):
+    """Open a new connection on the configured backend."""
+    if DB_BACKEND == 'sqlite':
+        return SqliteConnection(SQLITE_PATH)
+    return dbi.connect(dsn) if dsn else dbi.connect()
+
+
+def dict_cursor(conn):
+    """Cursor whose rows are dicts keyed by column name."""
+    if hasattr(conn, 'dict_cursor'):
+        return conn.dict_cursor()
+    return dbi.dict_cursor(conn)
+
+
+def cursor(conn):
+    """Cursor whose rows are plain tuples."""
+    if hasattr(conn, 'tuple_cursor'):
+        return conn.tuple_cursor()
+    return dbi.cursor(conn)
+
+
+def tuple_cursor_for(curs):
+    """A tuple cursor on the same connection (and transaction) as curs."""
+    if isinstance(curs, SqliteCursor):
+        return SqliteCursor(curs._cursor.connection.cursor())
+    return dbi.cursor(curs.connection)
+
+
+# ---------------- Row shapes for big results ----------------
+# A dict per row costs several times the row's data. Bulk queries run on a
+# tuple cursor and hand fetch_rows() the shape their caller wants:
+#   'dicts'    list of {column: value}      (what dict_cursor gives)
+#   'tuples'   list of plain tuples
+#   'records'  list of namedtuples: attribute access, no per-row dict
+#   'columns'  {column: [values...]}        (what pandas wants)
+ROW_SHAPES = ('dicts', 'tuples', 'records', 'columns')
+FETCH_CHUNK = 1000
+
+
+@functools.lru_cache(maxsize=128)
+def record_class(columns):
+    """namedtuple class for a tuple of column names (cached)."""
+    return collections.namedtuple('Record', columns, rename=True)
+
+
+def fetch_rows(curs, shape='dicts'):
+    """Fetch the rest of an executed tuple cursor's result in the given shape."""
+    names = tuple(col[0] for col in curs.description)
+    if shape == 'tuples':
+        return list(curs.fetchall())
+    if shape == 'dicts':
+        return [dict(zip(names, row)) for row in curs.fetchall()]
+    if shape == 'records':
+        make = record_class(names)._make
+        return [make(row) for row in curs.fetchall()]
+    if shape == 'columns':
+        columns = [[] for _ in names]
+        # a chunk at a time, so the full list of row tuples never exists
+        while True:
+            chunk = curs.fetchmany(FETCH_CHUNK)
+            if not chunk:
+                break
+            for values, column in zip(zip(*chunk), columns):
+                column.extend(values)
+        return dict(zip(names, columns))
+    raise ValueError(f'unknown row shape {shape!r}; use one of {ROW_SHAPES}')
+
+
+# ---------------- SQLite ----------------
+
+sqlite3.register_adapter(datetime.date, lambda d: d.isoformat())
+sqlite3.register_adapter(datetime.datetime, lambda d: d.isoformat(' ', 'seconds'))
+sqlite3.register_converter('DATE', lambda b: datetime.date.fromisoformat(b.decode()))
+sqlite3.register_converter('DATETIME', lambda b: datetime.datetime.fromisoformat(b.decode()))
+
+_MYSQL_REWRITES = [
+    (re.compile(r'%s'), '?'),
+    (re.compile(r'\bINSERT\s+IGNORE\b', re.I), 'INSERT OR IGNORE'),
+    (re.compile(r'\bON\s+DUPLICATE\s+KEY\s+UPDATE\b', re.I), 'ON CONFLICT DO UPDATE SET'),
+    (re.compile(r'\bVALUES\((`?\w+`?)\)', re.I), r'excluded.\1'),
+    (re.compile(r'\bCURDATE\(\)|\bCURRENT_DATE\b', re.I), "date('now', 'localtime')"),
+    (re.compile(r'\bNOW\(\)', re.I), "datetime('now', 'localtime')"),
+    # SQLite has one writer at a time, so there are no row locks to take
+    (re.compile(r'\s+FOR\s+UPDATE\b', re.I), ''),
+]
+
+
+@functools.lru_cache(maxsize=512)
+def translate_sql(query):
+    """Rewrite a MySQL-flavored statement for SQLite."""
+    for pattern, repl in _MYSQL_REWRITES:
+        query = pattern.sub(repl, query)
+    return query
+
+
+def _dict_row(cursor, row):
+    return {col[0]: value for col, value in zip(cursor.description, row)}
+
+
+class SqliteCursor:
+    """DB-API cursor that accepts the app's MySQL-flavored SQL."""
+
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    def execute(self, query, args=()):
+        self._cursor.execute(translate_sql(query), tuple(args or ()))
+        return self._cursor.rowcount
+
+    def executemany(self, query, rows):
+        self._cursor.executemany(translate_sql(query), [tuple(r) for r in rows])
+        return self._cursor.rowcount
+
+    def fetchone(self):
+        return self._cursor.fetchone()
+
+    def fetchall(self):
+        return self._cursor.fetchall()
+
+    def fetchmany(self, size):
+        return self._cursor.fetchmany(size)
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    @property
+    def rowcount(self):
+        return self._cursor.rowcount
+
+    @property
+    def lastrowid(self):
+        return self._cursor.lastrowid
+
+    @property
+    def description(self):
+        return self._cursor.description
+
+    def close(self):
+        self._cursor.close()
+
+
+class SqliteConnection:
+    """An embedded SQLite database with the app's schema and tuned pragmas."""
+
+    def __init__(self, path):
+        self._conn = sqlite3.connect(
+            path,
+            detect_types=sqlite3.PARSE_DECLTYPES,
+            check_same_thread=False,
+        )
+        for pragma in SQLITE_PRAGMAS:
+            self._conn.execute(pragma)
+        _ensure_schema(self._conn, path)
+
+    def dict_cursor(self):
+        curs = self._conn.cursor()
+        curs.row_factory = _dict_row
+        return SqliteCursor(curs)
+
+    def tuple_cursor(self):
+        return SqliteCursor(self._conn.cursor())
+
+    def cursor(self, *args):
+        return self.tuple_cursor()
+
+    def commit(self):
+        self._conn.commit()
+
+    def rollback(self):
+        self._conn.rollback()
+
+    def close(self):
+        self._conn.close()
+
+
+_schema_ready = set()
+
+
+def _ensure_schema(conn, path):
+    """Create the tables the first time this process opens a database file."""
+    if path in _schema_ready:
+        return
+    with open(SQLITE_SCHEMA) as f:
+        conn.executescript(f.read())
+    _schema_ready.add(path)
@@ -1,11 +1,12 @@
 # By Sophie Lin, Ashley Yang, Nessa Tong, Jessica Dai
 # SQL queries to search the database
-import cs304dbi as dbi
-print(dbi.conf('leetcode_db'))
+import db_backend
+from db_routing import reads, writes
 
+@reads
 def get_profile(conn, pid):
     """ Retrieve all information from a user's profile based on pid"""
-    curs = dbi.dict_cursor(conn)
+    curs = db_backend.dict_cursor(conn)
     curs.execute('''
                  SELECT person.pid, name, username, lc_username, latest_submission, current_streak, longest_streak, total_problems, num_coins, personal_goal, last_refreshed, filename
                  FROM person left join picfile
@@ -16,9 +17,10 @@ def get_profile(conn, pid):
     curs.close()
     return result
 
+@reads
 def get_followers(conn, pid):
     """Get the users that the user's (with the pid) follows """
-    curs = dbi.dict_cursor(conn)
+    curs = db_backend.dict_cursor(conn)
     curs.execute('''
                 SELECT p.pid, p.name, p.lc_username, p.username
                 FROM person p
@@ -31,10 +33,11 @@ def get_followers(conn, pid):
     curs.close()
     return result
 
+@reads
 def get_follows(conn, pid):
     """ Get the users that the user's (with the pid) follows """
 
-    curs = dbi.dict_cursor(conn)
+    curs = db_backend.dict_cursor(conn)
     curs.execute('''
                 SELECT p.pid, p.name, p.lc_username, p.username
                 FROM person p
@@ -48,11 +51,12 @@ def get_follows(conn, pid):
     return result
 
 
+@reads
 def is_following(conn, follower_id, followed_id):
     """
     Returns 1 (in dictionary) if follower_id is following followed_id, returns None otherwise.
     """
-    curs = dbi.dict_cursor(conn)
+    curs = db_backend.dict_cursor(conn)
     curs.execute('''
     SELECT 1
     FROM connection
@@ -62,24 +66,33 @@ def is_following(conn, follower_id, followed_id):
     curs.close()
     return result
 
+@reads
 def find_friends(conn, pid):
-    """Find people who the user (pid) is NOT connected to"""
-    curs = dbi.dict_cursor(conn)
+    """
+    Recommended people for the user (pid) to follow, best first, from the
+    precomputed friend_recommendation table (see friend_recs.py).
+    """
+    curs = db_backend.dict_cursor(conn)
     curs.execute('''
-    select p.pid, p.name, p.lc_username  from person p where p.pid <> %s
-    and p.pid not in (
+    select p.pid, p.name, p.lc_username, r.mutuals, r.shared_parties
+    from friend_recommendation r
+    join person p on p.pid = r.candidate
+    where r.pid = %s
+    and r.candidate not in (
       select c.p2 from connection c where c.p1 = %s
     )
+    order by r.score desc, r.mutuals desc, r.candidate
     limit 30;
     ''', [pid, pid])
     result = curs.fetchall()
     curs.close()
     return result
 
+@reads
 def search_friends(conn, pid, search_term):
     """Find people who the user (pid) is NOT connected to based on a search term """
     search_term = f"%{search_term.lower()}%"
-    curs = dbi.dict_cursor(conn)
+    curs = db_backend.dict_cursor(conn)
     curs.execute('''
     select p.pid, p.name, p.lc_username 
     from person p 
@@ -96,9 +109,10 @@ def search_friends(conn, pid, search_term):
     curs.close()
     return result
 
+@writes
 def follow(conn, pid1, pid2):
     """ Create connection where user pid1 follows user pid2"""
-    curs = dbi.dict_cursor(conn)
+    curs = db_backend.dict_cursor(conn)
     curs.execute('''
     insert into `connection` (p1, p2)
     values (%s, %s)
@@ -106,9 +120,10 @@ def follow(conn, pid1, pid2):
     conn.commit()
     curs.close()
 
+@writes
 def unfollow(conn, pid1, pid2):
     """ Delete connection where user pid1 follows user pid2"""
-    curs = dbi.dict_cursor(conn)
+    curs = db_backend.dict_cursor(conn)
     curs.execute('''
     delete from `connection` 
     where p1 = %s and p2 = %s
@@ -116,9 +131,10 @@ def unfollow(conn, pid1, pid2):
     conn.commit()
     curs.close()
 
+@writes
 def edit_profile(conn, pid, name, username, lc_username, personal_goal):
     """ updates profile with new name and username   """
-    curs = dbi.dict_cursor(conn)
+    curs = db_backend.dict_cursor(conn)
     curs.execute('''
     update person
     set name = %s, username = %s, lc_username = %s, personal_goal = %s
@@ -127,11 +143,12 @@ def edit_profile(conn, pid, name, username, lc_username, personal_goal):
     conn.commit()
     curs.close()
 
+@writes
 def upload_profile_pic(conn, pid, filename):
     """
     Inserts or updates filename of the uploaded profile picture of the user
     """
-    curs = dbi.dict_cursor(conn)
+    curs = db_backend.dict_cursor(conn)
     curs.execute('''insert into picfile(pid, filename)
                     values (%s, %s)
                     on duplicate key update 
@@ -141,21 +158,24 @@ def upload_profile_pic(conn, pid, filename):
 
 # Login/auth queries
 
+@reads(consistent=True)
 def username_exists(conn, username):
     """checks if username exists"""
-    curs = dbi.dict_cursor(conn)
+    curs = db_backend.dict_cursor(conn)
     curs.execute('SELECT 1 FROM person WHERE username=%s', [username])
     return curs.fetchone() is not None
 
+@reads(consistent=True)
 def lc_username_exists(conn, lc_username):
     """checks if leetcode username exists """
-    curs = dbi.dict_cursor(conn)
+    curs = db_backend.dict_cursor(conn)
     curs.execute('SELECT 1 FROM person WHERE lc_username=%s', [lc_username])
     return curs.fetchone() is not None
 
+@writes
 def create_person(conn, name, username, lc_username):
     """Create a new person and return the new pid (no commit here)."""
-    curs = dbi.dict_cursor(conn)
+    curs = db_backend.dict_cursor(conn)
     curs.execute(
         '''
         INSERT INTO person (name, username, lc_username, current_streak, longest_streak,
@@ -168,9 +188,10 @@ def create_person(conn, name, username, lc_username):
     curs.close()
     return new_row
 
+@writes
 def create_userpass(conn, pid, hashed):
     """Insert password for the user (no commit here)."""
-    curs = dbi.dict_cursor(conn)
+    curs = db_backend.dict_cursor(conn)
     try:
         curs.execute(
             '''
@@ -184,25 +205,57 @@ def create_userpass(conn, pid, hashed):
     finally:
         curs.close()
 
+@writes
+def update_userpass(conn, pid, hashed):
+    """Replace the stored password hash for the user (no commit here)."""
+    curs = db_backend.dict_cursor(conn)
+    curs.execute('UPDATE userpass SET hashed = %s WHERE pid = %s', [hashed, pid])
+    curs.close()
+
+@reads(consistent=True)
 def get_login_info(conn, username):
     """Return person info + password hash for login."""
-    curs = dbi.dict_cursor(conn)
+    curs = db_backend.dict_cursor(conn)
     curs.execute('''
-        SELECT p.pid, p.username, u.hashed
+        SELECT p.pid, p.username, u.hashed, pf.filename
         FROM person AS p
         JOIN userpass AS u ON p.pid = u.pid
+        LEFT JOIN picfile AS pf ON p.pid = pf.pid
         WHERE p.username = %s
     ''', [username])
     return curs.fetchone()
 
+@reads
+def get_people_by_lc_username(conn, lc_usernames=None):
+    """
+    Return pid, username, lc_username for the given LeetCode usernames,
+    or for everyone if lc_usernames is None.
+    """
+    curs = db_backend.dict_cursor(conn)
+    if lc_usernames is None:
+        curs.execute('SELECT pid, username, lc_username FROM person ORDER BY pid')
+    elif not lc_usernames:
+        return []
+    else:
+        placeholders = ', '.join(['%s'] * len(lc_usernames))
+        curs.execute(f'''
+            SELECT pid, username, lc_username
+            FROM person
+            WHERE lc_username IN ({placeholders})
+        ''', list(lc_usernames))
+    result = curs.fetchall()
+    curs.close()
+    return result
+
 # Group queries
 
+@reads
 def get_party_invite_options(conn, pid, cpid=None, limit=50):
     """
     Returns all friends/followers/following of pid.
     If cpid is provided, skip users who are already in the party.
     """
-    curs = dbi.dict_cursor(conn)
+    curs = db_backend.dict_cursor(conn)
     
     # This case is: fetching friend list(potential invitees) for a PRE EXISTING PARTY
     if cpid:
@@ -238,18 +291,20 @@ def get_party_invite_options(conn, pid, cpid=None, limit=50):
     return curs.fetchall()
  
 
+@writes
 def create_code_party(conn, party_name, party_goal, party_start, party_end):
     """Create a new code party and return its cpid"""
-    curs = dbi.dict_cursor(conn)
+    curs = db_backend.dict_cursor(conn)
     curs.execute('''
         INSERT INTO code_party (name, party_goal, party_start, party_end)
         VALUES (%s, %s, %s, %s)
     ''', [party_name, party_goal, party_start, party_end])
     return curs.lastrowid
 
+@writes
 def assign_user_to_party(conn, pid, cpid):
     """Add a user to a party"""
-    curs = dbi.dict_cursor(conn)
+    curs = db_backend.dict_cursor(conn)
     #look into how to handle an error of in case someone tries to insert a duplicate!! / read about insert ignore?
     curs.execute('''
         INSERT INTO party_membership (pid, cpid)
@@ -257,6 +312,7 @@ def assign_user_to_party(conn, pid, cpid):
     ''', [pid, cpid])
 
 
+@writes
 def assign_invitees_to_party(conn, cpid, pid_list):
     """
     Assigns multiple users(invitee list) to a party. 
@@ -265,7 +321,7 @@ def assign_invitees_to_party(conn, cpid, pid_list):
     if not pid_list:
         return cpid
 
-    curs = dbi.dict_cursor(conn)
+    curs = db_backend.dict_cursor(conn)
     # setup prepared query for (pid, cpid) pairs to add to membership table
     rows = [(pid, cpid) for pid in pid_list]
     #executes a bunch of these inserts given our (pid, cpid) tuples
@@ -277,11 +333,12 @@ def assign_invitees_to_party(conn, cpid, pid_list):
     return cpid
 
 
+@reads
 def get_party_info(conn, cpid):
     """
     Returns data for a code party.
     """
-    curs = dbi.dict_cursor(conn)
+    curs = db_backend.dict_cursor(conn)
     curs.execute('''
                  SELECT cpid, name, party_goal, party_start, party_end, winner, last_bulk_refresh 
                  FROM code_party 
@@ -291,11 +348,12 @@ def get_party_info(conn, cpid):
     curs.close()
     return result
 
+@reads
 def get_party_members(conn, cpid):
     """
     Returns all users assigned to a given party.
     """
-    curs = dbi.dict_cursor(conn)
+    curs = db_backend.dict_cursor(conn)
     curs.execute('''
         SELECT p.pid, p.username, p.lc_username, p.name
         FROM person p
@@ -304,11 +362,14 @@ def get_party_members(conn, cpid):
     ''', [cpid])
     return curs.fetchall()
 
-def get_party_submissions(conn, cpid):
+@reads
+def get_party_submissions(conn, cpid, shape='dicts'):
     """
-    Returns all submissions made by members in the party with cpid
+    Returns all submissions made by members in the party with cpid:
+    name, username, difficulty, submission_date. shape is a
+    db_backend.fetch_rows shape; big parties should use 'columns'.
     """
-    curs = dbi.dict_cursor(conn)
+    curs = db_backend.cursor(conn)
     curs.execute(
         '''
         SELECT 
@@ -326,99 +387,117 @@ def get_party_submissions(conn, cpid):
         AND sub.submission_date < party.party_end;
         ''', [cpid]
     )
-    result = curs.fetchall()
+    result = db_backend.fetch_rows(curs, shape)
     curs.close()
     return result
 
 
-def get_party_submissions(conn, cpid):
+@reads
+def get_party_snapshot(conn, cpid):
     """
-    Returns all submissions made by members in the party with cpid
+    Returns the stored final snapshot row (compressed payload) of an ended
+    party, or None if it hasn't been finalized (see party_finalize.py).
     """
-    curs = dbi.dict_cursor(conn)
-    curs.execute(
-        '''
-        SELECT 
-            p.name, 
-            p.username, 
-            prob.difficulty,
-            sub.submission_date
-        FROM person p
-        INNER JOIN submission sub ON sub.pid = p.pid
-        INNER JOIN problem prob ON prob.lc_problem = sub.lc_problem
-        INNER JOIN party_membership mem ON mem.pid = p.pid
-        INNER JOIN code_party party ON party.cpid = mem.cpid
-        WHERE mem.cpid = %s
-        AND sub.submission_date >= party.party_start
-        AND sub.submission_date < party.party_end;
-        ''', [cpid]
-    )
-    result = curs.fetchall()
+    curs = db_backend.dict_cursor(conn)
+    curs.execute('SELECT cpid, payload, finalized_at FROM party_snapshot WHERE cpid = %s', [cpid])
+    result = curs.fetchone()
     curs.close()
     return result
 
 
+@writes
 def remove_user_from_party(conn, pid, cpid):
     """Remove a user from a party"""
-    curs = dbi.dict_cursor(conn)
+    curs = db_backend.dict_cursor(conn)
     curs.execute('''
         DELETE FROM party_membership
         WHERE pid=%s AND cpid=%s
     ''', [pid, cpid])
 
+@reads
 def get_parties_for_user(conn, pid):
     """
     Returns all code parties that a user is a member of 
-    AND dynamically computes the status.
+    AND dynamically computes the status, plus the user's problems_solved
+    during the party and their rank among the members.
+
+    Ranks for every party come from one RANK() window over all members of
+    the user's parties, so this stays a single query however many parties
+    the user is in.
     """
-    curs = dbi.dict_cursor(conn)
+    curs = db_backend.dict_cursor(conn)
     curs.execute('''
+        WITH solved AS (
+            SELECT pm.cpid, pm.pid, COUNT(sub.sid) AS problems_solved
+            FROM party_membership mine
+            JOIN party_membership pm ON pm.cpid = mine.cpid
+            JOIN code_party cp ON cp.cpid = pm.cpid
+            LEFT JOIN submission sub
+                ON sub.pid = pm.pid
+                AND sub.submission_date >= cp.party_start
+                AND sub.submission_date < cp.party_end
+            WHERE mine.pid = %s
+            GROUP BY pm.cpid, pm.pid
+        ),
+        ranked AS (
+            SELECT cpid, pid, problems_solved,
+                RANK() OVER (PARTITION BY cpid ORDER BY problems_solved DESC) AS party_rank
+            FROM solved
+        )
         SELECT cp.cpid, cp.name, cp.party_start, cp.party_end,
             CASE 
                 WHEN CURDATE() < cp.party_start then 'upcoming'
                 WHEN CURDATE() > cp.party_end then 'completed'
                 ELSE 'in_progress'
-            END AS status
-        FROM code_party cp
-        JOIN party_membership pm ON cp.cpid = pm.cpid
-        WHERE pm.pid = %s
+            END AS status,
+            r.problems_solved,
+            r.party_rank AS `rank`
+        FROM ranked r
+        JOIN code_party cp ON cp.cpid = r.cpid
+        WHERE r.pid = %s
         ORDER BY cp.party_start DESC
-    ''', [pid])
+    ''', [pid, pid])
     return curs.fetchall()
 
 
-def get_parties_for_user(conn, pid):
+@reads
+def get_parties_for_members(conn, pids, active_only=False):
     """
-    Returns all code parties (name + status) that a user is a member of.
+    Returns the cpids of parties that any of the given users belong to,
+    only in-progress ones if active_only.
     """
-    curs = dbi.dict_cursor(conn)
-    curs.execute('''
-        SELECT cp.cpid, cp.name, cp.party_start, cp.party_end,
-            CASE 
-                WHEN CURDATE() < cp.party_start then 'upcoming'
-                WHEN CURDATE() > cp.party_end then 'completed'
-                ELSE 'in_progress'
-            END AS status
-        FROM code_party cp
-        JOIN party_membership pm ON cp.cpid = pm.cpid
-        WHERE pm.pid = %s
-        ORDER BY cp.party_start DESC
-    ''', [pid])
-    return curs.fetchall()
+    if not pids:
+        return []
+    curs = db_backend.dict_cursor(conn)
+    placeholders = ', '.join(['%s'] * len(pids))
+    in_progress = 'AND CURDATE() BETWEEN cp.party_start AND cp.party_end' if active_only else ''
+    curs.execute(f'''
+        SELECT DISTINCT pm.cpid
+        FROM party_membership pm
+        JOIN code_party cp ON cp.cpid = pm.cpid
+        WHERE pm.pid IN ({placeholders})
+        {in_progress}
+    ''', list(pids))
+    result = [row['cpid'] for row in curs.fetchall()]
+    curs.close()
+    return result
 
 
+@writes
 def update_party_last_refreshed(conn, cpid):
     """Updates the timestamp that the whole party's leetcode database stats were last 
     refreshed - it happens on button press on party page only
     """
-    curs = dbi.dict_cursor(conn)
+    curs = db_backend.dict_cursor(conn)
     curs.execute('UPDATE code_party SET last_bulk_refresh = NOW() WHERE cpid=%s', [cpid])
 
 #HOMEPAGE leaderboard
+@reads
 def get_leaderboard(conn, limit=10):
-    curs = dbi.dict_cursor(conn)
+    curs = db_backend.dict_cursor(conn)
     curs.execute("""
-        SELECT person.pid, username, lc_username, num_coins, filename
+        SELECT person.pid, username, lc_username, num_coins, filename,
+               total_problems AS solved
         FROM person left join picfile
         ON person.pid = picfile.pid
         ORDER BY num_coins DESC
@@ -426,8 +505,41 @@ def get_leaderboard(conn, limit=10):
     """, [limit])
     return curs.fetchall()
 
+@reads
+def get_activity_leaderboard(conn, since, limit=10):
+    """
+    Top people by coins earned on or after `since`, summed from the
+    daily_activity buckets (one row per person per active day).
+    """
+    curs = db_backend.dict_cursor(conn)
+    curs.execute("""
+        SELECT person.pid, username, lc_username, filename,
+               totals.coins AS num_coins, totals.solved
+        FROM (
+            SELECT pid, SUM(coins) AS coins, SUM(solved) AS solved
+            FROM daily_activity
+            WHERE day >= %s
+            GROUP BY pid
+        ) AS totals
+        JOIN person ON person.pid = totals.pid
+        LEFT JOIN picfile ON person.pid = picfile.pid
+        ORDER BY num_coins DESC, totals.solved DESC
+        LIMIT %s
+    """, [since, limit])
+    return curs.fetchall()
+
+@reads
+def get_activity_bitmaps(conn, pid):
+    """Return {year: bitmap bytes} of the user's active days (see activity_bitmap.py)."""
+    curs = db_backend.dict_cursor(conn)
+    curs.execute("SELECT year, bits FROM activity_bitmap WHERE pid = %s", [pid])
+    result = {int(row['year']): row['bits'] for row in curs.fetchall()}
+    curs.close()
+    return result
+
+@reads
 def get_problems_solved_today(conn, pid: int) -> int:
-    curs = dbi.dict_cursor(conn)
+    curs = db_backend.dict_cursor(conn)
     curs.execute(
         """
         SELECT COUNT(*) AS problems_today
@@ -441,19 +553,21 @@ def get_problems_solved_today(conn, pid: int) -> int:
     return row["problems_today"] if row else 0
 
 
+@reads
 def get_profile_pic(conn, pid):
-    curs = dbi.dict_cursor(conn)
+    curs = db_backend.dict_cursor(conn)
     curs.execute("""
                 select filename
                 from picfile
                 where pid=%s""", [pid])
     return curs.fetchone()
 
+@reads
 def get_upcoming_mutual_parties(conn, pid, limit=20):
     """
     Return upcoming/current parties where your friends are part of but u arent, max 5 parties
     """
-    curs = dbi.dict_cursor(conn)
+    curs = db_backend.dict_cursor(conn)
 
     curs.execute("""
     SELECT DISTINCT cp.cpid, cp.name, cp.party_start, cp.party_end
@@ -0,0 +1,117 @@
+# Written by Jessica Dai, Sophie Lin, Nessa Tong, Ashley Yang (Olin)
+# db_routing.py
+# Sends read-only queries to a replica and everything else to the primary.
+#
+# Query functions in db_queries.py are tagged @reads or @writes. When they
+# are handed a RoutedConnection, @reads functions run on the replica and
+# @writes functions (and any raw cursor, e.g. in leetcode_client.py) run on
+# the primary. Plain backend connections pass straight through, so scripts
+# that call db_backend.connect() themselves keep working unchanged.
+#
+# Point LEETPARTY_REPLICA_CNF at a my.cnf for the replica to turn routing on,
+# e.g. a second local MySQL started with --port=3307 for testing. Without it
+# (or on the SQLite backend) every query goes to the primary.
+import functools
+import os
+
+import db_backend
+
+REPLICA_CNF = os.environ.get('LEETPARTY_REPLICA_CNF')
+
+_replica_dsn = None
+
+
+def _get_replica_dsn():
+    global _replica_dsn
+    if _replica_dsn is None and REPLICA_CNF and db_backend.DB_BACKEND == 'mysql':
+        _replica_dsn = db_backend.read_cnf(REPLICA_CNF)
+    return _replica_dsn
+
+
+class RoutedConnection:
+    """
+    A primary connection plus an optional replica connection, both opened
+    lazily. Quacks like a backend connection (cursors/commit/rollback/close) by
+    delegating to the primary.
+
+    Once this connection has written, or if `sticky` was set by the caller
+    because the same session wrote recently, reads also go to the primary so
+    users always see their own writes.
+    """
+
+    def __init__(self, sticky=False):
+        self._primary = None
+        self._replica = None
+        self.sticky = sticky
+        self.wrote = False
+
+    def writer(self):
+        if self._primary is None:
+            self._primary = db_backend.connect()
+        return self._primary
+
+    def reader(self):
+        dsn = _get_replica_dsn()
+        if self.sticky or self.wrote or dsn is None:
+            return self.writer()
+        if self._replica is None:
+            self._replica = db_backend.connect(dsn)
+        return self._replica
+
+    # --- connection interface, all on the primary ---
+    def dict_cursor(self):
+        self.wrote = True
+        return db_backend.dict_cursor(self.writer())
+
+    def tuple_cursor(self):
+        self.wrote = True
+        return db_backend.cursor(self.writer())
+
+    def commit(self):
+        if self._primary is not None:
+            self._primary.commit()
+
+    def rollback(self):
+        if self._primary is not None:
+            self._primary.rollback()
+
+    def close(self):
+        for c in (self._primary, self._replica):
+            if c is not None:
+                c.close()
+        self._primary = self._replica = None
+
+
+def connect(sticky=False):
+    """Return a new RoutedConnection (see class docstring for `sticky`)."""
+    return RoutedConnection(sticky=sticky)
+
+
+def reads(fn=None, *, consistent=False):
+    """
+    Tag a query function as read-only so it may run on the replica.
+    consistent=True keeps it on the primary (e.g. uniqueness checks and
+    login lookups that must see the latest writes).
+    """
+    if fn is None:
+        return functools.partial(reads, consistent=consistent)
+
+    @functools.wraps(fn)
+    def wrapper(conn, *args, **kwargs):
+        if isinstance(conn, RoutedConnection):
+            conn = conn.writer() if consistent else conn.reader()
+        return fn(conn, *args, **kwargs)
+    wrapper.db_role = 'read'
+    return wrapper
+
+
+def writes(fn):
+    """Tag a query function as writing; it always runs on the primary."""
+    @functools.wraps(fn)
+    def wrapper(conn, *args, **kwargs):
+        if isinstance(conn, RoutedConnection):
+            conn.wrote = True
+            conn = conn.writer()
+        return fn(conn, *args, **kwargs)
+    wrapper.db_role = 'write'
+    return wrapper
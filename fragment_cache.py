@@ -0,0 +1,113 @@
+# Written by Jessica Dai, Sophie Lin, Nessa Tong, Ashley Yang (Olin)
+# fragment_cache.py
+# Caches rendered pieces of pages (and the rows behind them) in each worker.
+#
+# Keys carry data versions: a version is a number kept in shared_cache,
+# and code that changes the data behind a fragment bumps it with bump().
+# A page builds its key from the versions it depends on, so an edit by any
+# worker makes every worker miss and re-render, with nothing to invalidate.
+# Entries also expire after FRAGMENT_TTL, and only the FRAGMENT_CACHE_SIZE
+# most recently used are kept.
+#
+# In a template, wrap the fragment in a call block:
+#
+#   {% call cache_fragment('leaderboard', window, version) %}
+#     {% for user in leaderboard() %} ... {% endfor %}
+#   {% endcall %}
+#
+# On a hit the block isn't rendered at all, so pass the rows as a function
+# (see lazy()) and the query is skipped too.
+#
+#   LEETPARTY_FRAGMENT_CACHE_SIZE=512
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from markupsafe import Markup
+
+import db_backend
+import shared_cache
+
+FRAGMENT_CACHE_SIZE = int(os.environ.get('LEETPARTY_FRAGMENT_CACHE_SIZE', 512))
+FRAGMENT_TTL = 5 * 60
+# versions must outlive every fragment built on them, or an expired version
+# would fall back to 0 and match an old fragment
+VERSION_TTL = 7 * 24 * 60 * 60
+
+_entries = OrderedDict()   # key -> (expires, value)
+_lock = threading.Lock()
+_stats = {'hits': 0, 'misses': 0}
+
+
+def _version_key(name):
+    return f'version:{db_backend.CACHE_NAMESPACE}:{name}'
+
+
+def versions(*names):
+    """Current versions of the named data sets, as a tuple (0 = never bumped)."""
+    found = shared_cache.get_many([_version_key(n) for n in names])
+    return tuple(found.get(_version_key(n), 0) for n in names)
+
+
+def bump(*names):
+    """Mark the named data sets changed; fragments keyed on them go stale."""
+    version = time.time_ns()
+    shared_cache.set_many({_version_key(n): version for n in names}, VERSION_TTL)
+
+
+def get(key):
+    """Cached value for key, or None."""
+    now = time.time()
+    with _lock:
+        entry = _entries.get(key)
+        if entry is None or entry[0] <= now:
+            _stats['misses'] += 1
+            return None
+        _entries.move_to_end(key)
+        _stats['hits'] += 1
+        return entry[1]
+
+
+def put(key, value, ttl=FRAGMENT_TTL):
+    with _lock:
+        _entries[key] = (time.time() + ttl, value)
+        _entries.move_to_end(key)
+        while len(_entries) > FRAGMENT_CACHE_SIZE:
+            _entries.popitem(last=False)
+
+
+def cached(key, compute, ttl=FRAGMENT_TTL):
+    """Return the cached value for key, computing and caching it on a miss."""
+    value = get(key)
+    if value is None:
+        value = compute()
+        put(key, value, ttl)
+    return value
+
+
+def cache_fragment(*key, caller, ttl=FRAGMENT_TTL):
+    """Template global for {% call cache_fragment(...) %} blocks."""
+    return Markup(cached(('fragment',) + key, lambda: str(caller()), ttl))
+
+
+def lazy(compute):
+    """A function returning compute()'s result, computed at most once."""
+    result = []
+
+    def load():
+        if not result:
+            result.append(compute())
+        return result[0]
+    return load
+
+
+def stats():
+    """Hit/miss counts and size of this worker's cache, for /api/metrics."""
+    with _lock:
+        return dict(_stats, entries=len(_entries))
+
+
+def clear():
+    with _lock:
+        _entries.clear()
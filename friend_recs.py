@@ -0,0 +1,198 @@
+# Written by Jessica Dai, Sophie Lin, Nessa Tong, Ashley Yang (Olin)
+# friend_recs.py
+# "People you may know" for /find_friends/.
+#
+# A candidate scores MUTUAL_WEIGHT for every person you follow who follows
+# them, plus SHARED_PARTY_WEIGHT for every code party you are both in. The
+# top RECS_PER_USER candidates per person are stored in
+# friend_recommendation, so the page is one indexed lookup.
+#
+# Run this file (e.g. nightly from cron) to rebuild everyone from the
+# connection + party_membership graph, held in memory as adjacency sets.
+# Between runs, follow/unfollow calls refresh_after_follow_change(), which
+# recomputes only the people whose scores the change can move.
+#
+#   python friend_recs.py
+import argparse
+import heapq
+import time
+from collections import Counter, defaultdict
+
+import db_backend
+
+RECS_PER_USER = 30
+MUTUAL_WEIGHT = 1
+SHARED_PARTY_WEIGHT = 2
+# a follow/unfollow by someone with more followers than this only refreshes
+# their own list right away; their followers wait for the nightly rebuild
+FOLLOWER_REFRESH_LIMIT = 200
+
+
+def rank_candidates(pid, mutuals, shared_parties, following, popular, n=RECS_PER_USER):
+    """
+    Combine the per-candidate counts into the top n
+    (candidate, score, mutuals, shared_parties) tuples, best first.
+
+    People pid already follows (and pid itself) are skipped. If fewer than n
+    candidates have any score, the list is padded from `popular` (pids,
+    most-followed first) with a score of 0, so new users still see someone.
+    """
+    scores = {}
+    for cand in set(mutuals) | set(shared_parties):
+        if cand == pid or cand in following:
+            continue
+        scores[cand] = (MUTUAL_WEIGHT * mutuals.get(cand, 0)
+                        + SHARED_PARTY_WEIGHT * shared_parties.get(cand, 0))
+    best = heapq.nsmallest(
+        n, scores, key=lambda c: (-scores[c], -mutuals.get(c, 0), c))
+    recs = [(c, scores[c], mutuals.get(c, 0), shared_parties.get(c, 0)) for c in best]
+
+    for cand in popular:
+        if len(recs) >= n:
+            break
+        if cand != pid and cand not in following and cand not in scores:
+            recs.append((cand, 0, 0, 0))
+    return recs
+
+
+def store_recommendations(cursor, pid, recs):
+    """Replace pid's stored recommendations (no commit here)."""
+    cursor.execute('DELETE FROM friend_recommendation WHERE pid = %s', [pid])
+    if recs:
+        cursor.executemany('''
+            INSERT INTO friend_recommendation (pid, candidate, score, mutuals, shared_parties)
+            VALUES (%s, %s, %s, %s, %s)
+        ''', [(pid,) + rec for rec in recs])
+
+
+def _popular(cursor, limit):
+    """Most-followed pids, most followers first."""
+    cursor.execute('''
+        SELECT p2 AS pid, COUNT(*) AS followers
+        FROM connection
+        GROUP BY p2
+        ORDER BY followers DESC, p2
+        LIMIT %s
+    ''', [limit])
+    return [row['pid'] for row in cursor.fetchall()]
+
+
+def _recompute_user(cursor, pid, popular):
+    """Recompute and store one person's recommendations with a few indexed queries."""
+    cursor.execute('SELECT p2 FROM connection WHERE p1 = %s', [pid])
+    following = {row['p2'] for row in cursor.fetchall()}
+
+    # people followed by the people pid follows
+    cursor.execute('''
+        SELECT c2.p2 AS candidate, COUNT(*) AS n
+        FROM connection c1
+        JOIN connection c2 ON c2.p1 = c1.p2
+        WHERE c1.p1 = %s
+        GROUP BY c2.p2
+    ''', [pid])
+    mutuals = {row['candidate']: row['n'] for row in cursor.fetchall()}
+
+    cursor.execute('''
+        SELECT m2.pid AS candidate, COUNT(*) AS n
+        FROM party_membership m1
+        JOIN party_membership m2 ON m2.cpid = m1.cpid
+        WHERE m1.pid = %s
+        GROUP BY m2.pid
+    ''', [pid])
+    shared = {row['candidate']: row['n'] for row in cursor.fetchall()}
+
+    store_recommendations(
+        cursor, pid, rank_candidates(pid, mutuals, shared, following, popular))
+
+
+def refresh_user(conn, pid):
+    """Recompute one person's recommendations (no commit here)."""
+    cursor = db_backend.dict_cursor(conn)
+    try:
+        popular = _popular(cursor, RECS_PER_USER * 2)
+        _recompute_user(cursor, pid, popular)
+    finally:
+        cursor.close()
+
+
+def refresh_after_follow_change(conn, follower):
+    """
+    After `follower` follows or unfollows someone, recompute the lists that
+    change: the follower's own (their follows changed) and those of the
+    people who follow them (they reach new people through the follower).
+    No commit here.
+    """
+    cursor = db_backend.dict_cursor(conn)
+    try:
+        cursor.execute('SELECT p1 FROM connection WHERE p2 = %s', [follower])
+        followers = [row['p1'] for row in cursor.fetchall()]
+        affected = [follower]
+        if len(followers) <= FOLLOWER_REFRESH_LIMIT:
+            affected += followers
+        popular = _popular(cursor, RECS_PER_USER * 2)
+        for pid in affected:
+            _recompute_user(cursor, pid, popular)
+    finally:
+        cursor.close()
+
+
+def load_graph(conn):
+    """
+    Read the whole social graph into adjacency sets:
+    (pids, follows: pid -> set of pids, parties: pid -> set of cpids,
+     members: cpid -> set of pids).
+    """
+    cursor = db_backend.cursor(conn)
+    cursor.execute('SELECT pid FROM person')
+    pids = [row[0] for row in cursor.fetchall()]
+    follows = defaultdict(set)
+    cursor.execute('SELECT p1, p2 FROM connection')
+    for p1, p2 in cursor.fetchall():
+        follows[p1].add(p2)
+    parties = defaultdict(set)
+    members = defaultdict(set)
+    cursor.execute('SELECT pid, cpid FROM party_membership')
+    for pid, cpid in cursor.fetchall():
+        parties[pid].add(cpid)
+        members[cpid].add(pid)
+    cursor.close()
+    return pids, follows, parties, members
+
+
+def rebuild_all(conn):
+    """Recompute and store everyone's recommendations. Returns the number of people."""
+    pids, follows, parties, members = load_graph(conn)
+    follower_counts = Counter(p2 for targets in follows.values() for p2 in targets)
+    popular = [pid for pid, _ in follower_counts.most_common(RECS_PER_USER * 2)]
+
+    cursor = db_backend.dict_cursor(conn)
+    try:
+        for pid in pids:
+            following = follows.get(pid, set())
+            mutuals = Counter()
+            for friend in following:
+                mutuals.update(follows.get(friend, ()))
+            shared = Counter()
+            for cpid in parties.get(pid, ()):
+                shared.update(members[cpid])
+            store_recommendations(
+                cursor, pid, rank_candidates(pid, mutuals, shared, following, popular))
+    finally:
+        cursor.close()
+    return len(pids)
+
+
+def main():
+    argparse.ArgumentParser(description='Rebuild friend recommendations for everyone.').parse_args()
+    conn = db_backend.connect()
+    try:
+        start = time.perf_counter()
+        count = rebuild_all(conn)
+        conn.commit()
+    finally:
+        conn.close()
+    print(f'Rebuilt recommendations for {count} people in {time.perf_counter() - start:.1f}s.')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,103 @@
+# Written by Jessica Dai, Sophie Lin, Nessa Tong, Ashley Yang (Olin)
+# leetcode_cassette.py
+# Record LeetCode GraphQL traffic once, replay it offline as often as needed.
+#
+# A cassette is a gzipped JSON-lines file, one line per distinct call:
+#   {"op": "recentAcSubmissions", "key": ..., "variables": {...},
+#    "data": {...} or "error": "...", "ms": 212.5}
+# keyed by the query text (whitespace-insensitive) and its variables.
+# Recording appends a line the first time each call is made; replaying
+# answers from the file and never touches the network. Unknown calls
+# raise CassetteMiss rather than guess.
+#
+# leetcode_client picks this up from the environment:
+#   LEETCODE_TRANSPORT=record LEETCODE_CASSETTE=cassettes/prod.jsonl.gz python backfill.py --all
+#   LEETCODE_TRANSPORT=replay LEETCODE_CASSETTE=cassettes/prod.jsonl.gz python bench_queries.py
+#   LEETCODE_REPLAY_LATENCY=recorded   (or a fixed number of seconds) to sleep like the real thing
+import gzip
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+
+
+class CassetteMiss(LookupError):
+    """A replayed call that was never recorded."""
+    pass
+
+
+class RecordedError(Exception):
+    """Replay of a call that failed (e.g. a GraphQL error) when it was recorded."""
+    pass
+
+
+def call_key(query, variables):
+    """Stable key for a GraphQL call: hash of the normalized query + sorted variables."""
+    normalized = ' '.join(query.split())
+    digest = hashlib.sha1(normalized.encode('utf8')).hexdigest()[:12]
+    return f"{digest}:{json.dumps(variables or {}, sort_keys=True, separators=(',', ':'))}"
+
+
+def operation_name(query):
+    match = re.search(r'\b(?:query|mutation)\s+(\w+)', query)
+    return match.group(1) if match else None
+
+
+class Cassette:
+    def __init__(self, path, latency=None):
+        """
+        latency: None (answer at once), 'recorded' (sleep as long as the
+        recorded call took), or a number of seconds to sleep per call.
+        """
+        self.path = path
+        self.latency = latency
+        self.entries = {}
+        self.lock = threading.Lock()
+        if os.path.exists(path):
+            with gzip.open(path, 'rt', encoding='utf8') as f:
+                for line in f:
+                    if line.strip():
+                        entry = json.loads(line)
+                        self.entries[entry['key']] = entry
+
+    def __len__(self):
+        return len(self.entries)
+
+    def replay(self, query, variables):
+        """
+        Return the recorded data for this call. Raises RecordedError if the
+        call failed when recorded, CassetteMiss if it was never recorded.
+        """
+        entry = self.entries.get(call_key(query, variables))
+        if entry is None:
+            raise CassetteMiss(f'{operation_name(query)} {json.dumps(variables or {}, sort_keys=True)} '
+                               f'is not in {self.path}')
+        if self.latency == 'recorded':
+            time.sleep(entry.get('ms', 0) / 1000)
+        elif self.latency:
+            time.sleep(float(self.latency))
+        if 'error' in entry:
+            raise RecordedError(entry['error'])
+        return entry['data']
+
+    def record(self, query, variables, data=None, error=None, ms=0.0):
+        """Store one call's data (or error message), unless that call is already recorded."""
+        key = call_key(query, variables)
+        entry = {'op': operation_name(query), 'key': key, 'variables': variables or {},
+                 'ms': round(ms, 1)}
+        if error is not None:
+            entry['error'] = error
+        else:
+            entry['data'] = data
+        with self.lock:
+            if key in self.entries:
+                return
+            self.entries[key] = entry
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            # each append is its own gzip member; gzip.open reads them all back
+            with gzip.open(self.path, 'at', encoding='utf8') as f:
+                f.write(json.dumps(entry, separators=(',', ':')) + '\n')
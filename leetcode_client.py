@@ -1,44 +1,333 @@
 # Written by Jessica Dai, Sophie Lin, Nessa Tong, Ashley Yang (Olin)
-import requests
+import json
+import os
+import threading
+import time
 from datetime import datetime, timezone, timedelta, date
 from zoneinfo import ZoneInfo
-from typing import Any, Dict, List, Optional
-import cs304dbi as dbi
+from typing import Any, Dict, Iterator, List, Optional
+import activity_bitmap
+import db_backend
+import leetcode_cassette
+import shared_cache
 
-LEETCODE_GRAPHQL_URL = "https://leetcode.com/graphql"
+# Point this at leetcode_stub.py (e.g. http://localhost:5055/graphql) to run offline.
+LEETCODE_GRAPHQL_URL = os.environ.get("LEETCODE_GRAPHQL_URL", "https://leetcode.com/graphql")
 EASY_COIN_VALUE = 1
 MED_COIN_VALUE = 5
 HARD_COIN_VALUE = 7
 
+# Rate budget shared by every thread in this process: at most
+# LEETCODE_MAX_RPS requests per second, with bursts up to LEETCODE_BURST.
+LEETCODE_MAX_RPS = float(os.environ.get("LEETCODE_MAX_RPS", 5))
+LEETCODE_BURST = int(os.environ.get("LEETCODE_BURST", 5))
+LEETCODE_TIMEOUT = float(os.environ.get("LEETCODE_TIMEOUT", 10))
+# Identical GraphQL calls (same query and variables) made while one is in
+# flight wait for it and share its result; results are also reused for
+# LEETCODE_RESULT_TTL seconds, so a burst of refreshes of one user costs one call.
+LEETCODE_RESULT_TTL = float(os.environ.get("LEETCODE_RESULT_TTL", 5))
+# Circuit breaker: after LEETCODE_BREAKER_FAILURES consecutive failed calls
+# (network errors, timeouts, 429/5xx) calls fail immediately for
+# LEETCODE_BREAKER_COOLDOWN seconds, then a single probe call decides
+# whether LeetCode is back.
+LEETCODE_BREAKER_FAILURES = int(os.environ.get("LEETCODE_BREAKER_FAILURES", 5))
+LEETCODE_BREAKER_COOLDOWN = float(os.environ.get("LEETCODE_BREAKER_COOLDOWN", 30))
+# Where GraphQL calls go: "live" (LEETCODE_GRAPHQL_URL), "record" (live, and
+# each response is saved to the LEETCODE_CASSETTE file) or "replay" (answered
+# from that file, no network). See leetcode_cassette.py.
+LEETCODE_TRANSPORT = os.environ.get("LEETCODE_TRANSPORT", "live")
+LEETCODE_CASSETTE = os.environ.get("LEETCODE_CASSETTE", "cassettes/leetcode.jsonl.gz")
+# replay delay: unset for none, "recorded" for the recorded timings, or seconds per call
+LEETCODE_REPLAY_LATENCY = os.environ.get("LEETCODE_REPLAY_LATENCY") or None
+
+# problem metadata barely changes, so workers share it through shared_cache
+PROBLEM_META_TTL = 24 * 60 * 60
+
+# Minimum seconds between LeetCode refreshes of one person (person.last_refreshed)
+# and of one party (code_party.last_bulk_refresh). Refreshes inside the window
+# are absorbed: nothing is fetched and the stored stats stand.
+USER_REFRESH_INTERVAL = float(os.environ.get("LEETCODE_USER_REFRESH_INTERVAL", 120))
+PARTY_REFRESH_INTERVAL = float(os.environ.get("LEETCODE_PARTY_REFRESH_INTERVAL", 300))
+
 
 class LeetCodeClientError(Exception):
     """Custom error for LeetCode client issues."""
     pass
 
 
+class LeetCodeQueryError(LeetCodeClientError):
+    """LeetCode answered, but with a GraphQL error (e.g. no such user)."""
+    pass
+
+
+class LeetCodeUnavailable(LeetCodeClientError):
+    """LeetCode is failing; the circuit breaker refused the call without sending it."""
+    pass
+
+
+class _CircuitBreaker:
+    """
+    closed: calls go through. open: calls fail fast until the cooldown is
+    over. half_open: one probe call is let through; success closes the
+    breaker, failure opens it again.
+    """
+
+    def __init__(self, max_failures: int, cooldown: float):
+        self.max_failures = max_failures
+        self.cooldown = cooldown
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self.probing = False
+        self.times_opened = 0
+        self.rejected = 0
+        self.lock = threading.Lock()
+
+    def before_call(self) -> None:
+        """Raise LeetCodeUnavailable if a call shouldn't be sent now."""
+        with self.lock:
+            if self.state == "open" and time.monotonic() - self.opened_at >= self.cooldown:
+                self.state = "half_open"
+            if self.state == "closed" or (self.state == "half_open" and not self.probing):
+                self.probing = self.state == "half_open"
+                return
+            self.rejected += 1
+            retry_in = max(0.0, self.cooldown - (time.monotonic() - self.opened_at))
+        raise LeetCodeUnavailable(
+            f"LeetCode is unavailable (circuit open, retrying in {retry_in:.0f}s)")
+
+    def record_success(self) -> None:
+        with self.lock:
+            self.state = "closed"
+            self.failures = 0
+            self.probing = False
+
+    def record_failure(self) -> None:
+        with self.lock:
+            self.failures += 1
+            self.probing = False
+            if self.state == "half_open" or (
+                    self.state == "closed" and self.failures >= self.max_failures):
+                self.times_opened += 1
+                self.state = "open"
+                self.opened_at = time.monotonic()
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self.lock:
+            state = self.state
+            retry_in = 0.0
+            if state == "open":
+                retry_in = max(0.0, self.cooldown - (time.monotonic() - self.opened_at))
+                if retry_in == 0:
+                    state = "half_open"   # the next call will be the probe
+            return {
+                "state": state,
+                "consecutive_failures": self.failures,
+                "retry_in_seconds": round(retry_in, 1),
+                "times_opened": self.times_opened,
+                "calls_rejected": self.rejected,
+            }
+
+
+class _RateLimiter:
+    """Token bucket; acquire() blocks until a request may be sent."""
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self) -> None:
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+_rate_limiter = _RateLimiter(LEETCODE_MAX_RPS, LEETCODE_BURST)
+_breaker = _CircuitBreaker(LEETCODE_BREAKER_FAILURES, LEETCODE_BREAKER_COOLDOWN)
+
+
+def leetcode_available() -> bool:
+    """False while the circuit breaker is open (LeetCode recently kept failing)."""
+    return _breaker.snapshot()["state"] != "open"
+
+
+def breaker_state() -> Dict[str, Any]:
+    """The circuit breaker's state in this process, for /api/metrics."""
+    return _breaker.snapshot()
+
+
+class _Flight:
+    """One GraphQL call in progress; callers asking for the same one wait on it."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.data = None
+        self.error = None
+
+
+_flights: Dict[str, _Flight] = {}
+_recent_results: Dict[str, tuple] = {}   # key -> (expires, data)
+_flights_lock = threading.Lock()
+
+
 def _graphql_request(query: str, variables: Optional[dict] = None) -> dict:
+    """
+    Return the 'data' field of a LeetCode GraphQL call, sending at most one
+    request per (query, variables) at a time: concurrent identical calls
+    share the first one's result (or error), and a result is reused for
+    LEETCODE_RESULT_TTL seconds. The shared data must not be modified.
+
+    Raises LeetCodeClientError like _send_graphql_request.
+    """
+    key = json.dumps([query, variables or {}], sort_keys=True)
+    with _flights_lock:
+        now = time.monotonic()
+        cached = _recent_results.get(key)
+        if cached and cached[0] > now:
+            _count(requests_cached=1)
+            return cached[1]
+        flight = _flights.get(key)
+        leader = flight is None
+        if leader:
+            flight = _flights[key] = _Flight()
+
+    if not leader:
+        _count(requests_coalesced=1)
+        flight.done.wait()
+        if flight.data is None:
+            raise flight.error or LeetCodeClientError("LeetCode request was interrupted")
+        return flight.data
+
+    try:
+        flight.data = _transport(query, variables)
+    except Exception as e:
+        flight.error = e
+        raise
+    finally:
+        with _flights_lock:
+            del _flights[key]
+            if flight.data is not None and LEETCODE_RESULT_TTL > 0:
+                now = time.monotonic()
+                for k in [k for k, (expires, _) in _recent_results.items() if expires <= now]:
+                    del _recent_results[k]
+                _recent_results[key] = (now + LEETCODE_RESULT_TTL, flight.data)
+        flight.done.set()
+    return flight.data
+
+
+_cassette: Optional[leetcode_cassette.Cassette] = None
+_transport_mode = "live"
+
+
+def use_cassette(path: str, mode: str, latency=None) -> None:
+    """
+    Switch where GraphQL calls go: mode "live", "record" or "replay" (see
+    LEETCODE_TRANSPORT), with the cassette file at path.
+    """
+    global _cassette, _transport_mode
+    if mode not in ("live", "record", "replay"):
+        raise ValueError(f"unknown LeetCode transport {mode!r}")
+    _cassette = leetcode_cassette.Cassette(path, latency) if mode != "live" else None
+    _transport_mode = mode
+
+
+if LEETCODE_TRANSPORT != "live":
+    use_cassette(LEETCODE_CASSETTE, LEETCODE_TRANSPORT, LEETCODE_REPLAY_LATENCY)
+
+
+def _transport(query: str, variables: Optional[dict]) -> dict:
+    """Send one GraphQL call through the configured transport."""
+    if _transport_mode == "replay":
+        try:
+            return _cassette.replay(query, variables)
+        except leetcode_cassette.RecordedError as e:
+            raise LeetCodeQueryError(str(e)) from None
+        except leetcode_cassette.CassetteMiss as e:
+            raise LeetCodeClientError(f"Not recorded: {e}") from None
+
+    if _transport_mode == "record":
+        start = time.perf_counter()
+        try:
+            data = _send_graphql_request(query, variables)
+        except LeetCodeQueryError as e:
+            # a wrong username fails the same way every time; outages aren't kept
+            _cassette.record(query, variables, error=str(e),
+                             ms=(time.perf_counter() - start) * 1000)
+            raise
+        _cassette.record(query, variables, data=data, ms=(time.perf_counter() - start) * 1000)
+        return data
+
+    return _send_graphql_request(query, variables)
+
+
+def _send_graphql_request(query: str, variables: Optional[dict] = None) -> dict:
     """
     Send a GraphQL request to LeetCode and return the 'data' field.
 
-    Raises LeetCodeClientError if the HTTP status is not 200 or if GraphQL
-    returns an error object.
+    Waits for the process-wide rate budget before sending.
+
+    Raises LeetCodeUnavailable without sending if the circuit breaker is
+    open, and LeetCodeClientError if the HTTP status is not 200 or if
+    GraphQL returns an error object. Network errors, timeouts, 429/5xx and
+    unreadable responses count toward opening the breaker.
     """
+    import requests  # slow to import; only loaded once we actually call LeetCode
+
     payload = {"query": query, "variables": variables or {}}
     headers = {"Content-Type": "application/json"}
 
+    _breaker.before_call()
+    try:
+        return _post_graphql(requests, payload, headers)
+    except LeetCodeClientError:
+        raise   # already recorded as a success or failure
+    except BaseException:
+        # anything else (a bug, an interrupt) must still settle the call,
+        # or a half-open breaker would wait for its probe forever
+        _breaker.record_failure()
+        raise
+
+
+def _post_graphql(requests, payload: dict, headers: dict) -> dict:
+    """The call itself, for _send_graphql_request; records the outcome on _breaker."""
+    _rate_limiter.acquire()
     try:
-        resp = requests.post(LEETCODE_GRAPHQL_URL, json=payload, headers=headers)
+        resp = requests.post(LEETCODE_GRAPHQL_URL, json=payload, headers=headers,
+                             timeout=LEETCODE_TIMEOUT)
     except requests.RequestException as e:
+        _breaker.record_failure()
         raise LeetCodeClientError(f"Network error talking to LeetCode: {e}") from e
 
+    if resp.status_code == 429 or resp.status_code >= 500:
+        _breaker.record_failure()
+        raise LeetCodeClientError(
+            f"LeetCode GraphQL returned {resp.status_code}: {resp.text[:200]}"
+        )
     if resp.status_code != 200:
+        # LeetCode is up, it just refused this request
+        _breaker.record_success()
         raise LeetCodeClientError(
             f"LeetCode GraphQL returned {resp.status_code}: {resp.text[:200]}"
         )
 
-    data = resp.json()
+    try:
+        data = resp.json()
+    except ValueError as e:
+        _breaker.record_failure()
+        raise LeetCodeClientError(f"LeetCode returned a non-JSON response: {resp.text[:200]}") from e
+    _breaker.record_success()
     if "errors" in data:
-        raise LeetCodeClientError(f"LeetCode GraphQL error: {data['errors']}")
+        raise LeetCodeQueryError(f"LeetCode GraphQL error: {data['errors']}")
 
     return data.get("data", {})
 
@@ -70,6 +359,63 @@ def fetch_recent_ac_submissions(username: str, limit: int = 20) -> List[dict]:
     return subs
 
 
+def fetch_ac_submission_page(username: str, offset: int, limit: int) -> List[dict]:
+    """
+    Fetch one page of a user's ACCEPTED submissions, newest first, starting
+    `offset` entries back. Same entry shape as fetch_recent_ac_submissions.
+    """
+    query = """
+    query acSubmissionPage($username: String!, $offset: Int!, $limit: Int!) {
+      recentAcSubmissionList(username: $username, offset: $offset, limit: $limit) {
+        id
+        title
+        titleSlug
+        timestamp
+      }
+    }
+    """
+    data = _graphql_request(
+        query, {"username": username, "offset": offset, "limit": limit}
+    )
+    return data.get("recentAcSubmissionList") or []
+
+
+def iter_ac_submission_pages(
+    username: str, start_offset: int = 0, page_size: int = 50, on_no_paging=None
+) -> Iterator[tuple]:
+    """
+    Yield (next_offset, page) for a user's whole accepted history, one page
+    at a time, so callers never hold more than a page in memory.
+
+    Stops on a short or empty page, or if the server ignores `offset` and
+    hands back a page we've already seen. If the server rejects `offset`
+    outright (leetcode.com's schema has no such argument), yields the one
+    page of recent submissions it does serve and calls on_no_paging().
+    """
+    offset = start_offset
+    last_ids = None
+    while True:
+        try:
+            page = fetch_ac_submission_page(username, offset, page_size)
+        except LeetCodeQueryError:
+            if last_ids is not None:
+                raise
+            if on_no_paging:
+                on_no_paging()
+            page = fetch_recent_ac_submissions(username, limit=page_size)
+            if page:
+                yield offset + len(page), page
+            return
+        ids = [sub.get("id") for sub in page]
+        if not page or ids == last_ids:
+            return
+        offset += len(page)
+        yield offset, page
+        if len(page) < page_size:
+            return
+        last_ids = ids
+
+
 def _fetch_problem_meta_from_leetcode(title_slug: str) -> Dict[str, Any]:
     """
     Hit LeetCode's question() GraphQL to get metadata for a problem slug.
@@ -104,6 +450,60 @@ def _fetch_problem_meta_from_leetcode(title_slug: str) -> Dict[str, Any]:
     }
 
 
+def fetch_problem_list_page(skip: int, limit: int) -> tuple:
+    """
+    Fetch one page of LeetCode's problem catalog (problemsetQuestionList),
+    ordered by problem number.
+
+    Returns (total, questions) where each question has keys
+    questionFrontendId, title, titleSlug, difficulty and paidOnly.
+    """
+    query = """
+    query problemsetQuestionList($categorySlug: String, $skip: Int, $limit: Int, $filters: QuestionListFilterInput) {
+      problemsetQuestionList: questionList(categorySlug: $categorySlug, skip: $skip, limit: $limit, filters: $filters) {
+        total: totalNum
+        questions: data {
+          questionFrontendId
+          title
+          titleSlug
+          difficulty
+          paidOnly: isPaidOnly
+        }
+      }
+    }
+    """
+    data = _graphql_request(
+        query, {"categorySlug": "", "skip": skip, "limit": limit, "filters": {}}
+    )
+    result = data.get("problemsetQuestionList") or {}
+    return int(result.get("total") or 0), result.get("questions") or []
+
+
+def iter_problem_catalog(page_size: int = 100) -> Iterator[Dict[str, Any]]:
+    """
+    Yield every problem in LeetCode's catalog as a meta dict
+    (lc_problem, title_slug, title, difficulty), one page request at a time.
+    Entries without a numeric problem number are skipped.
+    """
+    skip = 0
+    while True:
+        total, questions = fetch_problem_list_page(skip, page_size)
+        for q in questions:
+            try:
+                lc_problem = int(q["questionFrontendId"])
+            except (KeyError, TypeError, ValueError):
+                continue
+            yield {
+                "lc_problem": lc_problem,
+                "title_slug": q["titleSlug"],
+                "title": q["title"],
+                "difficulty": q["difficulty"].lower(),
+            }
+        skip += len(questions)
+        if not questions or skip >= total:
+            return
+
+
 def _insert_problem_into_db(cursor, meta: Dict[str, Any], title_slug: str) -> None:
     """
     Insert or update a row in the 'problem' table from a metadata dict.
@@ -162,7 +562,8 @@ def get_problem_meta(cursor, title_slug: str) -> Dict[str, Any]:
             "difficulty": row["difficulty"],
         }
 
-    # Fallback to LeetCode and write to DB
+    # Fallback to LeetCode and write to DB (rare once sync_problems.py has run)
+    _count(problem_meta_fetches=1)
     meta = _fetch_problem_meta_from_leetcode(title_slug)
     _insert_problem_into_db(cursor, meta, title_slug)
     return meta
@@ -170,86 +571,42 @@ def get_problem_meta(cursor, title_slug: str) -> Dict[str, Any]:
 def _recompute_person_stats(cursor, pid: int) -> None:
     """
     Recompute current_streak, longest_streak, total_problems, latest_submission,
-    and num_coins for the given pid *purely from the submission + problem tables*.
+    and num_coins for the given pid.
 
-    Assumes:
-      - cursor is a dict-style cursor inside an open transaction.
-      - submission has columns: pid, lc_problem, submission_date.
-      - problem has columns: lc_problem, difficulty ('easy'/'medium'/'hard').
-    """
+    Problem and coin totals come from one aggregate over the submission +
+    problem tables; streaks and the latest day come from the person's
+    activity bitmaps (rebuilt first if this person has none yet).
 
-    # 1) Get submission dates and distinct problems for this user
+    Assumes cursor is a dict-style cursor inside an open transaction.
+    """
+    # 1) Distinct problems solved and coins (one submission row per problem)
     cursor.execute(
         """
-        SELECT lc_problem, submission_date
-        FROM submission
-        WHERE pid = %s
-        ORDER BY submission_date
+        SELECT COUNT(*) AS total_problems,
+               SUM(CASE p.difficulty
+                     WHEN 'easy' THEN %s
+                     WHEN 'medium' THEN %s
+                     WHEN 'hard' THEN %s
+                     ELSE 0
+                   END) AS num_coins
+        FROM submission s
+        JOIN problem p ON s.lc_problem = p.lc_problem
+        WHERE s.pid = %s
         """,
-        (pid,),
+        (EASY_COIN_VALUE, MED_COIN_VALUE, HARD_COIN_VALUE, pid),
     )
-    rows = cursor.fetchall()
-
-    if not rows:
-        # No submissions at all: zero out stats
-        total_problems = 0
-        current_streak = 0
-        longest_streak = 0
-        latest_submission = None
-        num_coins = 0
-    else:
-        # Distinct problems solved
-        problems = {r["lc_problem"] for r in rows}
-        total_problems = len(problems)
-
-        # Streak + latest_submission
-        dates = [r["submission_date"] for r in rows]
-        latest_submission = dates[-1]
-
-        today = date.today()
-        longest_streak = 0
-        run = 0
-        prev = None
-
-        for d in dates:
-            if prev is None or (d - prev).days > 1:
-                run = 1
-            else:
-                run += 1
-
-            if run > longest_streak:
-                longest_streak = run
-
-            prev = d
+    row = cursor.fetchone()
+    total_problems = int(row["total_problems"] or 0)
+    num_coins = int(row["num_coins"] or 0)
 
-        if latest_submission == today:
-            current_streak = run
-        else:
-            current_streak = 0
-
-        # 2) Compute num_coins in Python from difficulty
-        #    (one row per submission; duplicates count as multiple coins)
-        cursor.execute(
-            """
-            SELECT p.difficulty
-            FROM submission s
-            JOIN problem p ON s.lc_problem = p.lc_problem
-            WHERE s.pid = %s
-            """,
-            (pid,),
-        )
-        diff_rows = cursor.fetchall()
-
-        num_coins = 0
-        for r in diff_rows:
-            diff = r["difficulty"]
-            if diff == "easy":
-                num_coins += EASY_COIN_VALUE
-            elif diff == "medium":
-                num_coins += MED_COIN_VALUE
-            elif diff == "hard":
-                num_coins += HARD_COIN_VALUE
-            # if difficulty is NULL/unknown, treat as 0 coins
+    # 2) Streaks + latest_submission from the bitmaps
+    bitmaps = _load_activity_bitmaps(cursor, pid)
+    if total_problems and not bitmaps:
+        _rebuild_activity_bitmaps(cursor, pid)
+        bitmaps = _load_activity_bitmaps(cursor, pid)
+    current_streak = activity_bitmap.current_streak(bitmaps, date.today())
+    longest_streak = activity_bitmap.longest_streak(bitmaps)
+    latest_submission = activity_bitmap.latest_day(bitmaps)
 
     # 3) write back to person, including num_coins and last_refreshed
     cursor.execute(
@@ -273,34 +630,153 @@ def _recompute_person_stats(cursor, pid: int) -> None:
         ),
     )
 
-def refresh_user_submissions(
-    conn,
-    pid: int,
-    username: str,
-    limit: int = 20,
-) -> int:
+
+def _load_activity_bitmaps(cursor, pid: int, for_update: bool = False) -> Dict[int, int]:
     """
-    Fetch a user's recent accepted submissions from LeetCode and insert
-    new (pid, lc_problem, submission_date) rows into 'submission'.
+    Return {year: bitmap int} for pid (see activity_bitmap.py). With
+    for_update the rows stay locked until the transaction ends.
+    """
+    cursor.execute(
+        "SELECT year, bits FROM activity_bitmap WHERE pid = %s"
+        + (" FOR UPDATE" if for_update else ""),
+        (pid,),
+    )
+    return {int(r["year"]): activity_bitmap.from_bytes(r["bits"]) for r in cursor.fetchall()}
 
-    Coins are derived from problem.difficulty via EASY/MED/HARD_COIN_VALUE inside
-    _recompute_person_stats.
 
-    After inserting new submissions, recompute the person's stats
-    (current_streak, longest_streak, total_problems, latest_submission, num_coins)
-    from the submission + problem tables.
+def _store_activity_bitmaps(cursor, pid: int, bitmaps: Dict[int, int]) -> None:
+    cursor.executemany(
+        """
+        INSERT INTO activity_bitmap (pid, year, bits)
+        VALUES (%s, %s, %s)
+        ON DUPLICATE KEY UPDATE bits = VALUES(bits)
+        """,
+        [(pid, year, activity_bitmap.to_bytes(bits)) for year, bits in bitmaps.items()],
+    )
 
-    Returns: number of NEW rows inserted into submission.
+
+def _mark_active_days(cursor, pid: int, days) -> None:
+    """Set the bits for the given dates in pid's activity bitmaps."""
+    by_year = activity_bitmap.days_by_year(days)
+    if not by_year:
+        return
+    # read-modify-write: another worker may be ingesting for pid at the same
+    # time, so make sure every year's row exists, then lock the rows before
+    # reading them, or one worker's bits would overwrite the other's
+    cursor.executemany(
+        "INSERT IGNORE INTO activity_bitmap (pid, year, bits) VALUES (%s, %s, %s)",
+        [(pid, year, activity_bitmap.to_bytes(0)) for year in by_year],
+    )
+    bitmaps = _load_activity_bitmaps(cursor, pid, for_update=True)
+    _store_activity_bitmaps(cursor, pid, {
+        year: activity_bitmap.with_days(bitmaps.get(year, 0), year_days)
+        for year, year_days in by_year.items()
+    })
+
+
+def _stored_days(cursor, pid: int, days) -> List[date]:
     """
-    cursor = None
-    new_count = 0
+    Those of days that pid has a submission row on. A re-solved problem
+    keeps its first date, so not every fetched date ends up in the table.
+    """
+    day_args = sorted(set(days))
+    if not day_args:
+        return []
+    days_cursor = db_backend.tuple_cursor_for(cursor)
+    try:
+        days_cursor.execute(
+            f"""
+            SELECT DISTINCT submission_date FROM submission
+            WHERE pid = %s AND submission_date IN ({', '.join(['%s'] * len(day_args))})
+            """,
+            [pid] + day_args,
+        )
+        return [day for (day,) in days_cursor.fetchall()]
+    finally:
+        days_cursor.close()
 
-    
-    cursor = dbi.dict_cursor(conn)
-    EST = ZoneInfo("America/New_York")
 
-    submissions = fetch_recent_ac_submissions(username, limit=limit)
+def _rebuild_activity_bitmaps(cursor, pid: int) -> None:
+    """Rebuild all of pid's activity bitmaps from the submission table."""
+    cursor.execute("DELETE FROM activity_bitmap WHERE pid = %s", (pid,))
+    # tuple rows: a heavy user has thousands of distinct days
+    days_cursor = db_backend.tuple_cursor_for(cursor)
+    try:
+        days_cursor.execute(
+            "SELECT DISTINCT submission_date FROM submission WHERE pid = %s", (pid,)
+        )
+        days = [day for (day,) in days_cursor.fetchall()]
+    finally:
+        days_cursor.close()
+    _store_activity_bitmaps(cursor, pid, {
+        year: activity_bitmap.with_days(0, year_days)
+        for year, year_days in activity_bitmap.days_by_year(days).items()
+    })
+
+def get_problem_meta_bulk(cursor, title_slugs) -> Dict[str, Dict[str, Any]]:
+    """
+    Resolve many problem slugs at once. Slugs are looked up in the
+    cross-worker shared_cache, then in one `WHERE title_slug IN (...)`
+    query; only the unknown ones fall back to get_problem_meta (and
+    therefore LeetCode).
+
+    Only rows read from the problem table are cached, never ones inserted
+    by this (still uncommitted) transaction.
+
+    Returns a dict of title_slug -> meta dict (see get_problem_meta).
+    It does NOT commit or close the cursor.
+    """
+    slugs = list(dict.fromkeys(title_slugs))
+    metas: Dict[str, Dict[str, Any]] = {}
+    if not slugs:
+        return metas
+
+    prefix = f"problem:{db_backend.CACHE_NAMESPACE}:"
+    cached = shared_cache.get_many(prefix + slug for slug in slugs)
+    for key, meta in cached.items():
+        metas[key[len(prefix):]] = meta
+
+    missing = [slug for slug in slugs if slug not in metas]
+    if missing:
+        placeholders = ", ".join(["%s"] * len(missing))
+        cursor.execute(
+            f"""
+            SELECT lc_problem, title_slug, title, difficulty
+            FROM problem
+            WHERE title_slug IN ({placeholders})
+            """,
+            missing,
+        )
+        from_db = {}
+        for row in cursor.fetchall():
+            from_db[row["title_slug"]] = {
+                "lc_problem": int(row["lc_problem"]),
+                "title": row["title"],
+                "difficulty": row["difficulty"],
+            }
+        metas.update(from_db)
+        shared_cache.set_many(
+            {prefix + slug: meta for slug, meta in from_db.items()}, PROBLEM_META_TTL
+        )
+
+    for slug in slugs:
+        if slug not in metas:
+            metas[slug] = get_problem_meta(cursor, slug)
+    return metas
+
+
+def normalize_submissions(cursor, pid: int, submissions: List[dict]) -> List[tuple]:
+    """
+    Turn raw recentAcSubmissionList entries into (pid, lc_problem, submission_date)
+    rows ready for insertion.
 
+    Entries without a slug or a usable timestamp are dropped, and the batch is
+    de-duplicated on (pid, lc_problem) keeping the earliest solve date, since
+    submission only holds one row per user per problem.
+    """
+    EST = ZoneInfo("America/New_York")
+
+    dated = []
     for sub in submissions:
         title_slug = sub.get("titleSlug")
         ts = sub.get("timestamp")
@@ -316,23 +792,401 @@ def refresh_user_submissions(
         submission_date = datetime.fromtimestamp(
             timestamp, tz=EST
         ).date()
+        dated.append((title_slug, submission_date))
 
-        meta = get_problem_meta(cursor, title_slug)
-        lc_problem = meta["lc_problem"]
+    metas = get_problem_meta_bulk(cursor, [slug for slug, _ in dated])
 
-        cursor.execute(
+    earliest: Dict[int, date] = {}
+    for title_slug, submission_date in dated:
+        lc_problem = metas[title_slug]["lc_problem"]
+        if lc_problem not in earliest or submission_date < earliest[lc_problem]:
+            earliest[lc_problem] = submission_date
+
+    return [(pid, lc_problem, d) for lc_problem, d in earliest.items()]
+
+
+BULK_INSERT_CHUNK = 500
+
+
+def bulk_insert_submissions(cursor, rows: List[tuple], keep_earliest: bool = False) -> int:
+    """
+    Insert (pid, lc_problem, submission_date) rows with multi-row
+    INSERT IGNORE statements (the driver folds executemany into one
+    statement per chunk). Rows already in submission are skipped, or with
+    keep_earliest moved to the row's date if that is earlier (for history
+    that arrives newest first, see backfill.py).
+
+    Returns: number of NEW rows inserted.
+    """
+    new_count = 0
+    for i in range(0, len(rows), BULK_INSERT_CHUNK):
+        chunk = rows[i:i + BULK_INSERT_CHUNK]
+        cursor.executemany(
             """
             INSERT IGNORE INTO submission (pid, lc_problem, submission_date)
             VALUES (%s, %s, %s)
             """,
-            (pid, lc_problem, submission_date),
+            chunk,
         )
+        # for INSERT IGNORE, ignored duplicates don't count as affected rows
+        new_count += max(cursor.rowcount, 0)
+        if keep_earliest:
+            cursor.executemany(
+                """
+                UPDATE submission SET submission_date = %s
+                WHERE pid = %s AND lc_problem = %s AND submission_date > %s
+                """,
+                [(d, pid, lc_problem, d) for pid, lc_problem, d in chunk],
+            )
+    return new_count
 
-        if cursor.rowcount == 1:
-            new_count += 1
 
-    # recompute stats (including num_coins) from the truth in DB
-    _recompute_person_stats(cursor, pid)
+def _update_daily_activity(cursor, pid: int, days=None) -> None:
+    """
+    Rebuild pid's daily_activity buckets (problems solved and coins per day)
+    for the given submission dates from the submission + problem tables.
+    With days=None every bucket of pid is rebuilt.
+    """
+    if days is None:
+        cursor.execute("DELETE FROM daily_activity WHERE pid = %s", (pid,))
+        day_filter, day_args = "", []
+    else:
+        day_args = sorted(set(days))
+        if not day_args:
+            return
+        day_filter = f"AND s.submission_date IN ({', '.join(['%s'] * len(day_args))})"
 
-    cursor.close()
-    return new_count
+    # read through a tuple cursor; the dict per row would be thrown away anyway
+    rows_cursor = db_backend.tuple_cursor_for(cursor)
+    try:
+        rows_cursor.execute(
+            f"""
+            SELECT s.submission_date AS day,
+                   COUNT(*) AS solved,
+                   SUM(CASE p.difficulty
+                         WHEN 'easy' THEN %s
+                         WHEN 'medium' THEN %s
+                         WHEN 'hard' THEN %s
+                         ELSE 0
+                       END) AS coins
+            FROM submission s
+            JOIN problem p ON s.lc_problem = p.lc_problem
+            WHERE s.pid = %s {day_filter}
+            GROUP BY s.submission_date
+            """,
+            [EASY_COIN_VALUE, MED_COIN_VALUE, HARD_COIN_VALUE, pid] + day_args,
+        )
+        rows = [(pid, day, int(solved), int(coins or 0))
+                for day, solved, coins in rows_cursor.fetchall()]
+    finally:
+        rows_cursor.close()
+    if rows:
+        cursor.executemany(
+            """
+            INSERT INTO daily_activity (pid, day, solved, coins)
+            VALUES (%s, %s, %s, %s)
+            ON DUPLICATE KEY UPDATE solved = VALUES(solved), coins = VALUES(coins)
+            """,
+            rows,
+        )
+
+
+def rebuild_activity(conn, pid: int) -> None:
+    """Rebuild a person's daily_activity buckets and activity bitmaps (no commit here)."""
+    cursor = db_backend.dict_cursor(conn)
+    try:
+        _update_daily_activity(cursor, pid)
+        _rebuild_activity_bitmaps(cursor, pid)
+    finally:
+        cursor.close()
+
+
+# How much refresh work the high-water mark saved, for /api/metrics.
+_refresh_counters = {
+    "users_refreshed": 0,       # users passed to ingest_submissions
+    "users_unchanged": 0,       # ...with nothing newer than their mark
+    "submissions_seen": 0,      # entries fetched from LeetCode
+    "submissions_skipped": 0,   # ...already ingested, not resolved or inserted
+    "recomputes_skipped": 0,    # stats recomputes avoided
+    "problem_meta_fetches": 0,  # problems missing from the catalog, looked up on LeetCode
+    "requests_coalesced": 0,    # GraphQL calls that waited on an identical one in flight
+    "requests_cached": 0,       # ...answered from a result under LEETCODE_RESULT_TTL old
+    "user_refreshes_absorbed": 0,   # people refreshed again within USER_REFRESH_INTERVAL
+    "party_refreshes_absorbed": 0,  # parties refreshed again within PARTY_REFRESH_INTERVAL
+}
+_counters_lock = threading.Lock()
+
+
+def _count(**deltas) -> None:
+    with _counters_lock:
+        for key, n in deltas.items():
+            _refresh_counters[key] += n
+
+
+def refresh_counters() -> Dict[str, int]:
+    """Snapshot of the refresh work counters since the process started."""
+    with _counters_lock:
+        return dict(_refresh_counters)
+
+
+def refreshed_within(last_refreshed: Optional[datetime], seconds: float) -> bool:
+    """True if last_refreshed (None = never) is less than `seconds` ago."""
+    return (last_refreshed is not None
+            and datetime.now() - last_refreshed < timedelta(seconds=seconds))
+
+
+def user_refresh_absorbed(person: dict, force: bool = False) -> bool:
+    """
+    True (and counted) if the person (a dict with last_refreshed) was
+    refreshed within USER_REFRESH_INTERVAL, so this refresh should be
+    skipped. force (for admins) never skips.
+    """
+    if force or not refreshed_within(person.get("last_refreshed"), USER_REFRESH_INTERVAL):
+        return False
+    _count(user_refreshes_absorbed=1)
+    return True
+
+
+def party_refresh_absorbed(party: dict, force: bool = False) -> bool:
+    """
+    True (and counted) if the party (a dict with last_bulk_refresh) was
+    refreshed within PARTY_REFRESH_INTERVAL, so this refresh should be
+    skipped. force (for admins) never skips.
+    """
+    if force or not refreshed_within(party.get("last_bulk_refresh"), PARTY_REFRESH_INTERVAL):
+        return False
+    _count(party_refreshes_absorbed=1)
+    return True
+
+
+def _recently_refreshed(cursor, pids: List[int]) -> set:
+    """The pids among `pids` refreshed within USER_REFRESH_INTERVAL."""
+    if not pids:
+        return set()
+    placeholders = ", ".join(["%s"] * len(pids))
+    cursor.execute(
+        f"SELECT pid, last_refreshed FROM person WHERE pid IN ({placeholders})",
+        list(pids),
+    )
+    return {row["pid"] for row in cursor.fetchall()
+            if refreshed_within(row["last_refreshed"], USER_REFRESH_INTERVAL)}
+
+
+def _get_high_water_mark(cursor, pid: int):
+    """
+    Return (last_ingested_ts, last_ingested_id, last_refreshed) for pid:
+    the newest LeetCode submission already ingested, and when stats were
+    last recomputed.
+    """
+    cursor.execute(
+        """
+        SELECT last_ingested_ts, last_ingested_id, last_refreshed
+        FROM person
+        WHERE pid = %s
+        """,
+        (pid,),
+    )
+    row = cursor.fetchone()
+    if not row:
+        return None, None, None
+    return row["last_ingested_ts"], row["last_ingested_id"], row["last_refreshed"]
+
+
+def _newer_than_mark(submissions: List[dict], mark_ts, mark_id) -> List[dict]:
+    """
+    Keep the leading entries of a newest-first submission list up to (not
+    including) the high-water mark. Entries with an unusable timestamp are
+    kept; normalize_submissions drops them.
+    """
+    if mark_ts is None:
+        return list(submissions)
+
+    fresh = []
+    for sub in submissions:
+        if mark_id is not None and sub.get("id") == mark_id:
+            break
+        try:
+            if int(sub.get("timestamp")) < mark_ts:
+                break
+        except (ValueError, TypeError):
+            pass
+        fresh.append(sub)
+    return fresh
+
+
+def _set_high_water_mark(cursor, pid: int, submissions: List[dict]) -> None:
+    """Advance pid's mark to the newest entry in a newest-first list."""
+    for sub in submissions:
+        try:
+            ts = int(sub.get("timestamp"))
+        except (ValueError, TypeError):
+            continue
+        cursor.execute(
+            """
+            UPDATE person
+            SET last_ingested_ts = %s,
+                last_ingested_id = %s
+            WHERE pid = %s
+              AND (last_ingested_ts IS NULL OR last_ingested_ts <= %s)
+            """,
+            (ts, sub.get("id"), pid, ts),
+        )
+        return
+
+
+def ingest_submissions(
+    conn,
+    batches: Dict[int, List[dict]],
+    recompute: bool = True,
+    use_high_water_mark: bool = True,
+    keep_earliest: bool = False,
+) -> Dict[int, int]:
+    """
+    Normalize and insert submissions for one or many users, update their
+    daily_activity buckets and activity bitmaps for the affected days, then
+    recompute stats for each of them. `batches` maps pid -> raw LeetCode submissions
+    (newest first, as LeetCode returns them).
+    Pass recompute=False when streaming many pages and recompute once at the end.
+
+    With use_high_water_mark, entries at or past each person's stored mark
+    (person.last_ingested_ts/_id) are skipped without touching the problem
+    or submission tables, and stats are only recomputed if something new
+    arrived or they were last computed before today (current_streak depends
+    on the date). Backfills of older pages should pass False.
+
+    keep_earliest moves already-stored rows back to an earlier solve date
+    (see bulk_insert_submissions). The daily_activity buckets and bitmaps
+    of the days they leave are not updated; call rebuild_activity after.
+
+    Everything happens on one cursor and is left uncommitted, so the caller
+    decides the transaction boundary (one user, or a whole party at once).
+
+    Returns: dict of pid -> number of NEW rows inserted.
+    """
+    cursor = db_backend.dict_cursor(conn)
+    new_counts = {}
+    try:
+        for pid, submissions in batches.items():
+            stale_stats = True
+            if use_high_water_mark:
+                mark_ts, mark_id, last_refreshed = _get_high_water_mark(cursor, pid)
+                fresh = _newer_than_mark(submissions, mark_ts, mark_id)
+                stale_stats = last_refreshed is None or last_refreshed.date() != date.today()
+                _count(
+                    users_refreshed=1,
+                    users_unchanged=0 if fresh else 1,
+                    submissions_seen=len(submissions),
+                    submissions_skipped=len(submissions) - len(fresh),
+                )
+            else:
+                fresh = submissions
+
+            if not fresh:
+                new_counts[pid] = 0
+                if recompute and stale_stats:
+                    _recompute_person_stats(cursor, pid)
+                elif recompute:
+                    _count(recomputes_skipped=1)
+                    # stats are current as of this check; starts the debounce window
+                    cursor.execute("UPDATE person SET last_refreshed = NOW() WHERE pid = %s", (pid,))
+                continue
+
+            rows = normalize_submissions(cursor, pid, fresh)
+            # one multi-row insert per user keeps the new-row counts per pid
+            new_counts[pid] = bulk_insert_submissions(cursor, rows, keep_earliest)
+            if new_counts[pid]:
+                days = [d for _, _, d in rows]
+                _update_daily_activity(cursor, pid, days)
+                _mark_active_days(cursor, pid, _stored_days(cursor, pid, days))
+            if use_high_water_mark:
+                _set_high_water_mark(cursor, pid, fresh)
+            if recompute:
+                # recompute stats (including num_coins) from the truth in DB
+                _recompute_person_stats(cursor, pid)
+    finally:
+        cursor.close()
+    return new_counts
+
+
+def recompute_person_stats(conn, pid: int) -> None:
+    """Recompute a person's stats from the submission table (no commit here)."""
+    cursor = db_backend.dict_cursor(conn)
+    try:
+        _recompute_person_stats(cursor, pid)
+    finally:
+        cursor.close()
+
+
+def refresh_user_submissions(
+    conn,
+    pid: int,
+    username: str,
+    limit: int = 20,
+    force: bool = False,
+) -> int:
+    """
+    Fetch a user's recent accepted submissions from LeetCode and insert
+    new (pid, lc_problem, submission_date) rows into 'submission'.
+
+    If the user was refreshed within USER_REFRESH_INTERVAL this does nothing
+    and returns 0, unless force is set.
+
+    Coins are derived from problem.difficulty via EASY/MED/HARD_COIN_VALUE inside
+    _recompute_person_stats.
+
+    After inserting new submissions, recompute the person's stats
+    (current_streak, longest_streak, total_problems, latest_submission, num_coins)
+    from the submission + problem tables.
+
+    Returns: number of NEW rows inserted into submission.
+    """
+    if not force:
+        cursor = db_backend.dict_cursor(conn)
+        try:
+            recent = _recently_refreshed(cursor, [pid])
+        finally:
+            cursor.close()
+        if recent:
+            _count(user_refreshes_absorbed=1)
+            return 0
+    submissions = fetch_recent_ac_submissions(username, limit=limit)
+    return ingest_submissions(conn, {pid: submissions})[pid]
+
+
+def refresh_party_submissions(conn, members: List[dict], limit: int = 20, force: bool = False):
+    """
+    Refresh every party member (dicts with 'pid', 'username', 'lc_username')
+    and ingest all of their submissions in one batch. Members refreshed
+    within USER_REFRESH_INTERVAL are left as they are unless force is set.
+
+    Members whose LeetCode fetch (or lookup of a problem missing from the
+    catalog) fails are skipped and reported; the rest are written on the
+    same connection without committing.
+
+    Returns: (dict of pid -> new row count, list of failed usernames)
+    """
+    batches = {}
+    failed = []
+    recent = set()
+    cursor = db_backend.dict_cursor(conn)
+    try:
+        if not force:
+            recent = _recently_refreshed(cursor, [m['pid'] for m in members])
+            _count(user_refreshes_absorbed=len(recent))
+        for m in members:
+            if m['pid'] in recent:
+                continue
+            try:
+                submissions = fetch_recent_ac_submissions(m['lc_username'], limit=limit)
+                # resolve unknown problems now, while a LeetCode failure can
+                # still be pinned on this member instead of the whole batch
+                get_problem_meta_bulk(cursor, [sub["titleSlug"] for sub in submissions
+                                               if sub.get("titleSlug")])
+            except LeetCodeClientError:
+                failed.append(m['username'])
+                continue
+            batches[m['pid']] = submissions
+    finally:
+        cursor.close()
+
+    return ingest_submissions(conn, batches), failed
@@ -0,0 +1,114 @@
+# Written by Jessica Dai, Sophie Lin, Nessa Tong, Ashley Yang (Olin)
+# leetcode_stub.py
+# A tiny fake of LeetCode's GraphQL endpoint for offline development,
+# backfills and benchmarks. Every username gets a deterministic, made-up
+# accepted-submission history.
+#
+#   python leetcode_stub.py [port]
+#   LEETCODE_GRAPHQL_URL=http://localhost:5055/graphql python backfill.py --all
+#
+# Tests and benchmarks run it in-process with serve_in_thread().
+import os
+import random
+import sys
+import threading
+import time
+import zlib
+
+from flask import Flask, request, jsonify
+
+app = Flask(__name__)
+
+NUM_PROBLEMS = 3000
+DIFFICULTIES = ['Easy', 'Medium', 'Hard']
+# seconds of artificial latency per request, to mimic the real thing
+STUB_LATENCY = float(os.environ.get('LEETCODE_STUB_LATENCY', 0))
+
+
+def problem(n):
+    """Fake problem number n (1-based)."""
+    return {
+        'questionFrontendId': str(n),
+        'title': f'Problem {n}',
+        'titleSlug': f'problem-{n}',
+        'difficulty': DIFFICULTIES[(n * 7) % 10 // 4],   # ~40% easy, 40% medium, 20% hard
+    }
+
+
+def history(username):
+    """Accepted submissions for a username, newest first (deterministic)."""
+    rng = random.Random(zlib.crc32(username.encode('utf8')))
+    count = rng.randint(30, 300)
+    now = int(time.time()) // 86400 * 86400
+    subs = []
+    ts = now
+    for i in range(count):
+        ts -= rng.randint(0, 2 * 86400)
+        n = rng.randint(1, NUM_PROBLEMS)
+        p = problem(n)
+        subs.append({
+            'id': str(zlib.crc32(f'{username}:{i}'.encode('utf8'))),
+            'title': p['title'],
+            'titleSlug': p['titleSlug'],
+            'timestamp': str(ts),
+        })
+    return subs
+
+
+@app.route('/graphql', methods=['POST'])
+def graphql():
+    if STUB_LATENCY:
+        time.sleep(STUB_LATENCY)
+    payload = request.get_json(force=True)
+    query = payload.get('query', '')
+    variables = payload.get('variables') or {}
+
+    if 'recentAcSubmissionList' in query:
+        offset = int(variables.get('offset', 0))
+        limit = int(variables.get('limit', 20))
+        subs = history(variables['username'])[offset:offset + limit]
+        return jsonify({'data': {'recentAcSubmissionList': subs}})
+
+    if 'questionList' in query:
+        skip = int(variables.get('skip', 0))
+        limit = int(variables.get('limit', 50))
+        questions = [dict(problem(n), paidOnly=n % 9 == 0)
+                     for n in range(skip + 1, min(skip + limit, NUM_PROBLEMS) + 1)]
+        return jsonify({'data': {'problemsetQuestionList': {'total': NUM_PROBLEMS,
+                                                            'questions': questions}}})
+
+    if 'question(' in query:
+        slug = variables.get('titleSlug', '')
+        try:
+            n = int(slug.rsplit('-', 1)[1])
+        except (IndexError, ValueError):
+            return jsonify({'data': {'question': None}})
+        if not 1 <= n <= NUM_PROBLEMS:
+            return jsonify({'data': {'question': None}})
+        q = problem(n)
+        return jsonify({'data': {'question': {k: q[k] for k in ('questionFrontendId', 'title', 'difficulty')}}})
+
+    return jsonify({'errors': [{'message': 'query not supported by stub'}]})
+
+
+def serve_in_thread(wsgi_app=None):
+    """
+    Serve the stub (or wsgi_app wrapping it) on a free local port from a
+    daemon thread, without request logging. Returns (server, graphql_url);
+    call server.shutdown() to stop it.
+    """
+    from werkzeug.serving import WSGIRequestHandler, make_server
+
+    class QuietHandler(WSGIRequestHandler):
+        def log_request(self, *args):
+            pass
+
+    server = make_server('127.0.0.1', 0, wsgi_app or app, threaded=True,
+                         request_handler=QuietHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f'http://127.0.0.1:{server.server_port}/graphql'
+
+
+if __name__ == '__main__':
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else 5055
+    app.run('127.0.0.1', port, threaded=True)
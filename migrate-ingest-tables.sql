@@ -0,0 +1,93 @@
+use leetcode_db;
+
+-- Brings a database created from an older LeetCodeCompetition.sql up to
+-- date without dropping anything. Safe to run more than once: every step
+-- checks whether it has already been applied.
+
+-- person: high-water mark of the newest LeetCode AC submission ingested
+SET @stmt = (SELECT IF(COUNT(*) = 0,
+    'ALTER TABLE person ADD COLUMN last_ingested_ts BIGINT NULL',
+    'DO 0')
+  FROM information_schema.columns
+  WHERE table_schema = DATABASE() AND table_name = 'person'
+    AND column_name = 'last_ingested_ts');
+PREPARE migrate FROM @stmt; EXECUTE migrate; DEALLOCATE PREPARE migrate;
+
+SET @stmt = (SELECT IF(COUNT(*) = 0,
+    'ALTER TABLE person ADD COLUMN last_ingested_id VARCHAR(32) NULL',
+    'DO 0')
+  FROM information_schema.columns
+  WHERE table_schema = DATABASE() AND table_name = 'person'
+    AND column_name = 'last_ingested_id');
+PREPARE migrate FROM @stmt; EXECUTE migrate; DEALLOCATE PREPARE migrate;
+
+-- submission: per-user date-range scans (party windows)
+SET @stmt = (SELECT IF(COUNT(*) = 0,
+    'ALTER TABLE submission ADD KEY pid_date (pid, submission_date)',
+    'DO 0')
+  FROM information_schema.statistics
+  WHERE table_schema = DATABASE() AND table_name = 'submission'
+    AND index_name = 'pid_date');
+PREPARE migrate FROM @stmt; EXECUTE migrate; DEALLOCATE PREPARE migrate;
+
+-- New tables, as in LeetCodeCompetition.sql
+CREATE TABLE IF NOT EXISTS backfill_checkpoint (
+  pid          INT PRIMARY KEY,
+  next_offset  INT NOT NULL DEFAULT 0,
+  done         BOOLEAN NOT NULL DEFAULT FALSE,
+  updated_at   DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+  FOREIGN KEY (pid) REFERENCES person(pid)
+    ON DELETE CASCADE
+    ON UPDATE CASCADE
+) ENGINE=InnoDB;
+
+CREATE TABLE IF NOT EXISTS daily_activity (
+  pid     INT NOT NULL,
+  day     DATE NOT NULL,
+  solved  INT NOT NULL DEFAULT 0,
+  coins   INT NOT NULL DEFAULT 0,
+  PRIMARY KEY (pid, day),
+  KEY day_pid (day, pid),
+  FOREIGN KEY (pid) REFERENCES person(pid)
+    ON DELETE CASCADE
+    ON UPDATE CASCADE
+) ENGINE=InnoDB;
+
+CREATE TABLE IF NOT EXISTS friend_recommendation (
+  pid             INT NOT NULL,
+  candidate       INT NOT NULL,
+  score           INT NOT NULL,
+  mutuals         INT NOT NULL DEFAULT 0,
+  shared_parties  INT NOT NULL DEFAULT 0,
+  PRIMARY KEY (pid, candidate),
+  KEY pid_score (pid, score),
+  FOREIGN KEY (pid) REFERENCES person(pid)
+    ON DELETE CASCADE
+    ON UPDATE CASCADE,
+  FOREIGN KEY (candidate) REFERENCES person(pid)
+    ON DELETE CASCADE
+    ON UPDATE CASCADE
+) ENGINE=InnoDB;
+
+CREATE TABLE IF NOT EXISTS activity_bitmap (
+  pid   INT NOT NULL,
+  year  SMALLINT NOT NULL,
+  bits  VARBINARY(46) NOT NULL,
+  PRIMARY KEY (pid, year),
+  FOREIGN KEY (pid) REFERENCES person(pid)
+    ON DELETE CASCADE
+    ON UPDATE CASCADE
+) ENGINE=InnoDB;
+
+CREATE TABLE IF NOT EXISTS party_snapshot (
+  cpid          INT PRIMARY KEY,
+  payload       MEDIUMBLOB NOT NULL,
+  finalized_at  DATETIME DEFAULT CURRENT_TIMESTAMP,
+  FOREIGN KEY (cpid) REFERENCES code_party(cpid)
+    ON DELETE CASCADE
+    ON UPDATE CASCADE
+) ENGINE=InnoDB;
+
+-- The new tables start empty. Fill them for existing users with:
+--   python backfill.py --all --rebuild-activity   (daily_activity, activity_bitmap)
+--   python friend_recs.py                         (friend_recommendation)
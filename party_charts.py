@@ -1,12 +1,13 @@
-from flask import Flask, render_template, jsonify
-import pandas as pd
-app = Flask(__name__)
+def build_chart_data(submissions, goal) -> dict:
+    # submissions: a list of row dicts, or the {column: [values]} dict from
+    # get_party_submissions(..., shape='columns'), which pandas takes without
+    # building a dict per row.
+    # pandas takes ~0.5s to import, so only pay for it when a chart is built
+    import pandas as pd
 
-
-def build_chart_data(submissions: list[dict], goal) -> dict:
     df = pd.DataFrame(submissions)
 
-    if df.empty:
+    if df.empty or "submission_date" not in df:
         return {
             "bar": {"labels": [], "counts": []},
             "progress": {"done": 0, "goal": goal},
@@ -71,3 +72,41 @@ def build_chart_data(submissions: list[dict], goal) -> dict:
     line = {"dates": dates, "series": series}
 
     return {"bar": bar, "progress": progress, "line": line}
+
+
+def compact_chart_data(data: dict) -> dict:
+    """
+    Smaller encoding of build_chart_data() output (?format=compact):
+
+      members   names; everything else refers to members by index
+      bar       problems solved per member, in members order
+      progress  [done, goal]
+      line      {"start": first ISO date, "days": n,
+                 "daily": per member, problems solved each day}
+
+    The client rebuilds the date labels from start + days, the cumulative
+    series (and "Total") by summing the daily counts, and the bar order by
+    sorting on count.
+    """
+    series = data["line"]["series"]
+    members = [name for name in series if name != "Total"]
+    # members with no line data (shouldn't happen) still get a bar
+    members += [name for name in data["bar"]["labels"] if name not in series]
+    counts = dict(zip(data["bar"]["labels"], data["bar"]["counts"]))
+
+    daily = []
+    for name in members:
+        cumulative = series.get(name, [])
+        daily.append([c - (cumulative[i - 1] if i else 0) for i, c in enumerate(cumulative)])
+
+    dates = data["line"]["dates"]
+    return {
+        "members": members,
+        "bar": [counts.get(name, 0) for name in members],
+        "progress": [data["progress"]["done"], data["progress"]["goal"]],
+        "line": {
+            "start": dates[0] if dates else None,
+            "days": len(dates),
+            "daily": daily,
+        },
+    }
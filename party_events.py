@@ -0,0 +1,150 @@
+# Written by Jessica Dai, Sophie Lin, Nessa Tong, Ashley Yang (Olin)
+# party_events.py
+# Tiny in-process pub/sub for live party pages (Server-Sent Events).
+#
+# Each viewer of /party/<cpid> holds a subscription queue. When a refresh
+# ingests new submissions for a member, the party's update is computed once
+# and the same message is dropped into every viewer's queue.
+#
+# Subscriptions live in this process only, so with several server workers a
+# viewer only hears about refreshes handled by its own worker.
+#
+# A stream occupies a worker thread while it is open, so serve the app with
+# threaded workers (gunicorn -k gthread --threads N). Each stream also ends
+# after SSE_MAX_SECONDS and the browser reconnects (after the retry: delay),
+# so a thread is never held forever.
+#
+#   LEETPARTY_SSE_MAX_SECONDS=300
+import json
+import os
+import queue
+import threading
+import time
+
+# per-viewer backlog; a viewer that falls this far behind starts losing
+# updates rather than holding memory
+SUBSCRIBER_QUEUE_SIZE = 16
+SSE_MAX_SECONDS = float(os.environ.get('LEETPARTY_SSE_MAX_SECONDS', 300))
+
+
+class PartyBroker:
+    """Fan-out of party update messages to the viewers of each party."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = {}      # cpid -> set of queues
+        self._last_state = {}       # cpid -> last published {name: rank}
+
+    def subscribe(self, cpid):
+        q = queue.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        with self._lock:
+            self._subscribers.setdefault(cpid, set()).add(q)
+        return q
+
+    def unsubscribe(self, cpid, q):
+        with self._lock:
+            subs = self._subscribers.get(cpid)
+            if subs:
+                subs.discard(q)
+                if not subs:
+                    # nobody is watching, so stop tracking the party at all
+                    del self._subscribers[cpid]
+                    self._last_state.pop(cpid, None)
+
+    def has_subscribers(self, cpid):
+        with self._lock:
+            return bool(self._subscribers.get(cpid))
+
+    def viewer_counts(self):
+        with self._lock:
+            return {cpid: len(subs) for cpid, subs in self._subscribers.items()}
+
+    def publish(self, cpid, message):
+        """Send one (already computed) message to every viewer of cpid."""
+        data = json.dumps(message, default=str)
+        with self._lock:
+            subs = list(self._subscribers.get(cpid, ()))
+        for q in subs:
+            try:
+                q.put_nowait(data)
+            except queue.Full:
+                pass
+
+    def last_ranks(self, cpid):
+        """Ranks ({name: rank}) from the last update published for cpid."""
+        with self._lock:
+            return self._last_state.get(cpid, {})
+
+    def remember_ranks(self, cpid, ranks):
+        with self._lock:
+            # a viewer may have left since the update was computed
+            if cpid in self._subscribers:
+                self._last_state[cpid] = ranks
+
+
+broker = PartyBroker()
+
+
+def build_party_update(chart_data, previous_ranks):
+    """
+    Turn build_chart_data() output into a small delta message: per-member
+    counts and ranks, who moved, the progress bar, and the newest point of
+    the cumulative line chart.
+    """
+    labels = chart_data["bar"]["labels"]
+    counts = chart_data["bar"]["counts"]
+
+    # standard competition ranking (1, 2, 2, 4) over the sorted bar counts
+    ranks = {}
+    for i, (name, cnt) in enumerate(zip(labels, counts)):
+        if i > 0 and cnt == counts[i - 1]:
+            ranks[name] = ranks[labels[i - 1]]
+        else:
+            ranks[name] = i + 1
+
+    rank_changes = [
+        {"name": name, "from": previous_ranks.get(name), "to": rank}
+        for name, rank in ranks.items()
+        if previous_ranks and previous_ranks.get(name) != rank
+    ]
+
+    line = chart_data["line"]
+    tail = None
+    if line["dates"]:
+        tail = {
+            "date": line["dates"][-1],
+            "series": {name: values[-1] for name, values in line["series"].items()},
+        }
+
+    return {
+        "counts": dict(zip(labels, counts)),
+        "ranks": ranks,
+        "rank_changes": rank_changes,
+        "progress": chart_data["progress"],
+        "tail": tail,
+    }, ranks
+
+
+def sse_stream(cpid, keepalive_seconds=15, max_seconds=None):
+    """
+    Generator of text/event-stream chunks for one viewer of cpid.
+    Sends a comment line every keepalive_seconds so proxies keep it open,
+    and ends after max_seconds (default SSE_MAX_SECONDS); the browser then
+    reconnects on its own.
+    """
+    deadline = time.monotonic() + (SSE_MAX_SECONDS if max_seconds is None else max_seconds)
+    q = broker.subscribe(cpid)
+    try:
+        yield "retry: 5000\n\n"
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return
+            try:
+                data = q.get(timeout=min(keepalive_seconds, remaining))
+            except queue.Empty:
+                yield ": keepalive\n\n"
+                continue
+            yield f"event: update\ndata: {data}\n\n"
+    finally:
+        broker.unsubscribe(cpid, q)
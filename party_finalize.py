@@ -0,0 +1,201 @@
+# Written by Jessica Dai, Sophie Lin, Nessa Tong, Ashley Yang (Olin)
+# party_finalize.py
+# Freeze code parties once they are over.
+#
+# When a party's end date has passed, its final standings are computed once:
+# problems solved and rank per member (individual_party_stats), totals
+# (party_total_stats), the winner (code_party.winner), and the whole page
+# payload (party info, members, chart data). The payload is stored as
+# zlib-compressed JSON in party_snapshot and never changed again, so later
+# edits to members' histories can't move the results, and the party page and
+# chart API serve it without touching submission.
+#
+# Refreshes are manual, so a party is only finalized once it has been
+# refreshed after its end date (catching solves from the last days), or
+# FINALIZE_GRACE_DAYS after it ended if nobody refreshed it.
+#
+# Run this file daily (e.g. from cron) to finalize every party that is due;
+# the app also finalizes a due party the first time it is viewed.
+#
+#   python party_finalize.py
+#   LEETPARTY_FINALIZE_GRACE_DAYS=3
+import argparse
+import datetime
+import json
+import os
+import zlib
+
+import db_backend
+import db_queries
+
+FINALIZE_GRACE_DAYS = int(os.environ.get('LEETPARTY_FINALIZE_GRACE_DAYS', 3))
+
+
+def encode_snapshot(snapshot):
+    return zlib.compress(json.dumps(snapshot, separators=(',', ':'), default=str).encode('utf8'))
+
+
+def decode_snapshot(payload):
+    return json.loads(zlib.decompress(payload).decode('utf8'))
+
+
+def _as_date(value):
+    return datetime.date.fromisoformat(value) if isinstance(value, str) else value
+
+
+def is_over(party, today=None):
+    """True once a party's end date has passed (matches the 'completed' status)."""
+    return _as_date(party['party_end']) < (today or datetime.date.today())
+
+
+def ready_to_finalize(party, now=None):
+    """
+    True once a party is over and its results can be frozen: it was
+    refreshed after the end date, or the grace period has passed.
+    """
+    now = now or datetime.datetime.now()
+    if not is_over(party, now.date()):
+        return False
+    day_after = _as_date(party['party_end']) + datetime.timedelta(days=1)
+    refreshed = party.get('last_bulk_refresh')
+    if refreshed is not None and refreshed >= datetime.datetime.combine(day_after, datetime.time()):
+        return True
+    return now.date() >= day_after + datetime.timedelta(days=FINALIZE_GRACE_DAYS - 1)
+
+
+def get_snapshot(conn, cpid):
+    """Return the stored snapshot dict for cpid, or None if not finalized."""
+    row = db_queries.get_party_snapshot(conn, cpid)
+    return decode_snapshot(row['payload']) if row else None
+
+
+def final_standings(members, submissions):
+    """
+    Rank members by problems solved during the party (1, 2, 2, 4 on ties).
+    submissions is get_party_submissions(..., shape='columns').
+    Returns the member dicts, best first, with problems_solved, rank and
+    last_solved added. The winner is the first one: among tied leaders,
+    whoever reached their final count first.
+    """
+    solved = {}
+    last_solved = {}
+    for name, day in zip(submissions['username'], submissions['submission_date']):
+        solved[name] = solved.get(name, 0) + 1
+        if name not in last_solved or day > last_solved[name]:
+            last_solved[name] = day
+
+    standings = [dict(m, problems_solved=solved.get(m['username'], 0),
+                      last_solved=last_solved.get(m['username']))
+                 for m in members]
+    # most solved first; ties go to the earlier finisher, then to the lower pid
+    standings.sort(key=lambda m: (-m['problems_solved'],
+                                  m['last_solved'] or datetime.date.max,
+                                  m['pid']))
+    for i, m in enumerate(standings):
+        if i > 0 and m['problems_solved'] == standings[i - 1]['problems_solved']:
+            m['rank'] = standings[i - 1]['rank']
+        else:
+            m['rank'] = i + 1
+    return standings
+
+
+def finalize_party(conn, cpid):
+    """
+    Compute and store the final results of an ended party, or return the
+    existing snapshot if it was already finalized. No commit here.
+
+    Returns the snapshot dict, or None if the party doesn't exist or isn't
+    ready to finalize yet (see ready_to_finalize).
+    """
+    existing = get_snapshot(conn, cpid)
+    if existing is not None:
+        return existing
+    party = db_queries.get_party_info(conn, cpid)
+    if party is None or not ready_to_finalize(party):
+        return None
+
+    from party_charts import build_chart_data  # pulls in pandas
+
+    members = db_queries.get_party_members(conn, cpid)
+    submissions = db_queries.get_party_submissions(conn, cpid, shape='columns')
+    standings = final_standings(members, submissions)
+    winner = standings[0]['pid'] if standings and standings[0]['problems_solved'] else None
+
+    charts = build_chart_data(submissions, party['party_goal'])
+    if 'progress' in charts:
+        charts['progress']['goal'] = int(party['party_goal'] or 0)
+
+    party = dict(party, winner=winner)
+    snapshot = {
+        'party': party,
+        'members': standings,
+        'charts': charts,
+        'finalized_at': datetime.datetime.now().isoformat(' ', 'seconds'),
+    }
+
+    payload = encode_snapshot(snapshot)
+    curs = db_backend.dict_cursor(conn)
+    # two workers may finalize at once; the first snapshot stored wins
+    curs.execute('INSERT IGNORE INTO party_snapshot (cpid, payload) VALUES (%s, %s)',
+                 [cpid, payload])
+    if curs.rowcount == 0:
+        curs.close()
+        return get_snapshot(conn, cpid)
+
+    curs.execute('UPDATE code_party SET winner = %s WHERE cpid = %s', [winner, cpid])
+    curs.executemany('''
+        INSERT INTO individual_party_stats (pid, cpid, problems_solved, `rank`)
+        VALUES (%s, %s, %s, %s)
+        ON DUPLICATE KEY UPDATE problems_solved = VALUES(problems_solved), `rank` = VALUES(`rank`)
+    ''', [(m['pid'], cpid, m['problems_solved'], m['rank']) for m in standings])
+
+    daily = {}
+    for day in submissions['submission_date']:
+        daily[day] = daily.get(day, 0) + 1
+    total = len(submissions['submission_date'])
+    curs.execute('''
+        INSERT INTO party_total_stats (cpid, total_problems, total_participants, avg_problems,
+                                       max_daily_problems, party_duration_days)
+        VALUES (%s, %s, %s, %s, %s, %s)
+        ON DUPLICATE KEY UPDATE total_problems = VALUES(total_problems),
+            total_participants = VALUES(total_participants),
+            avg_problems = VALUES(avg_problems),
+            max_daily_problems = VALUES(max_daily_problems),
+            party_duration_days = VALUES(party_duration_days)
+    ''', [cpid, total, len(standings), total / len(standings) if standings else 0,
+          max(daily.values(), default=0),
+          (_as_date(party['party_end']) - _as_date(party['party_start'])).days])
+    curs.close()
+    return decode_snapshot(payload)
+
+
+def finalize_due(conn):
+    """Finalize every due party that has no snapshot yet, committing each. Returns their cpids."""
+    curs = db_backend.dict_cursor(conn)
+    curs.execute('''
+        SELECT cp.cpid, cp.party_end, cp.last_bulk_refresh
+        FROM code_party cp
+        LEFT JOIN party_snapshot s ON s.cpid = cp.cpid
+        WHERE cp.party_end < CURDATE() AND s.cpid IS NULL
+        ORDER BY cp.party_end
+    ''')
+    cpids = [row['cpid'] for row in curs.fetchall() if ready_to_finalize(row)]
+    curs.close()
+    for cpid in cpids:
+        finalize_party(conn, cpid)
+        conn.commit()
+    return cpids
+
+
+def main():
+    argparse.ArgumentParser(description='Finalize code parties that have ended.').parse_args()
+    conn = db_backend.connect()
+    try:
+        cpids = finalize_due(conn)
+    finally:
+        conn.close()
+    print(f'Finalized {len(cpids)} parties.')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+# Written by Jessica Dai, Sophie Lin, Nessa Tong, Ashley Yang (Olin)
+# profile_pics.py
+# Turns an uploaded profile picture into a few small square WebP thumbnails.
+import hashlib
+import io
+import os
+
+# Square edge length in pixels for each thumbnail size (~2x the CSS size).
+#   sm -> navbar (38px), md -> leaderboard rows (52px), lg -> profile page (120px)
+THUMB_SIZES = {'sm': 80, 'md': 112, 'lg': 256}
+WEBP_QUALITY = 80
+
+ALLOWED_FORMATS = {'PNG', 'JPEG', 'WEBP'}
+MAX_SOURCE_PIXELS = 40_000_000   # refuse decompression bombs before decoding
+
+
+class ProfilePicError(Exception):
+    """The uploaded file isn't an image we can use."""
+    pass
+
+
+def thumb_filename(key, size):
+    """Filename of the stored thumbnail for a picture key and size name."""
+    return f'{key}_{size}.webp'
+
+
+def is_thumb_key(filename):
+    """
+    True if the picfile.filename value is a content-hash key from this module,
+    False for older uploads that stored the original file name.
+    """
+    return bool(filename) and '.' not in filename
+
+
+def process_upload(data: bytes, upload_folder: str) -> str:
+    """
+    Decode and validate the uploaded image bytes, then write one square WebP
+    thumbnail per THUMB_SIZES entry into upload_folder.
+
+    Files are named by a hash of the upload, so the same picture always maps
+    to the same names and a stored file never changes (safe to cache forever).
+
+    Returns the key to store in picfile.filename.
+    Raises ProfilePicError if the data is not an allowed image.
+    """
+    # imported here so workers that never see an upload don't load Pillow
+    from PIL import Image, ImageOps
+
+    try:
+        img = Image.open(io.BytesIO(data))
+        if img.format not in ALLOWED_FORMATS:
+            raise ProfilePicError(f'Unsupported image type {img.format}')
+        if img.width * img.height > MAX_SOURCE_PIXELS:
+            raise ProfilePicError('Image dimensions are too large')
+        img.load()
+    except ProfilePicError:
+        raise
+    except Exception as e:
+        raise ProfilePicError('Not a valid image file') from e
+
+    img = ImageOps.exif_transpose(img)
+    img = img.convert('RGBA' if 'A' in img.getbands() else 'RGB')
+
+    key = hashlib.sha256(data).hexdigest()[:32]
+
+    for size, edge in THUMB_SIZES.items():
+        pathname = os.path.join(upload_folder, thumb_filename(key, size))
+        if os.path.exists(pathname):
+            # identical upload already processed
+            continue
+        thumb = ImageOps.fit(img, (edge, edge), Image.Resampling.LANCZOS)
+        tmp = pathname + '.tmp'
+        thumb.save(tmp, 'WEBP', quality=WEBP_QUALITY, method=6)
+        os.chmod(tmp, 0o444) # readable by owner, group and others
+        os.replace(tmp, pathname)
+
+    return key
@@ -0,0 +1,188 @@
+# Written by Jessica Dai, Sophie Lin, Nessa Tong, Ashley Yang (Olin)
+# request_profiler.py
+# Opt-in profiling of live requests.
+#
+# A sampled request runs under cProfile with tracemalloc tracking its peak
+# memory. Its stats are written to PROFILE_DIR as <name>.prof, which works
+# with pstats, snakeviz, or flameprof/gprof2dot for flame graphs, plus a
+# <name>.json with the route, timing and peak memory. Only the newest
+# PROFILE_KEEP profiles are kept. The admin pages in app.py list and serve
+# them.
+#
+# Off unless configured:
+#   LEETPARTY_PROFILE_RATE=0.05     sample 5% of requests to PROFILE_ENDPOINTS
+#   LEETPARTY_PROFILE_ENDPOINTS=refresh_party,party_charts   ('*' = every route)
+#   LEETPARTY_PROFILE_TOKEN=secret  also profile any request sent with
+#                                   "X-Profile: secret"
+#   LEETPARTY_PROFILE_DIR=/tmp/leetparty-profiles
+#   LEETPARTY_PROFILE_KEEP=200
+#
+# cProfile and tracemalloc are process-wide, so at most one request per
+# process is profiled at a time; others arriving meanwhile just run normally.
+import cProfile
+import json
+import os
+import random
+import re
+import threading
+import time
+import tracemalloc
+
+from flask import g, request
+
+PROFILE_RATE = float(os.environ.get('LEETPARTY_PROFILE_RATE', 0))
+PROFILE_ENDPOINTS = set(os.environ.get('LEETPARTY_PROFILE_ENDPOINTS',
+                                       'refresh_party,party_charts').split(','))
+PROFILE_TOKEN = os.environ.get('LEETPARTY_PROFILE_TOKEN', '')
+PROFILE_HEADER = 'X-Profile'
+PROFILE_DIR = os.environ.get('LEETPARTY_PROFILE_DIR', '/tmp/leetparty-profiles')
+PROFILE_KEEP = int(os.environ.get('LEETPARTY_PROFILE_KEEP', 200))
+
+# profile names are generated here; anything else is refused by path lookups
+_NAME_RE = re.compile(r'^[0-9]{8}-[0-9]{6}\.[0-9]{3}-[0-9]+_[A-Za-z0-9_.]+$')
+
+_active = threading.Lock()
+
+
+def enabled():
+    return PROFILE_RATE > 0 or bool(PROFILE_TOKEN)
+
+
+def _wanted():
+    """Should the current request be profiled?"""
+    if PROFILE_TOKEN and request.headers.get(PROFILE_HEADER) == PROFILE_TOKEN:
+        return True
+    if PROFILE_RATE <= 0:
+        return False
+    if '*' not in PROFILE_ENDPOINTS and request.endpoint not in PROFILE_ENDPOINTS:
+        return False
+    return random.random() < PROFILE_RATE
+
+
+def _start():
+    if not _wanted() or not _active.acquire(blocking=False):
+        return
+    started_tracing = not tracemalloc.is_tracing()
+    if started_tracing:
+        tracemalloc.start()
+    tracemalloc.reset_peak()
+    profiler = cProfile.Profile()
+    g.profile = {
+        'profiler': profiler,
+        'started_tracing': started_tracing,
+        'start': time.perf_counter(),
+        'mem_start': tracemalloc.get_traced_memory()[0],
+    }
+    profiler.enable()
+
+
+def _stop(state):
+    """Stop profiling; returns (seconds elapsed, peak bytes allocated)."""
+    state['profiler'].disable()
+    elapsed = time.perf_counter() - state['start']
+    peak = tracemalloc.get_traced_memory()[1] - state['mem_start']
+    if state['started_tracing']:
+        tracemalloc.stop()
+    _active.release()
+    return elapsed, max(peak, 0)
+
+
+def _finish(response):
+    state = g.pop('profile', None)
+    if state is None:
+        return response
+    elapsed, peak = _stop(state)
+    try:
+        _save(state['profiler'], {
+            'endpoint': request.endpoint,
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'duration_ms': round(elapsed * 1000, 1),
+            'peak_alloc_kb': round(peak / 1024, 1),
+            'time': time.strftime('%Y-%m-%d %H:%M:%S'),
+        })
+    except Exception as err:
+        print(f'profiling failed: {err}')
+    return response
+
+
+def _abandon(exc):
+    # a view that raises still goes through after_request (via the error
+    # handler), so this only matters when response processing itself fails;
+    # don't leave profiling on then
+    state = g.pop('profile', None)
+    if state is not None:
+        _stop(state)
+
+
+def _save(profiler, meta):
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    now = time.time()
+    stamp = time.strftime('%Y%m%d-%H%M%S', time.localtime(now)) + f'.{int(now * 1000) % 1000:03d}'
+    name = f"{stamp}-{os.getpid()}_{meta['endpoint'] or 'unknown'}"
+    name = re.sub(r'[^A-Za-z0-9_.-]', '_', name)
+    meta['name'] = name
+    profiler.dump_stats(os.path.join(PROFILE_DIR, name + '.prof'))
+    with open(os.path.join(PROFILE_DIR, name + '.json'), 'w') as f:
+        json.dump(meta, f)
+    _prune()
+
+
+def _prune():
+    """Delete all but the newest PROFILE_KEEP profiles."""
+    for meta in list_profiles()[PROFILE_KEEP:]:
+        for ext in ('.prof', '.json'):
+            try:
+                os.remove(os.path.join(PROFILE_DIR, meta['name'] + ext))
+            except FileNotFoundError:
+                pass
+
+
+def list_profiles():
+    """Metadata dicts of the stored profiles, newest first."""
+    try:
+        names = os.listdir(PROFILE_DIR)
+    except FileNotFoundError:
+        return []
+    profiles = []
+    for filename in names:
+        if not filename.endswith('.json'):
+            continue
+        try:
+            with open(os.path.join(PROFILE_DIR, filename)) as f:
+                profiles.append(json.load(f))
+        except (OSError, ValueError):
+            continue
+    profiles.sort(key=lambda meta: meta.get('name', ''), reverse=True)
+    return profiles
+
+
+def profile_path(name):
+    """Path of a stored .prof file, or None if name isn't one of ours."""
+    if not _NAME_RE.match(name):
+        return None
+    path = os.path.join(PROFILE_DIR, name + '.prof')
+    return path if os.path.exists(path) else None
+
+
+def top_functions(name, limit=40):
+    """Text summary of a stored profile, sorted by cumulative time."""
+    import io
+    import pstats
+
+    path = profile_path(name)
+    if path is None:
+        return None
+    out = io.StringIO()
+    pstats.Stats(path, stream=out).sort_stats('cumulative').print_stats(limit)
+    return out.getvalue()
+
+
+def init_app(app):
+    """Install the profiling hooks on a Flask app (no-op unless configured)."""
+    if not enabled():
+        return
+    app.before_request(_start)
+    app.after_request(_finish)
+    app.teardown_request(_abandon)
@@ -0,0 +1,148 @@
+# Written by Jessica Dai, Sophie Lin, Nessa Tong, Ashley Yang (Olin)
+# shared_cache.py
+# A small key/value cache shared by every server worker on the same host.
+#
+# Entries live in a local SQLite file (WAL + mmap, so reads from any worker
+# are cheap and never block on writers), hold JSON values, expire after a
+# TTL, and the least recently used ones are evicted once the file holds more
+# than CACHE_MAX_BYTES of values. Nothing here is the source of truth: a
+# lost or deleted cache file only costs recomputation.
+#
+#   LEETPARTY_CACHE_PATH=/tmp/leetparty-cache.db   (default)
+#   LEETPARTY_CACHE_MAX_MB=64
+import json
+import os
+import sqlite3
+import threading
+import time
+
+CACHE_PATH = os.environ.get('LEETPARTY_CACHE_PATH', '/tmp/leetparty-cache.db')
+CACHE_MAX_BYTES = int(float(os.environ.get('LEETPARTY_CACHE_MAX_MB', 64)) * 1024 * 1024)
+# check total size every this many writes rather than on each one
+EVICT_CHECK_EVERY = 50
+
+_local = threading.local()
+_writes = 0
+_writes_lock = threading.Lock()
+
+
+def _conn():
+    """One SQLite connection per thread (and per process after a fork)."""
+    conn = getattr(_local, 'conn', None)
+    if conn is None or getattr(_local, 'pid', None) != os.getpid():
+        conn = sqlite3.connect(CACHE_PATH, timeout=5, isolation_level=None,
+                               check_same_thread=False)
+        conn.execute('PRAGMA journal_mode = WAL')
+        conn.execute('PRAGMA synchronous = OFF')
+        conn.execute('PRAGMA mmap_size = 268435456')
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS cache (
+                key      TEXT PRIMARY KEY,
+                value    BLOB NOT NULL,
+                size     INT NOT NULL,
+                expires  REAL NOT NULL,
+                accessed REAL NOT NULL
+            )
+        ''')
+        conn.execute('CREATE INDEX IF NOT EXISTS cache_accessed ON cache (accessed)')
+        _local.conn = conn
+        _local.pid = os.getpid()
+    return conn
+
+
+def get(key, default=None):
+    """Return the cached value for key, or default if missing/expired."""
+    return get_many([key]).get(key, default)
+
+
+def get_many(keys):
+    """Return {key: value} for the keys that are cached and fresh."""
+    keys = list(keys)
+    if not keys:
+        return {}
+    now = time.time()
+    found = {}
+    try:
+        conn = _conn()
+        # stay under SQLite's bound-parameter limit
+        for i in range(0, len(keys), 500):
+            chunk = keys[i:i + 500]
+            placeholders = ', '.join('?' * len(chunk))
+            rows = conn.execute(
+                f'SELECT key, value FROM cache WHERE key IN ({placeholders}) AND expires > ?',
+                chunk + [now],
+            ).fetchall()
+            for key, value in rows:
+                found[key] = json.loads(value)
+        if found:
+            placeholders = ', '.join('?' * len(found))
+            conn.execute(f'UPDATE cache SET accessed = ? WHERE key IN ({placeholders})',
+                         [now] + list(found))
+    except sqlite3.Error as err:
+        print(f'shared cache read failed: {err}')
+    return found
+
+
+def set(key, value, ttl):
+    """Cache a JSON-serializable value for ttl seconds."""
+    set_many({key: value}, ttl)
+
+
+def set_many(items, ttl):
+    """Cache several {key: value} pairs for ttl seconds."""
+    global _writes
+    if not items:
+        return
+    now = time.time()
+    rows = []
+    for key, value in items.items():
+        blob = json.dumps(value, separators=(',', ':'), default=str)
+        rows.append((key, blob, len(blob), now + ttl, now))
+    try:
+        _conn().executemany('INSERT OR REPLACE INTO cache VALUES (?, ?, ?, ?, ?)', rows)
+    except sqlite3.Error as err:
+        print(f'shared cache write failed: {err}')
+        return
+
+    with _writes_lock:
+        _writes += len(rows)
+        check = _writes >= EVICT_CHECK_EVERY
+        if check:
+            _writes = 0
+    if check:
+        evict()
+
+
+def delete(*keys):
+    """Drop keys from the cache (e.g. after the data behind them changed)."""
+    if not keys:
+        return
+    try:
+        placeholders = ', '.join('?' * len(keys))
+        _conn().execute(f'DELETE FROM cache WHERE key IN ({placeholders})', list(keys))
+    except sqlite3.Error as err:
+        print(f'shared cache delete failed: {err}')
+
+
+def evict(max_bytes=None):
+    """Remove expired entries, then least recently used ones until under max_bytes."""
+    max_bytes = CACHE_MAX_BYTES if max_bytes is None else max_bytes
+    try:
+        conn = _conn()
+        conn.execute('DELETE FROM cache WHERE expires <= ?', [time.time()])
+        total = conn.execute('SELECT COALESCE(SUM(size), 0) FROM cache').fetchone()[0]
+        if total <= max_bytes:
+            return
+        # trim to 90% so we don't evict again on the very next write
+        excess = total - int(max_bytes * 0.9)
+        # oldest-accessed entries first, until `excess` bytes are freed
+        conn.execute('''
+            DELETE FROM cache WHERE key IN (
+                SELECT key FROM (
+                    SELECT key, SUM(size) OVER (ORDER BY accessed, key) - size AS freed_before
+                    FROM cache
+                ) WHERE freed_before < ?
+            )
+        ''', [excess])
+    except sqlite3.Error as err:
+        print(f'shared cache eviction failed: {err}')
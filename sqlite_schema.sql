@@ -0,0 +1,129 @@
+-- SQLite version of LeetCodeCompetition.sql + create-filename-table.sql,
+-- used by the embedded backend (LEETPARTY_DB_BACKEND=sqlite, see db_backend.py).
+-- Keep in sync with the MySQL schema.
+
+CREATE TABLE IF NOT EXISTS problem (
+  lc_problem  INTEGER PRIMARY KEY,
+  title_slug  VARCHAR(255) UNIQUE NOT NULL,
+  title       VARCHAR(255) NOT NULL,
+  difficulty  TEXT CHECK (difficulty IN ('easy', 'medium', 'hard'))
+);
+
+CREATE TABLE IF NOT EXISTS person (
+  pid            INTEGER PRIMARY KEY AUTOINCREMENT,
+  username       VARCHAR(50) NOT NULL UNIQUE,
+  name           VARCHAR(50),
+  birthday       DATE,
+  lc_username    VARCHAR(50) NOT NULL UNIQUE,
+  current_streak INT,
+  longest_streak INT,
+  total_problems INT,
+  num_coins      INT NOT NULL DEFAULT 0,
+  personal_goal  INT,
+  latest_submission DATE,
+  last_refreshed DATETIME NULL,
+  last_ingested_ts BIGINT NULL,
+  last_ingested_id VARCHAR(32) NULL
+);
+
+CREATE TABLE IF NOT EXISTS code_party (
+  cpid        INTEGER PRIMARY KEY AUTOINCREMENT,
+  name        VARCHAR(200) NOT NULL DEFAULT 'Nameless Party',
+  party_goal  INT,
+  party_start DATE NOT NULL,
+  party_end   DATE NOT NULL,
+  winner      INT NULL REFERENCES person(pid) ON DELETE SET NULL ON UPDATE CASCADE,
+  last_bulk_refresh DATETIME NULL
+);
+
+CREATE TABLE IF NOT EXISTS party_membership (
+  pid   INT REFERENCES person(pid) ON DELETE CASCADE ON UPDATE CASCADE,
+  cpid  INT REFERENCES code_party(cpid) ON DELETE CASCADE ON UPDATE CASCADE,
+  joined_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+  PRIMARY KEY (pid, cpid)
+);
+CREATE INDEX IF NOT EXISTS party_membership_cpid ON party_membership (cpid);
+
+CREATE TABLE IF NOT EXISTS individual_party_stats (
+  pid   INT REFERENCES person(pid) ON DELETE CASCADE ON UPDATE CASCADE,
+  cpid  INT REFERENCES code_party(cpid) ON DELETE CASCADE ON UPDATE CASCADE,
+  problems_solved INT DEFAULT 0,
+  party_current_streak INT DEFAULT 0,
+  party_max_streak     INT DEFAULT 0,
+  rank  INT NULL,
+  PRIMARY KEY (pid, cpid)
+);
+
+CREATE TABLE IF NOT EXISTS party_total_stats (
+  cpid                 INT PRIMARY KEY REFERENCES code_party(cpid) ON DELETE CASCADE,
+  total_problems       INT DEFAULT 0,
+  total_participants   INT DEFAULT 0,
+  avg_problems         FLOAT DEFAULT 0,
+  max_daily_problems   INT DEFAULT 0,
+  party_duration_days  INT DEFAULT 0
+);
+
+CREATE TABLE IF NOT EXISTS connection (
+  p1 INT NOT NULL REFERENCES person(pid) ON DELETE CASCADE ON UPDATE CASCADE,
+  p2 INT NOT NULL REFERENCES person(pid) ON DELETE CASCADE ON UPDATE CASCADE,
+  PRIMARY KEY (p1, p2)
+);
+CREATE INDEX IF NOT EXISTS connection_p2 ON connection (p2);
+
+CREATE TABLE IF NOT EXISTS submission (
+  sid             INTEGER PRIMARY KEY AUTOINCREMENT,
+  pid             INT NOT NULL REFERENCES person(pid) ON DELETE CASCADE ON UPDATE CASCADE,
+  lc_problem      INT NOT NULL REFERENCES problem(lc_problem) ON DELETE RESTRICT ON UPDATE CASCADE,
+  submission_date DATE NOT NULL,
+  UNIQUE (pid, lc_problem)
+);
+CREATE INDEX IF NOT EXISTS submission_pid_date ON submission (pid, submission_date);
+
+CREATE TABLE IF NOT EXISTS userpass (
+  pid     INT PRIMARY KEY REFERENCES person(pid) ON DELETE CASCADE ON UPDATE CASCADE,
+  hashed  CHAR(60) NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS backfill_checkpoint (
+  pid          INT PRIMARY KEY REFERENCES person(pid) ON DELETE CASCADE ON UPDATE CASCADE,
+  next_offset  INT NOT NULL DEFAULT 0,
+  done         BOOLEAN NOT NULL DEFAULT FALSE,
+  updated_at   DATETIME DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS daily_activity (
+  pid     INT NOT NULL REFERENCES person(pid) ON DELETE CASCADE ON UPDATE CASCADE,
+  day     DATE NOT NULL,
+  solved  INT NOT NULL DEFAULT 0,
+  coins   INT NOT NULL DEFAULT 0,
+  PRIMARY KEY (pid, day)
+);
+CREATE INDEX IF NOT EXISTS daily_activity_day_pid ON daily_activity (day, pid);
+
+CREATE TABLE IF NOT EXISTS party_snapshot (
+  cpid          INTEGER PRIMARY KEY REFERENCES code_party(cpid) ON DELETE CASCADE ON UPDATE CASCADE,
+  payload       BLOB NOT NULL,
+  finalized_at  DATETIME DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS activity_bitmap (
+  pid   INT NOT NULL REFERENCES person(pid) ON DELETE CASCADE ON UPDATE CASCADE,
+  year  SMALLINT NOT NULL,
+  bits  BLOB NOT NULL,
+  PRIMARY KEY (pid, year)
+);
+
+CREATE TABLE IF NOT EXISTS friend_recommendation (
+  pid             INT NOT NULL REFERENCES person(pid) ON DELETE CASCADE ON UPDATE CASCADE,
+  candidate       INT NOT NULL REFERENCES person(pid) ON DELETE CASCADE ON UPDATE CASCADE,
+  score           INT NOT NULL,
+  mutuals         INT NOT NULL DEFAULT 0,
+  shared_parties  INT NOT NULL DEFAULT 0,
+  PRIMARY KEY (pid, candidate)
+);
+CREATE INDEX IF NOT EXISTS friend_recommendation_pid_score ON friend_recommendation (pid, score);
+
+CREATE TABLE IF NOT EXISTS picfile (
+  pid       INT PRIMARY KEY REFERENCES person(pid) ON DELETE CASCADE ON UPDATE CASCADE,
+  filename  VARCHAR(50)
+);
@@ -0,0 +1,105 @@
+# Written by Jessica Dai, Sophie Lin, Nessa Tong, Ashley Yang (Olin)
+# sync_problems.py
+# Load LeetCode's whole problem catalog into the problem table, so refreshes
+# find every problem locally instead of asking LeetCode one question() at a
+# time.
+#
+# The catalog is paged in with problemsetQuestionList and compared with what
+# is already stored; only new problems and ones whose slug, title or
+# difficulty changed are written. Running it again (e.g. nightly from cron)
+# is cheap.
+#
+#   python sync_problems.py
+#   python sync_problems.py --page-size 100 --dry-run
+#
+# Against the local stub:
+#   python leetcode_stub.py &
+#   LEETCODE_GRAPHQL_URL=http://localhost:5055/graphql python sync_problems.py
+import argparse
+
+import db_backend
+import shared_cache
+from leetcode_client import iter_problem_catalog
+
+UPSERT_CHUNK = 500
+
+
+def load_catalog(conn):
+    """Return {lc_problem: (title_slug, title, difficulty)} for stored problems."""
+    curs = db_backend.cursor(conn)
+    curs.execute('SELECT lc_problem, title_slug, title, difficulty FROM problem')
+    stored = {int(row[0]): tuple(row[1:]) for row in curs.fetchall()}
+    curs.close()
+    return stored
+
+
+def diff_catalog(stored, problems):
+    """
+    Split fetched problems into (new, changed) lists of meta dicts;
+    problems identical to the stored row are left out.
+    """
+    new, changed = [], []
+    for meta in problems:
+        key = (meta['title_slug'], meta['title'], meta['difficulty'])
+        old = stored.get(meta['lc_problem'])
+        if old is None:
+            new.append(meta)
+        elif tuple(old) != key:
+            changed.append(meta)
+    return new, changed
+
+
+def upsert_problems(conn, problems):
+    """Insert or update problem rows in chunks (no commit here)."""
+    curs = db_backend.cursor(conn)
+    rows = [(p['lc_problem'], p['title_slug'], p['title'], p['difficulty']) for p in problems]
+    for i in range(0, len(rows), UPSERT_CHUNK):
+        curs.executemany('''
+            INSERT INTO problem (lc_problem, title_slug, title, difficulty)
+            VALUES (%s, %s, %s, %s)
+            ON DUPLICATE KEY UPDATE
+              title_slug = VALUES(title_slug),
+              title = VALUES(title),
+              difficulty = VALUES(difficulty)
+        ''', rows[i:i + UPSERT_CHUNK])
+    curs.close()
+
+
+def sync(conn, page_size=100, dry_run=False):
+    """Sync the problem table with LeetCode. Returns (fetched, new, changed) counts."""
+    stored = load_catalog(conn)
+    problems = list(iter_problem_catalog(page_size))
+    new, changed = diff_catalog(stored, problems)
+    if not dry_run and (new or changed):
+        upsert_problems(conn, new + changed)
+        conn.commit()
+        # cached metadata for changed problems is now stale
+        if changed:
+            prefix = f'problem:{db_backend.CACHE_NAMESPACE}:'
+            shared_cache.delete(*[prefix + slug for slug in
+                                  {p['title_slug'] for p in changed} |
+                                  {stored[p['lc_problem']][0] for p in changed}])
+    return len(problems), new, changed
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Sync the problem table with LeetCode.')
+    parser.add_argument('--page-size', type=int, default=100)
+    parser.add_argument('--dry-run', action='store_true', help='report differences only')
+    args = parser.parse_args()
+
+    conn = db_backend.connect()
+    try:
+        fetched, new, changed = sync(conn, args.page_size, args.dry_run)
+    finally:
+        conn.close()
+
+    for meta in changed:
+        print(f"changed: {meta['lc_problem']} {meta['title']} ({meta['difficulty']})")
+    print(f"\nFetched {fetched} problems: {len(new)} new, {len(changed)} changed, "
+          f"{fetched - len(new) - len(changed)} unchanged."
+          + (' (dry run, nothing written)' if args.dry_run else ''))
+
+
+if __name__ == '__main__':
+    main()
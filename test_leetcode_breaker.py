@@ -0,0 +1,144 @@
+# Written by Jessica Dai, Sophie Lin, Nessa Tong, Ashley Yang (Olin)
+# Walks the LeetCode circuit breaker through its states: closed -> open
+# after consecutive failures, half_open once the cooldown is over, then
+# open again on a failed probe or closed on a good one. Failures come from
+# a local port nothing listens on, successes from leetcode_stub.py run in a
+# background thread.
+#
+#   python test_leetcode_breaker.py      (or: python -m pytest test_leetcode_breaker.py)
+import itertools
+import os
+import socket
+import time
+
+# no database is touched, but importing the client shouldn't need MySQL
+os.environ.setdefault('LEETPARTY_DB_BACKEND', 'sqlite')
+
+import leetcode_client
+import leetcode_stub
+from leetcode_client import LeetCodeClientError, LeetCodeUnavailable
+
+FAILURES = 2
+COOLDOWN = 0.2
+saved = {}
+usernames = (f'breaker-{i}' for i in itertools.count())
+
+
+def dead_url():
+    """A local URL that refuses connections."""
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        port = s.getsockname()[1]
+    return f'http://127.0.0.1:{port}/graphql'
+
+
+def setup_module(module=None):
+    saved.update(url=leetcode_client.LEETCODE_GRAPHQL_URL,
+                 breaker=leetcode_client._breaker,
+                 rate_limiter=leetcode_client._rate_limiter)
+    saved['server'], saved['stub_url'] = leetcode_stub.serve_in_thread()
+    saved['dead_url'] = dead_url()
+    leetcode_client._rate_limiter = leetcode_client._RateLimiter(1000, 1000)
+
+
+def teardown_module(module=None):
+    saved.pop('server').shutdown()
+    leetcode_client.LEETCODE_GRAPHQL_URL = saved['url']
+    leetcode_client._breaker = saved['breaker']
+    leetcode_client._rate_limiter = saved['rate_limiter']
+
+
+def fresh_breaker():
+    leetcode_client._breaker = leetcode_client._CircuitBreaker(FAILURES, COOLDOWN)
+    return leetcode_client._breaker
+
+
+def call(url):
+    """One LeetCode call to url (never answered from the result cache)."""
+    leetcode_client.LEETCODE_GRAPHQL_URL = url
+    return leetcode_client.fetch_recent_ac_submissions(next(usernames), limit=5)
+
+
+def fail_until_open(breaker):
+    for _ in range(FAILURES):
+        try:
+            call(saved['dead_url'])
+        except LeetCodeUnavailable:
+            raise AssertionError('rejected before the breaker should have opened')
+        except LeetCodeClientError:
+            pass
+    assert breaker.snapshot()['state'] == 'open'
+
+
+def test_opens_after_consecutive_failures():
+    breaker = fresh_breaker()
+    fail_until_open(breaker)
+    # open: the call isn't even sent, so the working stub doesn't help
+    try:
+        call(saved['stub_url'])
+    except LeetCodeUnavailable:
+        pass
+    else:
+        raise AssertionError('expected the open breaker to reject the call')
+    snap = breaker.snapshot()
+    assert snap['times_opened'] == 1
+    assert snap['calls_rejected'] == 1
+    assert not leetcode_client.leetcode_available()
+
+
+def test_failed_probe_opens_again():
+    breaker = fresh_breaker()
+    fail_until_open(breaker)
+    time.sleep(COOLDOWN)
+    assert breaker.snapshot()['state'] == 'half_open'
+    try:
+        call(saved['dead_url'])
+    except LeetCodeUnavailable:
+        raise AssertionError('the probe should have been sent')
+    except LeetCodeClientError:
+        pass
+    snap = breaker.snapshot()
+    assert snap['state'] == 'open'
+    assert snap['times_opened'] == 2
+
+
+def test_good_probe_closes():
+    breaker = fresh_breaker()
+    fail_until_open(breaker)
+    time.sleep(COOLDOWN)
+    assert len(call(saved['stub_url'])) == 5
+    snap = breaker.snapshot()
+    assert snap['state'] == 'closed'
+    assert snap['consecutive_failures'] == 0
+    assert leetcode_client.leetcode_available()
+
+
+def test_unexpected_error_does_not_wedge_the_probe():
+    breaker = fresh_breaker()
+    fail_until_open(breaker)
+    time.sleep(COOLDOWN)
+
+    class Broken:
+        def acquire(self):
+            raise RuntimeError('not a LeetCode error')
+
+    leetcode_client._rate_limiter, limiter = Broken(), leetcode_client._rate_limiter
+    try:
+        call(saved['stub_url'])
+    except RuntimeError:
+        pass
+    finally:
+        leetcode_client._rate_limiter = limiter
+    assert breaker.snapshot()['state'] == 'open'
+    time.sleep(COOLDOWN)
+    assert len(call(saved['stub_url'])) == 5
+    assert breaker.snapshot()['state'] == 'closed'
+
+
+if __name__ == '__main__':
+    setup_module()
+    for name, fn in list(globals().items()):
+        if name.startswith('test_') and callable(fn):
+            fn()
+            print(f'ok  {name}')
+    teardown_module()
@@ -1,33 +1,97 @@
 # Written by Jessica Dai, Sophie Lin, Nessa Tong, Ashley Yang (Olin)
-import cs304dbi as dbi
+# Offline test of the LeetCode client: fetches one user's recent submissions
+# and refreshes them into a scratch SQLite database, with every LeetCode call
+# answered from a recorded cassette (see leetcode_cassette.py), so each run
+# gets the same data and needs no network.
+#
+#   python test_leetcode_client.py             (or: python -m pytest test_leetcode_client.py)
+#   python test_leetcode_client.py --record    re-record the cassette from
+#                                              LEETCODE_GRAPHQL_URL (real LeetCode by default)
+import os
+import sys
+import tempfile
+
+# a scratch database and a cold problem cache, so every problem lookup is a call
+SCRATCH = tempfile.mkdtemp(prefix='leetparty-test-')
+os.environ.setdefault('LEETPARTY_DB_BACKEND', 'sqlite')
+os.environ.setdefault('LEETPARTY_CACHE_PATH', os.path.join(SCRATCH, 'cache.db'))
+
+import db_backend
+import db_queries
+import leetcode_client
 from leetcode_client import (
+    LeetCodeClientError,
     fetch_recent_ac_submissions,
-    get_problem_meta,
     refresh_user_submissions,
 )
 
-# --- 1. Connect to database ---
-print(dbi.conf('leetcode_db'))
-conn = dbi.connect()
-
-# --- 2. Test username ---
-pid = 2  # replace with your actual PID
+CASSETTE = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                        'cassettes', 'test_leetcode_client.jsonl.gz')
 username = "jessicajjdai"
 
-print("Testing LeetCode client...\n")
 
-# --- 3. Test fetch_recent_ac_submissions ---
-print("Fetching recent 10 submissions from LeetCode...")
-subs = fetch_recent_ac_submissions(username, limit=10)
-print("Received:", len(subs))
-if subs:
+def start(mode):
+    db_backend.DB_BACKEND = 'sqlite'
+    db_backend.SQLITE_PATH = os.path.join(SCRATCH, 'test.db')
+    leetcode_client.use_cassette(CASSETTE, mode)
+
+
+def setup_module(module):
+    start('replay')
+
+
+def teardown_module():
+    leetcode_client.use_cassette(CASSETTE, 'live')
+
+
+def test_fetch_recent_ac_submissions():
+    subs = fetch_recent_ac_submissions(username, limit=10)
+    assert 0 < len(subs) <= 10
+    for sub in subs:
+        assert {'id', 'title', 'titleSlug', 'timestamp'} <= set(sub)
     print("First submission:", subs[0])
-else:
-    print("No AC submissions found. Try solving one problem first.")
 
-# --- 4. Test refresh_user_submissions ---
-print("\nRefreshing submissions into database...")
-added = refresh_user_submissions(conn, pid, username, limit=10)
-print(f"Inserted {added} new submission rows.")
 
-print("\nSuccess!")
+def test_refresh_user_submissions():
+    conn = db_backend.connect()
+    try:
+        pid = db_queries.create_person(conn, 'Test User', 'test_user', username)
+        subs = fetch_recent_ac_submissions(username, limit=10)
+
+        # one row per problem, however many times it was solved
+        added = refresh_user_submissions(conn, pid, username, limit=10, force=True)
+        assert added == len({sub['titleSlug'] for sub in subs})
+        profile = db_queries.get_profile(conn, pid)
+        assert profile['total_problems'] == added
+        assert profile['num_coins'] > 0
+
+        # the same submissions again add nothing
+        assert refresh_user_submissions(conn, pid, username, limit=10, force=True) == 0
+        print(f"Inserted {added} new submission rows.")
+    finally:
+        conn.rollback()
+        conn.close()
+
+
+def test_unrecorded_call_fails():
+    if leetcode_client._transport_mode != 'replay':
+        return
+    try:
+        fetch_recent_ac_submissions('someone-never-recorded', limit=10)
+    except LeetCodeClientError:
+        return
+    raise AssertionError('expected a cassette miss')
+
+
+if __name__ == '__main__':
+    record = '--record' in sys.argv
+    if record and os.path.exists(CASSETTE):
+        os.remove(CASSETTE)
+    start('record' if record else 'replay')
+    print("Testing LeetCode client...\n")
+    for name, fn in list(globals().items()):
+        if name.startswith('test_') and callable(fn):
+            fn()
+            print(f'ok  {name}')
+    teardown_module()
+    print("\nSuccess!")
@@ -0,0 +1,137 @@
+# Written by Jessica Dai, Sophie Lin, Nessa Tong, Ashley Yang (Olin)
+# Checks that concurrent identical LeetCode calls share one request. Runs
+# leetcode_stub.py in a background thread (with some latency, so callers
+# really overlap) and counts the requests that reach it. The client's URL
+# and rate limiter are pointed at the stub only while these tests run.
+#
+#   python test_leetcode_coalescing.py      (or: python -m pytest test_leetcode_coalescing.py)
+import os
+import threading
+import time
+
+# no database is touched, but importing the client shouldn't need MySQL
+os.environ.setdefault('LEETPARTY_DB_BACKEND', 'sqlite')
+
+import leetcode_client
+import leetcode_stub
+
+STUB_LATENCY = 0.3
+stub_requests = []
+saved = {}
+
+
+def counting(wsgi_app):
+    def app(environ, start_response):
+        stub_requests.append(environ['PATH_INFO'])
+        return wsgi_app(environ, start_response)
+    return app
+
+
+def setup_module(module=None):
+    saved.update(url=leetcode_client.LEETCODE_GRAPHQL_URL,
+                 rate_limiter=leetcode_client._rate_limiter,
+                 latency=leetcode_stub.STUB_LATENCY)
+    leetcode_stub.STUB_LATENCY = STUB_LATENCY
+    saved['server'], leetcode_client.LEETCODE_GRAPHQL_URL = \
+        leetcode_stub.serve_in_thread(counting(leetcode_stub.app))
+    # the rate limiter would serialize the callers on its own
+    leetcode_client._rate_limiter = leetcode_client._RateLimiter(1000, 1000)
+
+
+def teardown_module(module=None):
+    saved.pop('server').shutdown()
+    leetcode_client.LEETCODE_GRAPHQL_URL = saved['url']
+    leetcode_client._rate_limiter = saved['rate_limiter']
+    leetcode_stub.STUB_LATENCY = saved['latency']
+    with leetcode_client._flights_lock:
+        leetcode_client._recent_results.clear()
+
+
+def reset():
+    stub_requests.clear()
+    with leetcode_client._flights_lock:
+        leetcode_client._recent_results.clear()
+
+
+def call_concurrently(fn, args_list):
+    """Run fn(*args) for each args in parallel; return results (or exceptions) in order."""
+    results = [None] * len(args_list)
+    barrier = threading.Barrier(len(args_list))
+
+    def run(i, args):
+        barrier.wait()
+        try:
+            results[i] = fn(*args)
+        except Exception as e:
+            results[i] = e
+
+    threads = [threading.Thread(target=run, args=(i, args)) for i, args in enumerate(args_list)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return results
+
+
+def test_concurrent_identical_calls_share_one_request():
+    reset()
+    start = time.perf_counter()
+    results = call_concurrently(leetcode_client.fetch_recent_ac_submissions,
+                                [('alice', 20)] * 10)
+    elapsed = time.perf_counter() - start
+    assert len(stub_requests) == 1, stub_requests
+    assert all(r == results[0] for r in results)
+    assert len(results[0]) == 20
+    assert elapsed < STUB_LATENCY * 3
+
+
+def test_different_variables_are_not_merged():
+    reset()
+    results = call_concurrently(leetcode_client.fetch_recent_ac_submissions,
+                                [('alice', 20), ('bob', 20), ('alice', 10)])
+    assert len(stub_requests) == 3
+    assert results[0][:10] == results[2]
+    assert results[0] != results[1]
+
+
+def test_result_reused_within_ttl():
+    reset()
+    first = leetcode_client.fetch_recent_ac_submissions('carol', 20)
+    again = leetcode_client.fetch_recent_ac_submissions('carol', 20)
+    assert again == first
+    assert len(stub_requests) == 1
+
+    old_ttl = leetcode_client.LEETCODE_RESULT_TTL
+    leetcode_client.LEETCODE_RESULT_TTL = 0.1
+    try:
+        reset()
+        leetcode_client.fetch_recent_ac_submissions('carol', 20)
+        time.sleep(0.2)
+        leetcode_client.fetch_recent_ac_submissions('carol', 20)
+        assert len(stub_requests) == 2
+    finally:
+        leetcode_client.LEETCODE_RESULT_TTL = old_ttl
+
+
+def test_errors_are_shared_and_not_cached():
+    reset()
+    # the stub rejects queries it doesn't know
+    bad = 'query nope { nothing }'
+    results = call_concurrently(leetcode_client._graphql_request, [(bad, {})] * 5)
+    assert len(stub_requests) == 1
+    assert all(isinstance(r, leetcode_client.LeetCodeClientError) for r in results)
+    try:
+        leetcode_client._graphql_request(bad, {})
+    except leetcode_client.LeetCodeClientError:
+        pass
+    assert len(stub_requests) == 2
+
+
+if __name__ == '__main__':
+    setup_module()
+    for name, fn in list(globals().items()):
+        if name.startswith('test_') and callable(fn):
+            fn()
+            print(f'ok  {name}')
+    print(leetcode_client.refresh_counters())
+    teardown_module()